@@ -1,63 +1,145 @@
-#!/usr/bin/python3
-
-import sqlite3
-import numpy as np
-
-experiments = ["idle", "redis", "postgresql", "wordpress"]
-implementations = ["native", "multidocker", "ssl"]
-
-conn = sqlite3.connect("energy.sqlite")
-c = conn.cursor()
-
-
-def get_average_power(exp):
-  energy = [0.0, 0.0, 0.0] # same order as [implementations]
-
-  print("\n")
-  print(exp)
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
 
+"""
+Summarizes the energy of every experiment on every configuration, scaled to a
+workload of interest and priced, e.g.:
 
-  for j, implementation in enumerate(implementations):
-    if exp != "postgresql" and implementation == "ssl":
-      continue
+    $ ./summary.py energy.sqlite \\
+        --scale idle=1008 \\
+        --scale redis=666.667 \\
+        --scale postgresql=1000 \\
+        --price 6.76
 
-    c.execute("SELECT * FROM energy WHERE experiment = '{}' AND configuration = '{}'".format(exp, implementation))
-    data = np.array(c.fetchall())
-    average = np.zeros(len(data))
-    for i, row in enumerate(data):
-      # average[i] = float(row[3]) / float(row[6])*1000
-      average[i] = float(row[3])
-    
+In the paper, idle ran for ten minutes, scaled to one week (x1008); redis ran
+1,500,000 queries, scaled to 1,000,000,000 (x666.667); and postgresql ran
+1000 transactions, scaled to 1,000,000 (x1000). The price is in cents per
+kWh.
 
-    energy[j] = np.mean(average)
-    print(implementation + " -> " + str(energy[j]))
-
-  percent_difference = (energy[1] - energy[0]) / energy[0] * 100
-  print("Percent Difference = " + str(percent_difference))
-
-  return energy
-
-energy = get_average_power("idle")
-print("Benchmark: Idle for ten minutes")
-print("Scaled: Idle for one week")
-print([x / 600 * 86400 * 7 for x in energy])
-print([x / 600 * 86400 * 7 /1000 * 0.000277778 * 6.76 / 100 for x in energy])
-
-energy = get_average_power("wordpress")
-# print("Benchmark: Idle for ten minutes")
-# print("Scaled: Idle for 24h")
-# print([x / 600 * 86400 for x in energy])
-# print([x / 600 * 86400 /1000 * 0.000277778 * 6.76 for x in energy])
-
-energy = get_average_power("redis")
-print("Benchmark: 1,500,000 queries")
-print("Scaled: 1,000,000,000 queries")
-print([x / 1500000 * 1000000000 for x in energy])
-print([x / 1500000 * 1000000000 /1000 * 0.000277778 * 6.76 / 100 for x in energy])
-
-energy = get_average_power("postgresql")
-print("Benchmark: 1000 Transactions")
-print("Scaled: 1,000,000 Transactions")
-print([x / 1000 * 1000000 for x in energy])
-print([x / 1000 * 1000000 /1000 * 0.000277778 * 6.76 / 100 for x in energy])
+All statistics come from a single grouped query over the energy table (see
+python -m measurements), whatever the number of configurations.
+"""
 
+import argparse
+import sqlite3
+import sys
+from math import sqrt
+
+# 1 kWh = 3.6 MJ
+JOULES_PER_KWH = 3.6e6
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+
+    parser.add_argument('database', nargs='?', default='energy.sqlite')
+    parser.add_argument('-s', '--scale', action='append', default=[],
+                        metavar='EXPERIMENT=FACTOR', type=scaling,
+                        help='multiply the energy of the experiment by the '
+                             'factor (may be repeated)')
+    parser.add_argument('-p', '--price', type=float, default=6.76,
+                        help='price of energy in cents per kWh '
+                             '(default: %(default)s)')
+    parser.add_argument('-b', '--baseline', default='native',
+                        help='configuration to compare others to '
+                             '(default: %(default)s)')
+
+    return parser.parse_args(argv)
+
+
+def scaling(argument):
+    experiment, _, factor = argument.partition('=')
+    try:
+        return experiment, float(factor)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'Expected EXPERIMENT=FACTOR, not ' + argument
+        )
+
+
+def summarize(conn):
+    """
+    Returns a dictionary of the energy of every experiment on every
+    configuration that has runs, as (runs, mean, standard deviation, mean
+    elapsed time in seconds) tuples, keyed by (experiment, configuration).
+    """
+
+    summary = {}
+    for (experiment, configuration, runs, total, squares,
+         elapsed) in conn.execute(r'''
+            SELECT experiment, configuration, COUNT(*),
+                   SUM(energy), SUM(energy * energy),
+                   AVG(elapsed_time) / 1000.0
+              FROM energy
+          GROUP BY experiment, configuration
+    '''):
+        mean = total / runs
+        # Sample standard deviation.
+        sd = (sqrt(max(squares - runs * mean * mean, 0.0) / (runs - 1))
+              if runs > 1 else float('nan'))
+        summary[experiment, configuration] = (runs, mean, sd, elapsed)
+
+    return summary
+
+
+def names(conn, table, default):
+    """
+    Returns the names in the configuration or experiment table. Databases
+    that only have the energy table use the names found in it instead.
+    """
+
+    exists = conn.execute(r'''
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?
+    ''', (table,)).fetchone()
+    if not exists:
+        return sorted(set(default))
+    return [name for name, in conn.execute(r'''
+        SELECT name FROM {} ORDER BY name
+    '''.format(table))]
+
+
+def report(conn, scale=(), price=6.76, baseline='native', file=sys.stdout):
+    summary = summarize(conn)
+    scale = dict(scale)
+    experiments = names(conn, 'experiment', (e for e, _ in summary))
+    configurations = names(conn, 'configuration', (c for _, c in summary))
+
+    for experiment in experiments:
+        factor = scale.get(experiment, 1.0)
+        rows = [(configuration,) + summary[experiment, configuration]
+                for configuration in configurations
+                if (experiment, configuration) in summary]
+        if not rows:
+            continue
+
+        print(experiment, '(scaled x{:g})'.format(factor) if factor != 1.0
+              else '', file=file)
+        print('  {:<16} {:>5} {:>12} {:>10} {:>9} {:>14} {:>10} {:>8}'.format(
+            'configuration', 'runs', 'mean (J)', 'sd (J)', 'time (s)',
+            'scaled (kWh)', 'cost ($)', 'vs. ' + baseline
+        ), file=file)
+
+        reference = summary.get((experiment, baseline))
+        for configuration, runs, mean, sd, elapsed in rows:
+            kwh = mean * factor / JOULES_PER_KWH
+            if reference is not None:
+                difference = '{:+.2f}%'.format(
+                    (mean - reference[1]) / reference[1] * 100
+                )
+            else:
+                difference = ''
+            print('  {:<16} {:>5} {:>12.1f} {:>10.1f} {:>9.1f} {:>14.4f} '
+                  '{:>10.4f} {:>8}'.format(
+                      configuration, runs, mean, sd, elapsed, kwh,
+                      kwh * price / 100, difference
+                  ), file=file)
+        print(file=file)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    report(sqlite3.connect(args.database), args.scale, args.price,
+           args.baseline)
@@ -3,7 +3,7 @@
 
 from time import sleep
 
-from measurements import Experiment, env
+from measurements import Experiment, env, report, report_output
 
 
 @Experiment
@@ -21,7 +21,10 @@ def redis():
     from sh import ssh,redis_benchmark
 
     assert 'REDIS_HOST' in env, "You forgot to define REDIS_HOST"
-    redis_benchmark(h=env.REDIS_HOST, c=1000, n=1500000)
+    output = redis_benchmark(h=env.REDIS_HOST, c=1000, n=1500000)
+    # Without -t, redis-benchmark runs every test, each with n requests.
+    records = report_output('redis-benchmark', output)
+    report(operations=sum(record.requests or 0 for record in records))
 
 
 @Experiment
@@ -32,8 +35,11 @@ def postgresql():
     from sh import pgbench
 
     assert 'POSTGRES_HOST' in env, "You forgot to define POSTGRES_HOST"
-    pgbench(host=env.POSTGRES_HOST, username=env.POSTGRES_USER or 'postgres',
-            client=50, transactions=1000)
+    output = pgbench(host=env.POSTGRES_HOST,
+                     username=env.POSTGRES_USER or 'postgres',
+                     client=50, transactions=1000)
+    for record in report_output('pgbench', output):
+        report(operations=record.requests, transactions=record.requests)
 
 
 @postgresql.before_each
@@ -53,4 +59,5 @@ def wordpress():
 
     from sh import tsung
 
-    tsung("-f", "./carson.xml", "start")
+    output = tsung("-f", "./carson.xml", "start")
+    report_output('tsung', output)
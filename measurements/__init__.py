@@ -6,11 +6,13 @@ Main interface for power and energy measurements.
 
 from .measurements import Measurements
 from .wattsup import WattsUp
-from .experiment import Experiment
+from .rapl import RAPL
+from .experiment import Experiment, phase, report, report_output
 from .environment import Environment
 
 
 env = Environment()
 
 
-__all__ = ['Measurements', 'Experiment', 'WattsUp', 'env']
+__all__ = ['Measurements', 'Experiment', 'WattsUp', 'RAPL', 'env', 'phase',
+           'report', 'report_output']
@@ -12,9 +12,71 @@ CREATE TABLE energy(
     configuration   TEXT, -- The hardware configuration for the experiment
     experiment      TEXT, -- The name of the experiment
     energy          REAL, -- Estimated energy in Joules
-    duration        REAL  -- Duration in milliseconds
+    duration        REAL, -- Duration in milliseconds
+    joules_per_operation    REAL, -- If the run reported its workload
+    operations_per_watt     REAL, -- (operations/second) / watts
+    samples         INTEGER, -- Power samples recorded
+    gaps            INTEGER, -- Gaps between samples
+    interpolated    INTEGER, -- Samples interpolated to fill the gaps
+    power_mean      REAL, -- Mean power in watts
+    power_variance  REAL,
+    power_min       REAL,
+    power_max       REAL,
+    power_p50       REAL, -- Approximate percentiles of power
+    power_p95       REAL,
+    power_p99       REAL
 )
 
+Runs recorded by older versions are also rolled up into the power_rollup
+table (see schema.sql), which the plotting scripts in analysis/ read.
+
+To check every run for gaps, duplicate timestamps, and outlying power into the
+run_quality table, use the quality command; then, --exclude-bad leaves runs
+that are not ok out of the energy table:
+
+    $ python -m measurements quality my-db.sqlite
+    $ python -m measurements --exclude-bad my-db.sqlite
+
+To precompute the histograms of power over time that the density plots in
+analysis/ render, use the histogram command:
+
+    $ python -m measurements histogram my-db.sqlite
+
+To compare the energy of the configurations of every experiment (Welch's
+t-test, Mann-Whitney U, Cohen's d, and Shapiro-Wilk) into the
+energy_comparison table, use the stats command:
+
+    $ python -m measurements stats my-db.sqlite
+
+To bootstrap confidence intervals of the difference in energy from a
+baseline configuration into the bootstrap table, use the bootstrap command:
+
+    $ python -m measurements bootstrap --baseline=native my-db.sqlite
+
+To split runs into warmup, steady, and tail segments by change-point
+detection into the segment table, use the segment command:
+
+    $ python -m measurements segment my-db.sqlite
+
+Runs recorded with checkpoints (see measurements.run.Run) that never ended,
+e.g., because the harness crashed, are listed and completed with the samples
+committed at their last checkpoint by the recover command; --discard deletes
+them instead:
+
+    $ python -m measurements recover my-db.sqlite
+
+To import raw wattsup logs (or journals of the Watts Up? monitor) as new
+runs, use the import command; see measurements/importer.py for the format:
+
+    $ python -m measurements import my-db.sqlite idle.log \\
+        --configuration native --experiment idle
+
+To collect the measurements of many hosts into one database, serve it to
+the agents on those hosts (see measurements/remote.py) with the serve
+command:
+
+    $ python -m measurements serve --port 8086 my-db.sqlite
+
 You may then produce a CSV file suitable for import into R as such:
 
     $ sqlite3 my-db.sqlite -csv -header 'SELECT * FROM energy' > energy.csv
@@ -31,6 +93,7 @@ Alternatively, you may use RSQLite:
 
 """
 
+import os
 import sys
 import logging
 import argparse
@@ -38,7 +101,7 @@ import argparse
 from path import Path
 
 # Dumb things to get the import to work.
-sys.path.insert(0, Path(__file__).abspath().dirname().parent)
+sys.path.insert(0, Path(os.path.abspath(__file__)).dirname().parent)
 from measurements import Measurements
 
 
@@ -49,33 +112,372 @@ class UsageError(ValueError):
     pass
 
 
-def parse_args():
-    parser = argparse.ArgumentParser(description=__doc__)
+def parse_args(argv=None):
+    if argv is None:
+        argv = sys.argv[1:]
+
+    # Subcommands come first; otherwise, the energy table is created.
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+
+    parser = argparse.ArgumentParser(
+        description=__doc__,
+        epilog='Other commands: ' + ', '.join(sorted(COMMANDS)) +
+               '. See python -m measurements COMMAND --help.'
+    )
 
     parser.add_argument('database')
 
     parser.add_argument('-t', '--table-name', default='energy')
     parser.add_argument('-@', '--delete-existing', action='store_true')
+    parser.add_argument('-x', '--exclude-bad', action='store_true',
+                        help='leave out runs that python -m measurements '
+                             'quality found not ok')
+
+    parser.set_defaults(command=main)
+    return parser.parse_args(argv)
+
+
+def parse_histogram_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m measurements histogram',
+        description='Precomputes histograms of power over elapsed time for '
+                    'every experiment and configuration into the '
+                    'power_histogram table.'
+    )
+
+    parser.add_argument('database')
+    parser.add_argument('-b', '--bins', type=int, default=35,
+                        help='bins along each axis (default: %(default)s)')
+
+    parser.set_defaults(command=histogram)
+    return parser.parse_args(argv)
+
+
+def parse_stats_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m measurements stats',
+        description='Compares the energy of the configurations of every '
+                    'experiment into the energy_comparison table.'
+    )
+
+    parser.add_argument('database')
+    parser.add_argument('-b', '--baseline',
+                        help='compare every configuration to this one '
+                             '(default: compare every pair)')
+    parser.add_argument('-t', '--table-name', default='energy',
+                        help='table of energy to compare '
+                             '(default: %(default)s)')
+
+    parser.set_defaults(command=stats)
+    return parser.parse_args(argv)
+
+
+def parse_bootstrap_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m measurements bootstrap',
+        description='Bootstraps confidence intervals of the difference of '
+                    'the energy of every configuration from a baseline into '
+                    'the bootstrap table.'
+    )
+
+    parser.add_argument('database')
+    parser.add_argument('-b', '--baseline', required=True)
+    parser.add_argument('-s', '--statistic', choices=('mean', 'median'),
+                        default='mean')
+    parser.add_argument('-n', '--resamples', type=int, default=10000)
+    parser.add_argument('-c', '--confidence', type=float, default=0.95)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='(default: one per CPU)')
+    parser.add_argument('-t', '--table-name', default='energy',
+                        help='table of energy to compare '
+                             '(default: %(default)s)')
+
+    parser.set_defaults(command=bootstrap)
+    return parser.parse_args(argv)
+
+
+def parse_segment_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m measurements segment',
+        description='Splits every run that has not been segmented yet into '
+                    'warmup, steady, and tail segments, into the segment '
+                    'table.'
+    )
+
+    parser.add_argument('database')
+    parser.add_argument('-p', '--penalty', type=float, default=3.0,
+                        help='higher penalties find fewer change points '
+                             '(default: %(default)s)')
+    parser.add_argument('-m', '--min-size', type=int, default=5,
+                        help='shortest segment, in samples '
+                             '(default: %(default)s)')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='(default: one per CPU)')
+
+    parser.set_defaults(command=segment)
+    return parser.parse_args(argv)
+
+
+def parse_quality_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m measurements quality',
+        description='Scans every run for gaps, duplicate and out-of-order '
+                    'timestamps, and outlying power, into the run_quality '
+                    'table.'
+    )
 
-    return parser.parse_args()
+    parser.add_argument('database')
+    parser.add_argument('--threshold', type=float, default=6.0,
+                        help='robust standard deviations from the median '
+                             'beyond which power is an outlier '
+                             '(default: %(default)s)')
+
+    parser.set_defaults(command=quality)
+    return parser.parse_args(argv)
+
+
+def parse_recover_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m measurements recover',
+        description='Completes runs recorded with checkpoints that never '
+                    'ended with the samples committed at their last '
+                    'checkpoint. Do not use while runs are being recorded!'
+    )
+
+    parser.add_argument('database')
+    parser.add_argument('-d', '--discard', action='store_true',
+                        help='delete the runs instead')
+    parser.add_argument('-l', '--list', action='store_true', dest='list_only',
+                        help='only list the runs')
+
+    parser.set_defaults(command=recover)
+    return parser.parse_args(argv)
 
 
-def main(database=':memory:', table_name='energy', delete_existing=False):
+def parse_import_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m measurements import',
+        description='Imports raw wattsup logs, and journals of the Watts Up? '
+                    'monitor, as new runs.'
+    )
+
+    parser.add_argument('database')
+    parser.add_argument('logs', nargs='+', metavar='log')
+    parser.add_argument('-c', '--configuration',
+                        help='configuration of logs without run markers')
+    parser.add_argument('-e', '--experiment',
+                        help='experiment of logs without run markers')
+    parser.add_argument('-r', '--runs', metavar='FILE',
+                        help='assign samples to runs by the tab separated '
+                             '"configuration experiment started ended" '
+                             'lines of this file')
+    parser.add_argument('-s', '--started', metavar='TIME',
+                        help='time of the first untimed line (Unix time in '
+                             'seconds, or ISO 8601)')
+    parser.add_argument('-p', '--period', type=float, default=None,
+                        help='sampling period in milliseconds '
+                             '(default: detected)')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='(default: one per CPU)')
+
+    parser.set_defaults(command=import_command)
+    return parser.parse_args(argv)
+
+
+def parse_serve_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m measurements serve',
+        description='Records the runs shipped by remote agents (see '
+                    'measurements.remote) into the database.'
+    )
+
+    parser.add_argument('database')
+    parser.add_argument('-H', '--host', default='',
+                        help='address to listen on (default: all)')
+    parser.add_argument('-p', '--port', type=int, default=8086,
+                        help='(default: %(default)s)')
+    parser.add_argument('-g', '--group-size', type=int, default=1000,
+                        help='commit every so many batches of samples, '
+                             'across runs (default: %(default)s)')
+
+    parser.set_defaults(command=serve)
+    return parser.parse_args(argv)
+
+
+COMMANDS = {
+    'bootstrap': parse_bootstrap_args,
+    'histogram': parse_histogram_args,
+    'import': parse_import_args,
+    'quality': parse_quality_args,
+    'recover': parse_recover_args,
+    'serve': parse_serve_args,
+    'segment': parse_segment_args,
+    'stats': parse_stats_args,
+}
+
+
+def open_database(database):
     if database != ':memory:':
         database = Path(database)
         if not database.exists():
             raise UsageError('Database file does not exist: ' + database)
 
-    measure = Measurements(database)
-    measure.energy(create_table=table_name, drop_existing=delete_existing)
+    return Measurements(database)
+
+
+def main(database=':memory:', table_name='energy', delete_existing=False,
+         exclude_bad=False):
+    measure = open_database(database)
+    measure.energy(create_table=table_name, drop_existing=delete_existing,
+                   exclude_bad=exclude_bad)
+    measure.rollup()
+
+    return 0
+
+
+def histogram(database=':memory:', bins=35):
+    # Only this command requires NumPy.
+    from measurements.histogram import write_power_histograms
+
+    if bins < 1:
+        raise UsageError('Need at least one bin')
+
+    measure = open_database(database)
+    write_power_histograms(measure.conn, bins)
+
+    return 0
+
+
+def stats(database=':memory:', baseline=None, table_name='energy'):
+    # Only this command requires NumPy and SciPy.
+    from measurements.stats import write_comparisons
+
+    measure = open_energy_table(database, table_name)
+    write_comparisons(measure.conn, baseline, table_name)
+
+    return 0
+
+
+def bootstrap(database=':memory:', baseline=None, statistic='mean',
+              resamples=10000, confidence=0.95, seed=0, processes=None,
+              table_name='energy'):
+    # Only this command requires NumPy.
+    from measurements.bootstrap import bootstrap_comparisons
+
+    if resamples < 1 or not 0 < confidence < 1:
+        raise UsageError('Need at least one resample, and a confidence '
+                         'between 0 and 1')
+
+    measure = open_energy_table(database, table_name)
+    for experiment, configuration, result in bootstrap_comparisons(
+            measure.conn, baseline, statistic, resamples, confidence, seed,
+            processes, table_name):
+        print('{}\t{}\t{:+.1f} J [{:+.1f}, {:+.1f}]\t'
+              '{:+.2f}% [{:+.2f}, {:+.2f}]'.format(experiment, configuration,
+                                                  *result))
 
     return 0
 
 
+def segment(database=':memory:', penalty=3.0, min_size=5, processes=None):
+    # Only this command requires NumPy.
+    from measurements.changepoint import segment_runs
+
+    if min_size < 1:
+        raise UsageError('Segments must be at least one sample long')
+
+    measure = open_database(database)
+    segment_runs(measure.conn, penalty, min_size, processes)
+
+    return 0
+
+
+def quality(database=':memory:', threshold=6.0):
+    # Only this command requires NumPy.
+    from measurements.quality import scan_runs
+
+    measure = open_database(database)
+    bad = scan_runs(measure.conn, threshold)
+    if bad:
+        print('{} runs are not ok; see the run_quality table, and exclude '
+              'them with --exclude-bad'.format(bad), file=sys.stderr)
+
+    return 0
+
+
+def import_command(database=':memory:', logs=(), configuration=None,
+                   experiment=None, runs=None, started=None, period=None,
+                   processes=None):
+    from measurements.importer import import_logs, parse_time, read_ranges
+
+    if period is not None and period <= 0:
+        raise UsageError('The period must be positive')
+    try:
+        ranges = read_ranges(runs) if runs is not None else None
+        if started is not None:
+            started = parse_time(started)
+    except (OSError, ValueError) as error:
+        raise UsageError(str(error))
+
+    measure = open_database(database)
+    try:
+        ids = import_logs(measure.conn, logs, configuration, experiment,
+                          ranges, started, period, processes)
+    except (OSError, ValueError) as error:
+        raise UsageError(str(error))
+    print('Imported {} runs'.format(len(ids)), file=sys.stderr)
+
+    return 0
+
+
+def serve(database=':memory:', host='', port=8086, group_size=1000):
+    from measurements.remote import IngestServer
+
+    if group_size < 1:
+        raise UsageError('Must commit at least every batch')
+    # Creates the schema, if needed.
+    open_database(database).conn.close()
+
+    with IngestServer(database, (host, port), group_size) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+    return 0
+
+
+def recover(database=':memory:', discard=False, list_only=False):
+    measure = open_database(database)
+    for run, configuration, experiment, _, _, samples in \
+            measure.incomplete_runs():
+        print('{}\t{}\t{}\t{} samples'.format(run, configuration, experiment,
+                                              samples))
+        if not list_only:
+            measure.recover_run(run, discard)
+
+    return 0
+
+
+def open_energy_table(database, table_name):
+    measure = open_database(database)
+    exists = measure.conn.execute(r'''
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?
+    ''', (table_name,)).fetchone()
+    if not exists:
+        raise UsageError('No table named {}; create it with: '
+                         'python -m measurements {}'.format(table_name,
+                                                            database))
+    return measure
+
+
 if __name__ == '__main__':
-    args = parse_args()
+    args = dict(parse_args()._get_kwargs())
+    command = args.pop('command')
     try:
-        status = main(**dict(args._get_kwargs()))
+        status = command(**args)
     except UsageError as error:
         print(error.args[0], file=sys.stderr)
         exit(-1)
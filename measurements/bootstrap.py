@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Bootstrap confidence intervals for the difference in energy between
+configurations, which, unlike the t-test, do not assume that energy is
+normally distributed::
+
+    $ python -m measurements bootstrap --baseline=native energy.sqlite
+
+Resamples are drawn as matrices (one row per resample) in chunks of
+CHUNK_SIZE; each chunk has its own seed, spawned from the given seed, so the
+result does not depend on how many processes share the chunks.
+
+Results are cached in the `bootstrap` table, along with a digest of the runs
+they were computed from; they are only recomputed when runs are added,
+removed, or changed.
+
+Requires NumPy.
+"""
+
+import hashlib
+import logging
+import multiprocessing
+import re
+from collections import namedtuple
+
+import numpy as np
+
+__all__ = ['Bootstrap', 'bootstrap_difference', 'bootstrap_comparisons']
+
+logger = logging.getLogger(__name__)
+
+# Resamples per matrix.
+CHUNK_SIZE = 10000
+
+STATISTICS = {
+    'mean': np.mean,
+    'median': np.median,
+}
+
+# The difference of the statistic of the configuration from the baseline, in
+# joules and in percent of the baseline, each with its confidence interval.
+Bootstrap = namedtuple('Bootstrap', [
+    'difference', 'lower', 'upper',
+    'percent', 'percent_lower', 'percent_upper',
+])
+
+
+def bootstrap_difference(sample, baseline, statistic='mean',
+                         resamples=10000, confidence=0.95, seed=0,
+                         processes=None):
+    """
+    Returns the Bootstrap of the difference of the statistic ('mean' or
+    'median') of the sample from that of the baseline, with percentile
+    confidence intervals.
+
+    Chunks of resamples are spread over a pool of processes (by default, one
+    per CPU) when there is more than one chunk.
+    """
+
+    if statistic not in STATISTICS:
+        raise ValueError('Unknown statistic {}. Choose one of: {}'.format(
+            statistic, ', '.join(sorted(STATISTICS))
+        ))
+    sample = np.asarray(sample, dtype=float)
+    baseline = np.asarray(baseline, dtype=float)
+    if len(sample) == 0 or len(baseline) == 0:
+        raise ValueError('Cannot bootstrap an empty sample')
+
+    sizes = [CHUNK_SIZE] * (resamples // CHUNK_SIZE)
+    if resamples % CHUNK_SIZE:
+        sizes.append(resamples % CHUNK_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = [(sample, baseline, statistic, size, chunk_seed)
+              for size, chunk_seed in zip(sizes, seeds)]
+
+    if len(chunks) > 1 and processes != 1:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_resample, chunks)
+    else:
+        results = [_resample(chunk) for chunk in chunks]
+
+    differences = np.concatenate([result[0] for result in results])
+    percents = np.concatenate([result[1] for result in results])
+
+    measure = STATISTICS[statistic]
+    observed = measure(sample) - measure(baseline)
+    tails = [50 * (1 - confidence), 50 * (1 + confidence)]
+    lower, upper = np.percentile(differences, tails)
+    percent_lower, percent_upper = np.percentile(percents, tails)
+    return Bootstrap(float(observed), float(lower), float(upper),
+                     float(100 * observed / measure(baseline)),
+                     float(percent_lower), float(percent_upper))
+
+
+def _resample(chunk):
+    """
+    Returns the differences of one chunk of resamples, in joules and in
+    percent.
+    """
+    sample, baseline, statistic, size, seed = chunk
+    rng = np.random.default_rng(seed)
+    measure = STATISTICS[statistic]
+
+    # One resample per row.
+    resampled = measure(sample[rng.integers(0, len(sample),
+                                            (size, len(sample)))], axis=1)
+    resampled_baseline = measure(baseline[rng.integers(0, len(baseline),
+                                                       (size, len(baseline)))],
+                                 axis=1)
+    difference = resampled - resampled_baseline
+    return difference, 100 * difference / resampled_baseline
+
+
+def bootstrap_comparisons(conn, baseline, statistic='mean', resamples=10000,
+                          confidence=0.95, seed=0, processes=None,
+                          table='energy'):
+    """
+    Bootstraps the difference of every configuration of every experiment
+    from the baseline configuration, using the energy in the given table.
+
+    Returns a list of (experiment, configuration, Bootstrap) tuples. Cached
+    results are reused if the runs of both configurations have not changed.
+    """
+
+    if not re.match('^(?!sqlite_)[A-Za-z0-9_]+$', table):
+        raise ValueError('Invalid table name: ' + table)
+
+    energy = {}
+    for run, experiment, configuration, joules in conn.execute(r'''
+        SELECT id, experiment, configuration, energy FROM {}
+      ORDER BY id
+    '''.format(table)):
+        energy.setdefault((experiment, configuration), []).append(
+            (run, joules)
+        )
+
+    results = []
+    for (experiment, configuration), runs in sorted(energy.items()):
+        baseline_runs = energy.get((experiment, baseline))
+        if configuration == baseline or baseline_runs is None:
+            continue
+
+        key = {
+            'experiment': experiment,
+            'configuration': configuration,
+            'baseline': baseline,
+            'statistic': statistic,
+            'resamples': resamples,
+            'confidence': confidence,
+            'seed': seed,
+            'version': _version(runs, baseline_runs),
+        }
+        cached = conn.execute(r'''
+            SELECT difference, lower, upper,
+                   percent, percent_lower, percent_upper
+              FROM bootstrap
+             WHERE experiment = :experiment
+               AND configuration = :configuration
+               AND baseline = :baseline
+               AND statistic = :statistic
+               AND resamples = :resamples
+               AND confidence = :confidence
+               AND seed = :seed
+               AND version = :version
+        ''', key).fetchone()
+        if cached is not None:
+            results.append((experiment, configuration, Bootstrap(*cached)))
+            continue
+
+        logger.info('Bootstrapping %s on %s versus %s', experiment,
+                    configuration, baseline)
+        result = bootstrap_difference(
+            [joules for _, joules in runs],
+            [joules for _, joules in baseline_runs],
+            statistic, resamples, confidence, seed, processes
+        )
+        with conn:
+            conn.execute(r'''
+                INSERT OR REPLACE INTO bootstrap (
+                    experiment, configuration, baseline, statistic,
+                    resamples, confidence, seed, version,
+                    difference, lower, upper,
+                    percent, percent_lower, percent_upper
+                ) VALUES (
+                    :experiment, :configuration, :baseline, :statistic,
+                    :resamples, :confidence, :seed, :version,
+                    :difference, :lower, :upper,
+                    :percent, :percent_lower, :percent_upper
+                )
+            ''', dict(key, **result._asdict()))
+        results.append((experiment, configuration, result))
+
+    return results
+
+
+def _version(*groups):
+    """
+    Returns a digest of the runs, and their energy, of the given groups.
+    """
+    digest = hashlib.sha1()
+    for runs in groups:
+        digest.update(repr(runs).encode('UTF-8'))
+    return digest.hexdigest()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Splits the power trace of every run into segments of steady mean power by
+binary segmentation, so that, e.g., the steady state of runs can be compared
+without picking cutoffs by hand::
+
+    $ python -m measurements segment energy.sqlite
+
+Each trace is interpolated as in the energy aggregation. The longest segment
+of a run is labelled `steady`; segments before it are `warmup`, and segments
+after it are `tail`. Segments are stored in the `segment` table; runs that
+already have segments are skipped.
+
+Runs are segmented in parallel, by a pool of processes. Binary segmentation
+takes O(n log n) time for a trace of n samples with few change points, since
+every candidate split of a segment is scored at once from prefix sums.
+
+Requires NumPy.
+"""
+
+import logging
+import math
+import multiprocessing
+from collections import namedtuple
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+
+from .energy_aggregation import Measurement, interpoloate_missing_measurements
+
+__all__ = ['Segment', 'change_points', 'segment_trace', 'segment_runs']
+
+logger = logging.getLogger(__name__)
+
+Segment = namedtuple('Segment', 'number label started ended samples energy '
+                                'power_mean')
+
+
+def change_points(watts, penalty=3.0, min_size=5):
+    """
+    Returns the sorted indices at which the mean of the given trace changes.
+
+    A split is made if it reduces the sum of squared deviations from the
+    segment means by more than penalty * σ² * log(n), where σ² is the
+    variance of the noise, estimated from the differences between
+    consecutive samples. Segments are at least min_size samples long.
+    """
+
+    watts = np.asarray(watts, dtype=float)
+    n = len(watts)
+    if n < 2 * min_size:
+        return []
+
+    threshold = penalty * _noise(watts) * math.log(n)
+    sums = np.concatenate(([0.0], np.cumsum(watts)))
+    squares = np.concatenate(([0.0], np.cumsum(watts ** 2)))
+
+    def cost(start, end):
+        # Sum of squared deviations from the mean of watts[start:end].
+        total = sums[end] - sums[start]
+        return (squares[end] - squares[start]) - total ** 2 / (end - start)
+
+    points = []
+    pending = [(0, n)]
+    while pending:
+        start, end = pending.pop()
+        if end - start < 2 * min_size:
+            continue
+        splits = np.arange(start + min_size, end - min_size + 1)
+        gains = cost(start, end) - cost(start, splits) - cost(splits, end)
+        best = int(np.argmax(gains))
+        if gains[best] <= threshold:
+            continue
+        split = int(splits[best])
+        points.append(split)
+        pending.extend([(start, split), (split, end)])
+
+    return sorted(points)
+
+
+def segment_trace(samples, penalty=3.0, min_size=5, period=1000.0):
+    """
+    Returns the Segments of a run, given its measurements, which are
+    `period` milliseconds apart.
+
+    Note: This mutates the original list of measurements!
+    """
+
+    interpoloate_missing_measurements(samples, period)
+    # Interpolated samples are appended at the end; put them in their place.
+    samples.sort(key=lambda s: s.timestamp)
+    if not samples:
+        return []
+
+    watts = np.array([sample.watts for sample in samples])
+    bounds = [0] + change_points(watts, penalty, min_size) + [len(samples)]
+    pieces = list(zip(bounds, bounds[1:]))
+    steady = max(range(len(pieces)),
+                 key=lambda i: pieces[i][1] - pieces[i][0])
+
+    segments = []
+    for number, (start, end) in enumerate(pieces):
+        label = ('warmup' if number < steady else
+                 'steady' if number == steady else 'tail')
+        total = math.fsum(watts[start:end])
+        segments.append(Segment(number, label,
+                                samples[start].timestamp,
+                                samples[end - 1].timestamp,
+                                end - start, total * period / 1000.0,
+                                total / (end - start)))
+    return segments
+
+
+def segment_runs(conn, penalty=3.0, min_size=5, processes=None):
+    """
+    Segments every run that has not been segmented yet, in parallel, and
+    stores the segments. Returns the number of runs segmented.
+    """
+
+    periods = dict(conn.execute(r'''
+        SELECT id, COALESCE(period, 1000) FROM run
+    '''))
+    cursor = conn.execute(r'''
+        SELECT run, power, timestamp
+          FROM measurement
+         WHERE run NOT IN (SELECT run FROM segment)
+      ORDER BY run
+    ''')
+    runs = []
+    traces = []
+    for run, rows in groupby(cursor, key=itemgetter(0)):
+        runs.append(run)
+        traces.append(([Measurement(float(power), timestamp)
+                        for _, power, timestamp in rows],
+                       penalty, min_size, periods[run]))
+    if not runs:
+        return 0
+
+    if len(runs) > 1 and processes != 1:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.starmap(segment_trace, traces)
+    else:
+        results = [segment_trace(*trace) for trace in traces]
+
+    with conn:
+        conn.executemany(r'''
+            INSERT INTO segment (run, number, label, started, ended,
+                                 samples, energy, power_mean)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ((run,) + tuple(segment)
+              for run, segments in zip(runs, results)
+              for segment in segments))
+
+    logger.info('Segmented %d runs', len(runs))
+    return len(runs)
+
+
+def _noise(watts):
+    """
+    Estimates the variance of the noise of a trace, from the median absolute
+    difference of consecutive samples, which is hardly affected by a few
+    changes in the mean.
+    """
+    differences = np.diff(watts)
+    sigma = np.median(np.abs(differences)) / (0.6745 * math.sqrt(2))
+    if sigma == 0:
+        # Readings are quantized; most consecutive samples may be equal.
+        sigma = np.std(differences) / math.sqrt(2)
+    return max(sigma ** 2, 1e-12)
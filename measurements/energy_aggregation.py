@@ -1,16 +1,23 @@
 #!/usr/bin/env python
 
+import json
 import logging
 import math
 
-from itertools import islice
-from collections import namedtuple
+from itertools import accumulate, islice
+from collections import Counter, namedtuple
 
-__all__ = ['EnergyAggregation']
+__all__ = ['EnergyAggregation', 'StreamingEnergyAggregation', 'EnergySummary',
+           'energy_by_phase', 'cumulative_energy', 'sampling_period']
 
 logger = logging.getLogger(__name__)
 
 Measurement = namedtuple('Measurement', 'watts timestamp')
+PhaseEnergy = namedtuple('PhaseEnergy', 'phase energy started ended')
+
+# The sampling period of the Watts Up?, and of runs recorded before the period
+# was recorded, in milliseconds.
+DEFAULT_PERIOD = 1000.0
 
 
 class EnergyAggregation:
@@ -29,23 +36,32 @@ class EnergyAggregation:
     Then subsequent SQL queries can use it::
 
         SELECT energy(power, timestamp) FROM measurements GROUP BY test_id
+
+    An optional third argument is the sampling period of the samples, in
+    milliseconds (by default, one second); each sample stands for the energy
+    used over one period::
+
+        SELECT energy(power, timestamp, period) ...
     """
 
     def __init__(self):
         # This will collect samples, then in finalize, sum them, and ensure
         # any missing data is interpolated.
         self.measurements = []
+        self.period = DEFAULT_PERIOD
 
-    def step(self, watts, timestamp):
+    def step(self, watts, timestamp, period=DEFAULT_PERIOD):
         # Simply accumulate samples.
         sample = Measurement(float(watts), timestamp)
         self.measurements.append(sample)
+        self.period = period
 
         return self
 
     def finalize(self):
-        interpoloate_missing_measurements(self.measurements)
-        return math.fsum(sample.watts for sample in self.measurements)
+        interpoloate_missing_measurements(self.measurements, self.period)
+        return (math.fsum(sample.watts for sample in self.measurements) *
+                self.period / 1000.0)
 
     @classmethod
     def install(cls, connection, name='energy'):
@@ -54,11 +70,266 @@ class EnergyAggregation:
         connection. The name is overridable by providing the argument `name`.
         """
         connection.create_aggregate(name, 2, cls)
+        connection.create_aggregate(name, 3, cls)
+
+
+class StreamingEnergyAggregation:
+    """
+    An SQLite aggregation function that approximates energy over time, like
+    EnergyAggregation, but in constant memory: it keeps only the previous
+    sample and a running compensated sum.
+
+    It assumes that samples are given in timestamp order, as they are when
+    SQLite scans the index on measurement(run, timestamp). If they are not,
+    it returns NULL instead of a wrong result; fall back to the buffered
+    `energy()` aggregate in that case::
+
+        SELECT COALESCE(energy_stream(power, timestamp),
+                        (SELECT energy(power, timestamp) ...))
+    """
+
+    def __init__(self):
+        self.previous = None
+        self.ordered = True
+        self.period = DEFAULT_PERIOD
+        # Gaps between samples, and the samples interpolated to fill them.
+        self.gaps = 0
+        self.interpolated = 0
+        # Neumaier's compensated sum.
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def step(self, watts, timestamp, period=DEFAULT_PERIOD):
+        if not self.ordered:
+            return self
+
+        self.period = period
+        sample = Measurement(float(watts), timestamp)
+        previous, self.previous = self.previous, sample
+        if previous is not None:
+            # Leave anything the buffered path would reject to it.
+            if (sample.timestamp <= previous.timestamp or
+                    round((sample.timestamp - previous.timestamp) /
+                          period) < 1):
+                self.ordered = False
+                return self
+            # Interpolate as the buffered path does: copy the previous
+            # sample for every one that is missing.
+            missing = missing_measurements(previous, sample, period)
+            if missing:
+                self.gaps += 1
+                self.interpolated += missing
+                self._add(previous.watts * missing)
+        self._add(sample.watts)
+
+        return self
+
+    def finalize(self):
+        if not self.ordered:
+            return None
+        return (self.total + self.compensation) * self.period / 1000.0
+
+    def _add(self, value):
+        total = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - total) + value
+        else:
+            self.compensation += (value - total) + self.total
+        self.total = total
+
+    @classmethod
+    def install(cls, connection, name='energy_stream'):
+        """
+        Installs the aggregate function named 'energy_stream' on the given
+        SQLite connection. The name is overridable by providing the argument
+        `name`.
+        """
+        connection.create_aggregate(name, 2, cls)
+        connection.create_aggregate(name, 3, cls)
+
+
+class EnergySummary(StreamingEnergyAggregation):
+    """
+    An SQLite aggregation function that summarizes the samples of a run in a
+    single streaming pass. Since an aggregate returns one value, the summary
+    is a JSON object; take its fields apart with json_extract()::
+
+        SELECT json_extract(summary, '$.power_mean')
+          FROM (SELECT energy_summary(power, timestamp) as summary ...)
+
+    As with energy(), an optional third argument is the sampling period.
+
+    Its fields are:
+
+     - energy, gaps, and interpolated: as computed by energy_stream(), and
+       hence null if the samples were not in timestamp order;
+     - started, ended: the first and last timestamps;
+     - samples: the number of samples, not counting interpolated samples;
+     - power_mean, power_variance (of a sample, as R's var()), power_min,
+       power_max: of the samples, not counting interpolated samples;
+     - power_p50, power_p95, power_p99: approximate percentiles of power,
+       within half a bucket (0.05 W) of the exact nearest-rank percentiles.
+    """
+
+    BUCKET = 0.1  # watts
+
+    def __init__(self):
+        super().__init__()
+        self.started = self.ended = None
+        self.samples = 0
+        # Welford's running mean and sum of squared differences.
+        self.mean = 0.0
+        self.squares = 0.0
+        self.minimum = self.maximum = None
+        self.histogram = Counter()
+
+    def step(self, watts, timestamp, period=DEFAULT_PERIOD):
+        watts = float(watts)
+        if self.samples == 0:
+            self.started = self.ended = timestamp
+            self.minimum = self.maximum = watts
+        else:
+            self.started = min(self.started, timestamp)
+            self.ended = max(self.ended, timestamp)
+            self.minimum = min(self.minimum, watts)
+            self.maximum = max(self.maximum, watts)
+
+        self.samples += 1
+        delta = watts - self.mean
+        self.mean += delta / self.samples
+        self.squares += delta * (watts - self.mean)
+        self.histogram[math.floor(watts / self.BUCKET)] += 1
+
+        return super().step(watts, timestamp, period)
+
+    def finalize(self):
+        ordered = self.ordered
+        summary = {
+            'energy': super().finalize(),
+            'gaps': self.gaps if ordered else None,
+            'interpolated': self.interpolated if ordered else None,
+            'started': self.started,
+            'ended': self.ended,
+            'samples': self.samples,
+            'power_mean': self.mean if self.samples else None,
+            'power_variance': (self.squares / (self.samples - 1)
+                               if self.samples > 1 else None),
+            'power_min': self.minimum,
+            'power_max': self.maximum,
+        }
+        for percent in (50, 95, 99):
+            summary['power_p{}'.format(percent)] = self.percentile(percent)
+        return json.dumps(summary)
+
+    def percentile(self, percent):
+        """
+        Returns the approximate percentile of power, as the middle of the
+        bucket holding the nearest-rank percentile.
+        """
+        if not self.samples:
+            return None
+
+        rank = max(math.ceil(percent / 100 * self.samples), 1)
+        seen = 0
+        for bucket in sorted(self.histogram):
+            seen += self.histogram[bucket]
+            if seen >= rank:
+                break
+        middle = (bucket + 0.5) * self.BUCKET
+        return min(max(middle, self.minimum), self.maximum)
+
+    @classmethod
+    def install(cls, connection, name='energy_summary'):
+        """
+        Installs the aggregate function named 'energy_summary' on the given
+        SQLite connection. The name is overridable by providing the argument
+        `name`.
+        """
+        connection.create_aggregate(name, 2, cls)
+        connection.create_aggregate(name, 3, cls)
 
 
-def interpoloate_missing_measurements(measurements):
+def energy_by_phase(measurements, phases, period=DEFAULT_PERIOD):
     """
-    Adds missing samples to the given list of measurements.
+    Apportions the energy of one run to its phases in a single pass over its
+    samples.
+
+    `phases` is a sequence of (name, timestamp) markers; each phase lasts
+    until the next marker. Samples before the first marker are attributed to
+    a phase named None.
+
+    For every phase, `started` is the timestamp of its marker (or of the
+    first sample, for the phase named None) and `ended` is the timestamp of
+    its last sample. A phase without any samples ends when it starts.
+
+    Returns a list of PhaseEnergy tuples in chronological order. The samples
+    are `period` milliseconds apart.
+
+    Note: This mutates the original list of measurements!
+    """
+    interpoloate_missing_measurements(measurements, period)
+    scale = period / 1000.0
+    # Interpolated samples are appended at the end; put them in their place.
+    measurements.sort(key=lambda s: s.timestamp)
+    markers = sorted(phases, key=lambda marker: marker[1])
+
+    results = []
+    # The phase currently accumulating samples.
+    name, started, ended, watts = None, None, None, []
+    upcoming = 0
+
+    for sample in measurements:
+        # Switch to the latest phase that began at or before this sample.
+        while (upcoming < len(markers) and
+               markers[upcoming][1] <= sample.timestamp):
+            if name is not None or watts:
+                results.append(PhaseEnergy(name, math.fsum(watts) * scale,
+                                           started, ended))
+            (name, started), watts = markers[upcoming], []
+            ended = started
+            upcoming += 1
+
+        if started is None:
+            started = sample.timestamp
+        ended = sample.timestamp
+        watts.append(sample.watts)
+
+    if name is not None or watts:
+        results.append(PhaseEnergy(name, math.fsum(watts) * scale, started,
+                                   ended))
+
+    # Phases that began after the last sample consumed no energy.
+    for name, timestamp in markers[upcoming:]:
+        results.append(PhaseEnergy(name, 0.0, timestamp, timestamp))
+
+    return results
+
+
+def cumulative_energy(measurements, period=DEFAULT_PERIOD):
+    """
+    Returns the running total of energy of one run, as a list of
+    (timestamp, energy) pairs, where energy is the energy of every
+    interpolated sample, `period` milliseconds each, up to and including the
+    timestamp.
+
+    The energy between two timestamps is then the difference of two totals,
+    found by binary search.
+
+    Note: This mutates the original list of measurements!
+    """
+    interpoloate_missing_measurements(measurements, period)
+    # Interpolated samples are appended at the end; put them in their place.
+    measurements.sort(key=lambda s: s.timestamp)
+    scale = period / 1000.0
+    totals = accumulate(sample.watts * scale for sample in measurements)
+    return [(sample.timestamp, total)
+            for sample, total in zip(measurements, totals)]
+
+
+def interpoloate_missing_measurements(measurements, period=DEFAULT_PERIOD):
+    """
+    Adds missing samples to the given list of measurements, which are
+    `period` milliseconds apart.
 
     Note: This mutates the original list!
     """
@@ -74,7 +345,7 @@ def interpoloate_missing_measurements(measurements):
 
     for first, second in pairs(measurements):
         # Determine the number of missing measurements.
-        number_missing = missing_measurements(first, second)
+        number_missing = missing_measurements(first, second, period)
         if number_missing == 0:
             continue
 
@@ -89,7 +360,7 @@ def interpoloate_missing_measurements(measurements):
         # It's like "floored nearest neighbour" interpolation.
         for i in range(number_missing):
             # Estimated time in milliseconds for this interpolated sample.
-            estimated_time = 1000 * (i + 1) + first.timestamp
+            estimated_time = period * (i + 1) + first.timestamp
             sample = Measurement(watts=first.watts,
                                  timestamp=estimated_time)
             interpolated.append(sample)
@@ -98,18 +369,51 @@ def interpoloate_missing_measurements(measurements):
     return measurements
 
 
-def missing_measurements(first, second):
+def missing_measurements(first, second, period=DEFAULT_PERIOD):
     """
-    Returns the number of estimated missing measurements. Usually, this
-    returns 0.
+    Returns the number of estimated missing measurements between two samples
+    that should be `period` milliseconds apart. Usually, this returns 0.
+
+    Raises ValueError if the samples are less than half a period apart, and
+    hence cannot both be placed on the grid of periods. Such runs are found
+    by `python -m measurements quality`, and may be excluded.
     """
-    assert second.timestamp > first.timestamp
-    difference = (second.timestamp - first.timestamp) / 1000.0  # in seconds
+    difference = (second.timestamp - first.timestamp) / period  # in periods
 
-    assert round(difference) >= 1
+    if round(difference) < 1:
+        raise ValueError(
+            'Samples at {} and {} are less than half a period ({} ms) '
+            'apart'.format(first.timestamp, second.timestamp, period)
+        )
     return round(difference) - 1
 
 
+def sampling_period(timestamps):
+    """
+    Detects the sampling period, in milliseconds, of samples with the given
+    timestamps, as the mean time between chronologically consecutive samples,
+    leaving out gaps and bursts (intervals more than half the median away
+    from it). This is snapped to a whole number of samples per second (or,
+    for slow meters, of seconds per sample), so that jitter does not skew the
+    energy.
+
+    Returns None if there are not two distinct timestamps.
+    """
+    timestamps = sorted(timestamps)
+    intervals = sorted(second - first for first, second in pairs(timestamps)
+                       if second > first)
+    if not intervals:
+        return None
+
+    median = intervals[len(intervals) // 2]
+    typical = [interval for interval in intervals
+               if abs(interval - median) <= median / 2]
+    mean = math.fsum(typical) / len(typical)
+    if mean >= 1000:
+        return 1000.0 * round(mean / 1000)
+    return 1000.0 / round(1000 / mean)
+
+
 def pairs(iterable):
     """
     Yields each consecutive pair of an iterable.
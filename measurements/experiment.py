@@ -5,11 +5,22 @@
 Tests defining and running an Experiment.
 """
 
+import logging
 import multiprocessing
 
 from types import FunctionType
+from collections.abc import Mapping
 
-__all__ = ['Experiment']
+from . import utc_date
+from .parsers import parse_output
+
+__all__ = ['Experiment', 'phase', 'report', 'report_output']
+
+logger = logging.getLogger(__name__)
+
+# The sending end of a pipe back to Measurements.run(). This is only set in
+# the child process while the experiment is running.
+_channel = None
 
 
 class Experiment:
@@ -50,11 +61,24 @@ class Experiment:
         """
         return self._fn.__doc__
 
-    def run(self):
+    def run(self, channel=None):
         """
         Run the experiment once.
+
+        If given, channel is the sending end of a multiprocessing.Pipe; any
+        notifications made by the experiment (e.g., phase()) are sent through
+        it. If the experiment returns a dictionary, it is reported as the
+        workload counters of the run (see report()).
         """
-        return self._fn()
+        global _channel
+        _channel = channel
+        try:
+            result = self._fn()
+            if isinstance(result, Mapping):
+                report(**result)
+            return result
+        finally:
+            _channel = None
 
     def run_before_each(self):
         """
@@ -68,3 +92,69 @@ class Experiment:
         Decorator that registers the function to run before each test run.
         """
         self._before_fn = fn
+
+
+def phase(name):
+    """
+    Marks the beginning of a named phase of the current run (e.g., 'warmup',
+    'steady', 'teardown'). The phase lasts until the next phase begins, or
+    until the run ends.
+
+    To be called from within an experiment::
+
+        @Experiment
+        def benchmark():
+            phase('warmup')
+            ...
+            phase('steady')
+            ...
+
+    Does nothing when the experiment is not run by Measurements.run().
+    """
+    _notify('phase', name, utc_date.to_timestamp(utc_date.now()))
+
+
+def report(operations=None, bytes=None, transactions=None):
+    """
+    Reports workload counters of the current run, so that its energy can be
+    normalized per unit of work:
+
+     - operations -- units of work (e.g., queries, requests)
+     - bytes -- bytes processed
+     - transactions -- database transactions completed
+
+    Counters are added to any previously reported in the same run. An
+    experiment may instead return a dictionary with these keys.
+
+    Does nothing when the experiment is not run by Measurements.run().
+    """
+    _notify('workload', {'operations': operations,
+                         'bytes': bytes,
+                         'transactions': transactions})
+
+
+def report_output(tool, output):
+    """
+    Reports the output of a benchmark tool (e.g., 'redis-benchmark',
+    'pgbench', 'tsung'), so that its throughput and latency are stored with
+    the current run. See measurements.parsers for the supported tools.
+
+    Returns the parsed Throughput records, e.g., to report() the workload
+    that the tool actually completed.
+
+    Only parses the output when the experiment is not run by
+    Measurements.run().
+    """
+    records = parse_output(tool, output)
+    _notify('output', tool, str(output))
+    return records
+
+
+def _notify(*message):
+    """
+    Sends a message to Measurements.run(), if it is listening.
+    """
+    if _channel is None:
+        logger.debug('Not running in Measurements; dropped %r', message)
+        return
+    _channel.send(message)
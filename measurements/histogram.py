@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Precomputes two-dimensional histograms of power over elapsed time, for every
+pair of experiment and configuration, so that density plots render from a few
+hundred bin counts rather than every measurement::
+
+    $ python -m measurements histogram energy.sqlite
+
+The bins of all pairs are counted in a single vectorized pass over the
+measurements. Every configuration of an experiment shares the same bin edges,
+so that their plots can be faceted on the same scales.
+
+Requires NumPy.
+"""
+
+import logging
+
+import numpy as np
+
+__all__ = ['power_histograms', 'write_power_histograms']
+
+logger = logging.getLogger(__name__)
+
+
+def power_histograms(conn, bins=35):
+    """
+    Returns the histograms of power over elapsed time, as a list of tuples:
+
+        (experiment, configuration, time_bin, power_bin,
+         time_low, time_high, power_low, power_high, count)
+
+    Elapsed time is in seconds since the first measurement of each run;
+    power is in watts. Only bins with at least one sample are returned.
+    """
+
+    rows = conn.execute(r'''
+        SELECT experiment, configuration, power,
+               (timestamp - first_timestamp) / 1000.0
+          FROM measurement JOIN run ON measurement.run = run.id
+    ''').fetchall()
+    if not rows:
+        return []
+
+    experiments, configurations, power, elapsed = zip(*rows)
+    power = np.array(power, dtype=float)
+    elapsed = np.array(elapsed, dtype=float)
+    experiment_names, experiment = np.unique(experiments, return_inverse=True)
+    configuration_names, configuration = np.unique(configurations,
+                                                   return_inverse=True)
+
+    # The range of each experiment.
+    def extremes(values):
+        low = np.full(len(experiment_names), np.inf)
+        high = np.full(len(experiment_names), -np.inf)
+        np.minimum.at(low, experiment, values)
+        np.maximum.at(high, experiment, values)
+        # Give degenerate ranges some width, as numpy.histogram does.
+        degenerate = high == low
+        low[degenerate] -= 0.5
+        high[degenerate] += 0.5
+        return low, high
+
+    time_low, time_high = extremes(elapsed)
+    power_low, power_high = extremes(power)
+
+    def bin_of(values, low, high):
+        scaled = (values - low[experiment]) / (high - low)[experiment]
+        # The maximum belongs to the last bin.
+        return np.minimum((scaled * bins).astype(int), bins - 1)
+
+    time_bin = bin_of(elapsed, time_low, time_high)
+    power_bin = bin_of(power, power_low, power_high)
+
+    # Count every (experiment, configuration, time, power) bin at once.
+    pairs = len(experiment_names) * len(configuration_names)
+    index = (((experiment * len(configuration_names) + configuration)
+              * bins + time_bin) * bins + power_bin)
+    counts = np.bincount(index, minlength=pairs * bins * bins)
+
+    histograms = []
+    for flat in np.flatnonzero(counts):
+        pair, time_index, power_index = (flat // (bins * bins),
+                                         flat // bins % bins, flat % bins)
+        e, c = divmod(pair, len(configuration_names))
+        time_width = (time_high[e] - time_low[e]) / bins
+        power_width = (power_high[e] - power_low[e]) / bins
+        histograms.append((
+            str(experiment_names[e]), str(configuration_names[c]),
+            int(time_index), int(power_index),
+            float(time_low[e] + time_index * time_width),
+            float(time_low[e] + (time_index + 1) * time_width),
+            float(power_low[e] + power_index * power_width),
+            float(power_low[e] + (power_index + 1) * power_width),
+            int(counts[flat])
+        ))
+
+    logger.debug('Counted %d samples into %d bins', len(rows), len(histograms))
+    return histograms
+
+
+def write_power_histograms(conn, bins=35):
+    """
+    Replaces the contents of the power_histogram table with freshly computed
+    histograms.
+    """
+
+    histograms = power_histograms(conn, bins)
+    with conn:
+        conn.execute('DELETE FROM power_histogram')
+        conn.executemany(r'''
+            INSERT INTO power_histogram (
+                experiment, configuration, time_bin, power_bin,
+                time_low, time_high, power_low, power_high, count
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', histograms)
+    return histograms
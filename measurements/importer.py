@@ -0,0 +1,264 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Imports raw captures of wattsup, and journals of the Watts Up? monitor (see
+measurements.journal), as new runs::
+
+    $ python -m measurements import energy.sqlite idle.log \\
+        --configuration native --experiment idle
+
+Logs are the standard output of wattsup, one reading in watts per line,
+optionally with each line prefixed by its time, e.g., by `ts` (moreutils)::
+
+    $ wattsup ttyUSB0 watts | ts '%.s' > idle.log
+
+Every line of a log is one of:
+
+    WATTS                               read one period after the last line;
+                                        the first at --started
+    TIME WATTS                          TIME is Unix time in seconds, or an
+                                        ISO 8601 date (UTC, unless given)
+    # run CONFIGURATION EXPERIMENT      starts a run
+    # end                               ends the current run
+
+Blank lines and other comments are ignored; lines that cannot be parsed are
+counted, logged, and skipped.
+
+Samples are assigned to runs by the time ranges given in a file of tab
+separated `configuration experiment started ended` lines (--runs), or else
+by the markers in the log, or else the whole log is one run of --experiment
+on --configuration.
+
+Logs are parsed in parallel, one per process, and all runs are loaded with
+batched inserts in a single transaction.
+"""
+
+import bisect
+import logging
+import multiprocessing
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from . import utc_date
+from .energy_aggregation import DEFAULT_PERIOD, sampling_period
+from .journal import read_journal
+from .run import rollup_run
+
+__all__ = ['Log', 'parse_log', 'parse_time', 'read_ranges', 'assign_runs',
+           'import_logs']
+
+logger = logging.getLogger(__name__)
+
+# The samples of a log as (watts, timestamp) pairs, in the order they were
+# logged. Markers are (index of the next sample, configuration, experiment),
+# where the configuration and experiment of an end marker are None.
+Log = namedtuple('Log', 'path samples markers rejected')
+
+
+def parse_time(text):
+    """
+    Returns the Unix timestamp in milliseconds of Unix time in seconds, or of
+    an ISO 8601 date (in UTC, unless it has a time zone).
+    """
+    try:
+        return 1000.0 * float(text)
+    except ValueError:
+        pass
+
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    date = datetime.fromisoformat(text)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return utc_date.to_timestamp(date)
+
+
+def parse_log(path, started=None, period=None):
+    """
+    Parses a log (or, if the path ends with .journal, reads a journal).
+
+    Lines without a time are `period` milliseconds (by default, one second)
+    after the previous line, the first at `started` (a Unix timestamp in
+    milliseconds); if there are any, `started` is required.
+    """
+
+    if str(path).endswith('.journal'):
+        return Log(str(path), [(watts, timestamp) for timestamp, watts
+                               in read_journal(path)], [], 0)
+
+    step = DEFAULT_PERIOD if period is None else period
+    samples = []
+    append = samples.append
+    markers = []
+    rejected = 0
+    # The time of the previous line.
+    time = None if started is None else started - step
+
+    with open(str(path), 'rb') as log:
+        for number, line in enumerate(log, 1):
+            fields = line.split()
+            if not fields:
+                continue
+            if fields[0].startswith(b'#'):
+                marker = _marker(fields)
+                if marker is not None:
+                    markers.append((len(samples),) + marker)
+                continue
+
+            try:
+                if len(fields) == 2:
+                    try:
+                        # Unix time, the usual case, without decoding.
+                        time = 1000.0 * float(fields[0])
+                    except ValueError:
+                        time = parse_time(fields[0].decode('ascii'))
+                    append((float(fields[1]), time))
+                elif len(fields) == 1:
+                    if time is None:
+                        raise ValueError('Untimed samples need a start time')
+                    time += step
+                    append((float(fields[0]), time))
+                else:
+                    raise ValueError('Too many fields')
+            except ValueError as error:
+                rejected += 1
+                logger.debug('%s:%d: %s', path, number, error)
+
+    if rejected:
+        logger.warning('Skipped %d lines of %s that could not be parsed',
+                       rejected, path)
+    return Log(str(path), samples, markers, rejected)
+
+
+def _marker(fields):
+    words = [field.decode('UTF-8') for field in fields]
+    if words[0] == '#':
+        words = words[1:]
+    else:
+        words[0] = words[0][1:]
+    if len(words) == 3 and words[0] == 'run':
+        return words[1], words[2]
+    if words == ['end']:
+        return None, None
+    return None
+
+
+def read_ranges(path):
+    """
+    Reads a file of tab separated `configuration experiment started ended`
+    lines, where times are as in logs, and returns them as tuples, with
+    times as Unix timestamps in milliseconds.
+    """
+    ranges = []
+    with open(str(path)) as lines:
+        for line in lines:
+            if not line.strip() or line.startswith('#'):
+                continue
+            configuration, experiment, started, ended = \
+                line.rstrip('\n').split('\t')
+            ranges.append((configuration, experiment,
+                           parse_time(started), parse_time(ended)))
+    return ranges
+
+
+def assign_runs(log, ranges=None, configuration=None, experiment=None):
+    """
+    Splits the samples of a log into runs, as (configuration, experiment,
+    samples) tuples: by the given (configuration, experiment, started,
+    ended) time ranges, inclusive; or else by the markers of the log; or else
+    into a single run of the experiment on the configuration.
+    """
+
+    if ranges:
+        samples = sorted(log.samples, key=lambda sample: sample[1])
+        timestamps = [timestamp for _, timestamp in samples]
+        runs = []
+        for run_configuration, run_experiment, started, ended in ranges:
+            start = bisect.bisect_left(timestamps, started)
+            end = bisect.bisect_right(timestamps, ended)
+            if start < end:
+                runs.append((run_configuration, run_experiment,
+                             samples[start:end]))
+        return runs
+
+    if log.markers:
+        runs = []
+        bounds = log.markers + [(len(log.samples), None, None)]
+        for (start, run_configuration, run_experiment), (end, _, _) in \
+                zip(bounds, bounds[1:]):
+            if run_configuration is not None and start < end:
+                runs.append((run_configuration, run_experiment,
+                             log.samples[start:end]))
+        return runs
+
+    if configuration is None or experiment is None:
+        raise ValueError('{} has no run markers; give the configuration and '
+                         'experiment of its run'.format(log.path))
+    return [(configuration, experiment, log.samples)] if log.samples else []
+
+
+def import_logs(conn, paths, configuration=None, experiment=None, ranges=None,
+                started=None, period=None, processes=None):
+    """
+    Parses the given logs, in parallel, and loads their runs (see
+    assign_runs()) into the database in a single transaction. Returns the
+    ids of the new runs.
+
+    Configurations and experiments are defined as needed. If period is
+    None, the sampling period of each run is detected.
+    """
+
+    arguments = [(path, started, period) for path in paths]
+    if len(arguments) > 1 and processes != 1:
+        with multiprocessing.Pool(processes) as pool:
+            logs = pool.starmap(parse_log, arguments)
+    else:
+        logs = [parse_log(*argument) for argument in arguments]
+
+    runs = [run for log in logs
+            for run in assign_runs(log, ranges, configuration, experiment)]
+
+    ids = []
+    with conn:
+        for run_configuration, run_experiment, samples in runs:
+            ids.append(_insert_run(conn, run_configuration, run_experiment,
+                                   samples, period))
+
+    logger.info('Imported %d samples into %d runs from %d logs',
+                sum(len(samples) for _, _, samples in runs), len(ids),
+                len(logs))
+    return ids
+
+
+def _insert_run(conn, configuration, experiment, samples, period):
+    run = uuid.uuid1().hex
+    timestamps = [timestamp for _, timestamp in samples]
+    first, last = min(timestamps), max(timestamps)
+    if period is None:
+        # As many samples as Run detects the period from.
+        period = sampling_period(timestamps[:1001])
+
+    # Never INSERT OR REPLACE, which would delete their runs.
+    conn.execute(r'''
+        INSERT OR IGNORE INTO configuration (name) VALUES (?)
+    ''', (configuration,))
+    conn.execute(r'''
+        INSERT OR IGNORE INTO experiment (name) VALUES (?)
+    ''', (experiment,))
+
+    conn.execute(r'''
+        INSERT INTO run (id, configuration, experiment, started_at, ended_at,
+                         duration, sample_count, first_timestamp,
+                         last_timestamp, period)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (run, configuration, experiment, first, last, last - first,
+          len(samples), first, last, period))
+    conn.executemany(r'''
+        INSERT INTO measurement (run, power, timestamp)
+        VALUES (?, ?, ?)
+    ''', ((run, watts, timestamp) for watts, timestamp in samples))
+    rollup_run(conn, run)
+
+    return run
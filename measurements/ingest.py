@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+A single writer for an SQLite database, shared by any number of producers
+(e.g., one thread per meter or benchmark), since SQLite allows only one
+writer at a time::
+
+    ingest = IngestQueue('energy.sqlite')
+    ingest.define_configuration('native')
+    ingest.define_experiment('idle')
+
+    # In any number of threads:
+    with ingest.run_test('native', 'idle') as log:
+        log += power_in_watts
+
+    ingest.close()
+
+Producers queue operations on their runs, through the same API as
+measurements.run.Run. A writer thread owns the only connection to the
+database, applies the operations in the order they were queued, and commits
+them in groups of up to `group_size` operations, however many runs they
+belong to. Hence, producers never wait for locks, and a busy queue is
+committed in few, large transactions.
+
+Runs are recorded with checkpoints (see Run), so the runs that are being
+recorded when the process crashes are left incomplete, up to their last
+group; see `python -m measurements recover`. Leaving the context of a run
+waits until the run is committed, and raises a RuntimeError if the writer
+could not record it.
+"""
+
+import logging
+import queue
+import threading
+
+from . import utc_date
+from .run import Run
+
+__all__ = ['IngestQueue']
+
+logger = logging.getLogger(__name__)
+
+
+class IngestQueue:
+    """
+    Queues the operations of producers, for a writer thread to apply to the
+    database at the given path. At most `maxsize` operations are queued at
+    a time (by default, any number); producers wait for the writer beyond
+    that.
+    """
+
+    def __init__(self, database, group_size=1000, maxsize=0):
+        if group_size < 1:
+            raise ValueError('Groups need at least one operation')
+
+        self.database = database
+        self.group_size = group_size
+        self._queue = queue.Queue(maxsize)
+        # Set by the writer, for the producers of runs it has committed.
+        self._committed = []
+        self._writer = threading.Thread(target=self._write,
+                                        name='Ingest writer', daemon=True)
+        self._writer.start()
+
+    def run_test(self, configuration, experiment, period=None):
+        """
+        Returns a run of the experiment on the configuration, to be used in
+        a context manager, as Measurements.run_test().
+        """
+        return QueuedRun(self, configuration, experiment, period)
+
+    def define_configuration(self, name, description=None):
+        """
+        Ensures a configuration with the given name exists in the database.
+        Unlike Measurements.define_configuration(), an existing configuration
+        (and its runs) is left as it is.
+        """
+        self._put(_define, 'configuration', name, description)
+        return name
+
+    def define_experiment(self, name, description=None):
+        """
+        Ensures an experiment with the given name exists in the database,
+        as define_configuration().
+        """
+        self._put(_define, 'experiment', name, description)
+        return name
+
+    def close(self):
+        """
+        Waits until every queued operation is committed, and stops the
+        writer.
+        """
+        self._queue.put(None)
+        self._writer.join()
+
+    def _put(self, operation, *args):
+        if not self._writer.is_alive():
+            raise RuntimeError('The ingest queue is closed')
+        self._queue.put((operation, args))
+
+    def _write(self):
+        # The connection must be made in the thread that uses it.
+        from .measurements import Measurements
+
+        conn = Measurements(str(self.database)).conn
+        deferred = _DeferredCommits(conn)
+        closing = False
+
+        while not closing:
+            group = [self._queue.get()]
+            while len(group) < self.group_size:
+                try:
+                    group.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            for item in group:
+                if item is None:
+                    closing = True
+                    continue
+                operation, args = item
+                try:
+                    operation(deferred, *args)
+                except Exception:
+                    logger.exception('Could not apply %s',
+                                     getattr(operation, '__name__', operation))
+
+            conn.commit()
+            committed, self._committed = self._committed, []
+            for done in committed:
+                done.set()
+
+        conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+
+class QueuedRun:
+    """
+    A run whose operations are queued for the writer of an IngestQueue, with
+    the same methods to record it as Run. Its `id` is known once it has been
+    committed.
+    """
+
+    def __init__(self, ingest, configuration, experiment, period=None):
+        self.configuration = configuration
+        self.experiment = experiment
+        self.period = period
+        self.id = None
+        self.error = None
+        self._ingest = ingest
+        self._run = None
+        self._done = threading.Event()
+
+    def __enter__(self):
+        self._ingest._put(self._begin)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._ingest._put(self._end, exc_type, exc_value, traceback)
+        while not self._done.wait(1.0):
+            if not self._ingest._writer.is_alive():
+                raise RuntimeError('The ingest writer stopped')
+        if exc_type is None and self.error is not None:
+            raise RuntimeError('Could not record run of {} on {}'.format(
+                self.experiment, self.configuration
+            )) from self.error
+
+    def add_measurement(self, measurement, time=None):
+        """
+        Add a single power measurement (in watts) to the current run.
+
+        If time is provided, it **MUST** be a datetime object in the UTC
+        timezone.
+        """
+        assert isinstance(measurement, (int, float))
+        if time is None:
+            time = utc_date.now()
+        assert utc_date.is_in_utc(time)
+
+        return self.add_measurements([(measurement, time)])
+
+    def add_measurements(self, samples):
+        """
+        Adds a batch of (watts, time) power measurements, as
+        Run.add_measurements().
+        """
+        return self.add_samples([(watts, utc_date.to_timestamp(time))
+                                 for watts, time in samples])
+
+    def add_samples(self, samples):
+        """
+        Adds a batch of (watts, timestamp) power measurements, as
+        Run.add_samples().
+        """
+        return self._apply('add_samples', list(samples))
+
+    def add_resources(self, sample, time=None):
+        if time is None:
+            time = utc_date.now()
+        return self._apply('add_resources', sample, time)
+
+    def add_phase(self, name, timestamp=None):
+        if timestamp is None:
+            timestamp = utc_date.to_timestamp(utc_date.now())
+        return self._apply('add_phase', name, timestamp)
+
+    def add_workload(self, operations=None, bytes=None, transactions=None):
+        return self._apply('add_workload', operations, bytes, transactions)
+
+    def add_throughput(self, records):
+        return self._apply('add_throughput', list(records))
+
+    def __iadd__(self, measurement):
+        """
+        Same as QueuedRun.add_measurement(power_in_watts).
+        """
+        self.add_measurement(measurement)
+        return self
+
+    def _apply(self, method, *args):
+        self._ingest._put(self._call, method, args)
+        return self
+
+    # The rest is called by the writer.
+
+    def _begin(self, conn):
+        try:
+            self._run = Run(conn, self.configuration, self.experiment,
+                            self.period, checkpoint=self._ingest.group_size)
+            self._run.__enter__()
+        except Exception as error:
+            self.error = error
+            raise
+
+    def _call(self, conn, method, args):
+        if self._run is None or self.error is not None:
+            return
+        try:
+            getattr(self._run, method)(*args)
+        except Exception as error:
+            self.error = error
+            raise
+
+    def _end(self, conn, exc_type, exc_value, traceback):
+        try:
+            if self._run is None or self._run.id is None:
+                return
+            if self.error is not None and exc_type is None:
+                exc_type, exc_value = type(self.error), self.error
+            self._run.__exit__(exc_type, exc_value, traceback)
+            self.id = self._run.id
+        except Exception as error:
+            self.error = error
+            raise
+        finally:
+            self._ingest._committed.append(self._done)
+
+
+class _DeferredCommits:
+    """
+    A connection whose commits and rollbacks are left to the writer, so that
+    the operations of many runs are committed together. Runs recorded with
+    checkpoints delete what they recorded when they fail, rather than
+    rolling back.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _define(conn, table, name, description):
+    conn.execute(r'''
+        INSERT OR IGNORE INTO {} (name, description) VALUES (?, ?)
+    '''.format(table), (name, description))
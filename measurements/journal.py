@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+An append-only journal of raw power samples, kept by the WattsUp? monitor
+process in a memory-mapped file, so that samples survive the Python side of
+the harness stalling or crashing::
+
+    meter = WattsUp(journal='journals/')
+    ...
+    print(meter.journal)  # journals/wattsup-20170301T120000-....journal
+
+A journal is a 16-byte header (b'WUPJ', a version, and the size of a record)
+followed by fixed-size records of a Unix timestamp in milliseconds and power
+in watts, both little-endian doubles. The file is grown in chunks of zeroed
+records; the journal ends at the first record without a timestamp.
+
+Since the file is mapped, every sample is in the page cache as soon as it is
+appended, and is written to disk by the operating system even if the
+process that appended it crashes.
+
+Journals are loaded into the measurement table of a new run, in batches, by
+import_journal() (or Measurements.import_journal()).
+"""
+
+import logging
+import mmap
+import struct
+import uuid
+from datetime import datetime
+from itertools import islice, takewhile
+
+from path import Path
+
+__all__ = ['Journal', 'read_journal', 'import_journal']
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'WUPJ'
+VERSION = 1
+HEADER = struct.Struct('<4sHH8x')
+RECORD = struct.Struct('<dd')  # timestamp (milliseconds), watts
+
+# Records inserted per executemany() when importing.
+BATCH_SIZE = 10000
+
+
+class Journal:
+    """
+    Appends (timestamp, watts) samples to a new journal file. Usage::
+
+        with Journal(path) as journal:
+            journal.append(timestamp, watts)
+    """
+
+    def __init__(self, path, capacity=65536):
+        self.path = Path(path)
+        # Records added whenever the file is full.
+        self.capacity = capacity
+        self.count = 0
+
+        self._file = open(str(self.path), 'x+b')
+        self._file.truncate(HEADER.size + capacity * RECORD.size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size)
+
+    @classmethod
+    def session(cls, directory, prefix='wattsup'):
+        """
+        Returns the path of a new journal in the given directory, named after
+        the time, and made unique by a UUID.
+        """
+        directory = Path(directory)
+        directory.makedirs_p()
+        return directory/'{}-{:%Y%m%dT%H%M%S}-{}.journal'.format(
+            prefix, datetime.utcnow(), uuid.uuid1().hex
+        )
+
+    def append(self, timestamp, watts):
+        """
+        Appends a sample; timestamp is a Unix timestamp in milliseconds.
+        """
+        offset = HEADER.size + self.count * RECORD.size
+        if offset + RECORD.size > len(self._map):
+            self._grow()
+        # The timestamp marks the record as written, so write it last.
+        struct.pack_into('<d', self._map, offset + 8, watts)
+        struct.pack_into('<d', self._map, offset, timestamp)
+        self.count += 1
+        return self
+
+    def flush(self):
+        """
+        Writes the journal to disk.
+        """
+        self._map.flush()
+        return self
+
+    def close(self):
+        if self._map.closed:
+            return
+        self._map.flush()
+        self._map.close()
+        self._file.close()
+
+    def _grow(self):
+        self._map.flush()
+        self._map.close()
+        self._file.truncate(HEADER.size +
+                            (self.count + self.capacity) * RECORD.size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+
+def read_journal(path):
+    """
+    Returns an iterator over every (timestamp, watts) sample of a journal,
+    in the order they were appended.
+    """
+    with open(str(path), 'rb') as journal:
+        data = journal.read()
+
+    if len(data) < HEADER.size:
+        raise ValueError('{} is not a journal'.format(path))
+    magic, version, size = HEADER.unpack_from(data)
+    if magic != MAGIC or size != RECORD.size:
+        raise ValueError('{} is not a journal'.format(path))
+    if version != VERSION:
+        raise ValueError('Unsupported journal version {}'.format(version))
+
+    # Ignore a record cut short, should the file have been truncated.
+    end = HEADER.size + (len(data) - HEADER.size) // size * size
+    records = RECORD.iter_unpack(memoryview(data)[HEADER.size:end])
+    return takewhile(lambda record: record[0] != 0.0, records)
+
+
+def import_journal(measurements, path, configuration, experiment,
+                   started=None, ended=None, period=None):
+    """
+    Loads the samples of a journal from `started` to `ended` (Unix
+    timestamps in milliseconds, inclusive; by default, all of them) into a
+    new run of the experiment on the configuration, in batches of
+    BATCH_SIZE. Returns the id of the run.
+    """
+
+    samples = ((watts, timestamp) for timestamp, watts in read_journal(path)
+               if (started is None or timestamp >= started) and
+                  (ended is None or timestamp <= ended))
+
+    with measurements.run_test(configuration, experiment, period) as run:
+        while True:
+            batch = list(islice(samples, BATCH_SIZE))
+            if not batch:
+                break
+            run.add_samples(batch)
+
+    logger.info('Imported %d samples from %s into run %s', run.sample_count,
+                path, run.id)
+    return run.id
@@ -6,12 +6,22 @@ import logging
 import multiprocessing
 
 from time import sleep
+from itertools import groupby
+from operator import itemgetter
+from collections import defaultdict
 
 from path import Path
 
-from .run import Run
-from .energy_aggregation import EnergyAggregation
+from .run import (
+    Run, ENERGY_QUERY, PERIOD_QUERY, PROMOTE_QUERY, rollup_run
+)
+from .energy_aggregation import (
+    EnergyAggregation, StreamingEnergyAggregation, EnergySummary, Measurement,
+    DEFAULT_PERIOD, energy_by_phase, cumulative_energy, sampling_period
+)
 from .experiment import Experiment
+from .journal import import_journal
+from .parsers import parse_output
 from .wattsup import WattsUp
 
 logger = logging.getLogger(__name__)
@@ -37,9 +47,14 @@ class Measurements:
         location = here/'schema.sql'
         logger.debug('Loading schema from {}'.format(location))
         self._source(location)
+        self._upgrade_schema(location)
+        self._backfill_runs()
 
         logger.debug('Installing energy aggregation')
         EnergyAggregation.install(self.conn)
+        StreamingEnergyAggregation.install(self.conn)
+        EnergySummary.install(self.conn)
+        self.conn.create_function('energy_between', 3, self._energy_between)
 
     def run(self, experiment,
             # TODO: add per-test timeout?
@@ -48,10 +63,25 @@ class Measurements:
             sleep_time=0,
             range=range,  # Allow for dependency injecting tqdm.trange()
             wattsup=None,
-            write_back_energy=False):
+            write_back_energy=False,
+            resources=None,
+            meter=None,
+            checkpoint=None):
         """
         Runs an experiment on a given configuration. May run the experiment
         for as many repetitions as are required.
+
+        Power is measured with the given meter (see measurements.meter);
+        by default, a Watts Up?. `wattsup` is a deprecated alias for `meter`.
+
+        If resources is given (see measurements.resources.ResourceSampler),
+        host resources are sampled along with every power measurement.
+
+        Meters that sample more than once a second have their measurements
+        written, and resources sampled, once per second's worth of samples.
+
+        If checkpoint is given, runs are committed every `checkpoint`
+        samples as they are recorded (see Run).
         """
 
         if not isinstance(experiment, Experiment):
@@ -60,10 +90,21 @@ class Measurements:
         # Vivify the experiment name.
         self.define_experiment(experiment.name, experiment.description)
 
+        if wattsup is not None:
+            if meter is not None:
+                raise TypeError('Pass either meter or wattsup, not both')
+            meter = wattsup
+
         # Create and ready the WattsUp instance if not given.
-        if wattsup is None:
-            wattsup = WattsUp()
-        wattsup.wait_until_ready()
+        if meter is None:
+            meter = WattsUp()
+        meter.wait_until_ready()
+
+        # The declared sampling period, in milliseconds, if any.
+        period = None
+        if getattr(meter, 'period', None) is not None:
+            period = 1000.0 * meter.period
+        batch_size = max(1, round(1000 / (period or DEFAULT_PERIOD)))
 
         # Run the experiment
         assert repetitions >= 1
@@ -75,21 +116,42 @@ class Measurements:
             # Give the machine an arbitrary amount of idle time before the next run.
             sleep(sleep_time)
 
-            process = multiprocessing.Process(target=experiment.run)
-
+            # The experiment may send notifications (e.g., phase markers)
+            # back through this pipe.
+            receiver, sender = multiprocessing.Pipe(duplex=False)
+            process = multiprocessing.Process(target=experiment.run,
+                                              args=(sender,))
 
             # Do a single run.
-            with self.run_test(configuration, experiment.name) as log:
+            with receiver, sender, \
+                    self.run_test(configuration, experiment.name,
+                                  period, checkpoint) as log:
                 process.start()
 
-                # Enable logging from the Watts Up?
-                with wattsup:
-                    while process.is_alive():
-                        watts, time = wattsup.next_measurement()
-                        log.add_measurement(watts, time)
+                # Enable logging from the meter.
+                try:
+                    with meter:
+                        batch = []
+                        while process.is_alive():
+                            batch.append(meter.next_measurement())
+                            if len(batch) < batch_size:
+                                continue
+                            _, time = batch[-1]
+                            log.add_measurements(batch)
+                            batch = []
+                            if resources is not None:
+                                log.add_resources(resources.sample(), time)
+                            self._receive_notifications(receiver, log)
+                        log.add_measurements(batch)
+                except BaseException:
+                    # E.g., the meter stalled; abort the run cleanly.
+                    process.terminate()
+                    process.join()
+                    raise
 
                 # Presumably, the process has ended.
                 process.join()
+                self._receive_notifications(receiver, log)
 
                 if process.exitcode != 0:
                     raise RuntimeError('Experiment exited unsuccesfully:' +
@@ -102,7 +164,8 @@ class Measurements:
         # The experiment should be done.
         logger.debug('Experiment complete')
 
-    def run_test(self, configuration, experiment):
+    def run_test(self, configuration, experiment, period=None,
+                 checkpoint=None):
         """
         Start a run of an experiment.
 
@@ -111,10 +174,14 @@ class Measurements:
             m = Measurements(connection)
             with m.run_test('docker', 'idle') as log:
                 log += power_in_watts
+
+        If given, period is the sampling period in milliseconds; otherwise,
+        it is detected when the run ends. If checkpoint is given, the run is
+        committed every `checkpoint` samples (see Run).
         """
         assert self._configuration_exists(configuration)
         assert self._experiment_exists(experiment)
-        return Run(self.conn, configuration, experiment)
+        return Run(self.conn, configuration, experiment, period, checkpoint)
 
     def define_configuration(self, name, description=None):
         """
@@ -142,7 +209,8 @@ class Measurements:
 
         return name
 
-    def energy(self, create_table=None, drop_existing=False):
+    def energy(self, create_table=None, drop_existing=False,
+               exclude_bad=False):
         """
         Yields the energy per each experiment in the database.
 
@@ -150,19 +218,16 @@ class Measurements:
         with the given name. Additionally, if `drop_existing` is True, then
         any table with the name given in `create_table`.
 
+        If `exclude_bad` is True, runs that the quality scanner found not ok
+        (see measurements.quality) are left out.
         """
 
-        query =(r'''
-            SELECT run.id as id,
-                   configuration, experiment,
-                   energy(power, timestamp) as energy,
-                   MIN(timestamp) as started,
-                   MAX(timestamp) as ended,
-                   (MAX(timestamp) - MIN(timestamp))
-                     as elapsed_time -- in milliseconds
-              FROM measurement JOIN run ON measurement.run = run.id
-          GROUP BY run.id;
-        ''')
+        where = ''
+        if exclude_bad:
+            where = r'''
+                WHERE run.id NOT IN (SELECT run FROM run_quality WHERE NOT ok)
+            '''
+        query = ENERGY_QUERY.format(where=where)
 
         if create_table:
             return self._create_table(query, create_table, drop_existing)
@@ -172,11 +237,309 @@ class Measurements:
 
         return cursor.fetchall()
 
+    def phase_energy(self):
+        """
+        Returns the energy of each phase of every run that has phase markers,
+        as (run, phase, energy, started, ended) tuples. The energy of all
+        phases is computed in a single pass over the samples.
+        """
+
+        markers = defaultdict(list)
+        for run, name, timestamp in self.conn.execute(r'''
+            SELECT run, name, timestamp FROM phase
+        '''):
+            markers[run].append((name, timestamp))
+        periods = self._periods()
+
+        cursor = self.conn.execute(r'''
+            SELECT run, power, timestamp
+              FROM measurement
+             WHERE run IN (SELECT run FROM phase)
+          ORDER BY run
+        ''')
+
+        results = []
+        for run, rows in groupby(cursor, key=itemgetter(0)):
+            samples = [Measurement(float(power), timestamp)
+                       for _, power, timestamp in rows]
+            results.extend((run,) + tuple(phase)
+                           for phase in energy_by_phase(samples, markers[run],
+                                                        periods[run]))
+
+        return results
+
+    def import_journal(self, path, configuration, experiment, started=None,
+                       ended=None, period=None):
+        """
+        Loads the samples of a journal kept by the Watts Up? monitor (see
+        measurements.journal) from `started` to `ended` (Unix timestamps in
+        milliseconds; by default, all of them) into a new run of the
+        experiment on the configuration. Returns the id of the run.
+        """
+        return import_journal(self, path, configuration, experiment, started,
+                              ended, period)
+
+    def incomplete_runs(self):
+        """
+        Returns the runs recorded with checkpoints that never ended (e.g.,
+        because the harness crashed), as (id, configuration, experiment,
+        started_at, checkpointed_at, samples) tuples.
+        """
+        return self.conn.execute(r'''
+            SELECT id, configuration, experiment, started_at, checkpointed_at,
+                   (SELECT COUNT(*) FROM staged_measurement
+                     WHERE staged_measurement.run = id)
+              FROM staged_run JOIN run USING (id)
+          ORDER BY started_at, staged_run.rowid
+        ''').fetchall()
+
+    def recover_run(self, run, discard=False):
+        """
+        Completes an incomplete run (see incomplete_runs()) with the samples
+        committed at its last checkpoint, ending it at its last sample; or,
+        if discard is True, deletes it.
+
+        Do not recover runs that are still being recorded!
+        """
+
+        if self.conn.execute(r'''
+            SELECT 1 FROM staged_run WHERE id = ?
+        ''', (run,)).fetchone() is None:
+            raise ValueError('Run {} is not incomplete'.format(run))
+
+        with self.conn:
+            if discard:
+                logger.info('Discarding incomplete run %s', run)
+                self.conn.execute('DELETE FROM run WHERE id = ?', (run,))
+                return self
+
+            logger.info('Recovering incomplete run %s', run)
+            self.conn.execute(PROMOTE_QUERY, {'id': run})
+            self.conn.execute('DELETE FROM staged_run WHERE id = ?', (run,))
+            self.conn.execute(r'''
+                UPDATE run
+                   SET sample_count = (SELECT COUNT(*) FROM measurement
+                                        WHERE measurement.run = run.id),
+                       first_timestamp = (SELECT MIN(timestamp)
+                                            FROM measurement
+                                           WHERE measurement.run = run.id),
+                       last_timestamp = (SELECT MAX(timestamp)
+                                           FROM measurement
+                                          WHERE measurement.run = run.id)
+                 WHERE id = ?
+            ''', (run,))
+            self.conn.execute(r'''
+                UPDATE run
+                   SET ended_at = COALESCE(last_timestamp, started_at),
+                       duration = COALESCE(last_timestamp, started_at) -
+                                  started_at,
+                       period = COALESCE(period, ?)
+                 WHERE id = ?
+            ''', (sampling_period(timestamp for timestamp, in
+                                  self.conn.execute(PERIOD_QUERY, (run,))),
+                  run))
+            rollup_run(self.conn, run)
+
+        return self
+
+    def rollup(self):
+        """
+        Rolls up the power of every run that has not been rolled up yet (i.e.,
+        runs recorded by older versions) into power_rollup.
+        """
+
+        runs = [run for run, in self.conn.execute(r'''
+            SELECT id FROM run
+             WHERE id NOT IN (SELECT run FROM power_rollup)
+        ''')]
+
+        with self.conn:
+            for run in runs:
+                rollup_run(self.conn, run)
+
+        return self
+
+    def index_energy(self, runs=None):
+        """
+        Builds the cumulative energy of the given runs (by default, every run
+        that has not been indexed yet), so that energy_between() can answer
+        queries over arbitrary windows of them.
+        """
+
+        if runs is None:
+            runs = [run for run, in self.conn.execute(r'''
+                SELECT id FROM run
+                 WHERE id NOT IN (SELECT run FROM cumulative_energy)
+            ''')]
+
+        periods = self._periods()
+        with self.conn:
+            for run in runs:
+                samples = [Measurement(float(power), timestamp)
+                           for power, timestamp in self.conn.execute(r'''
+                               SELECT power, timestamp FROM measurement
+                                WHERE run = ?
+                           ''', (run,))]
+                self.conn.execute(r'''
+                    DELETE FROM cumulative_energy WHERE run = ?
+                ''', (run,))
+                self.conn.executemany(r'''
+                    INSERT INTO cumulative_energy (run, timestamp, energy)
+                    VALUES (?, ?, ?)
+                ''', ((run, timestamp, energy) for timestamp, energy
+                      in cumulative_energy(samples, periods[run])))
+
+        return self
+
+    def energy_between(self, run, started, ended):
+        """
+        Returns the energy used by a run from `started` to `ended` (both Unix
+        timestamps in milliseconds, inclusive). This is the sum of every
+        interpolated sample of the run within the window; hence, a gap that
+        begins before the window contributes its interpolated samples.
+
+        The run is indexed first, if needed (see index_energy()). The same is
+        available in SQL as energy_between(run, started, ended), which is NULL
+        for runs that have not been indexed.
+        """
+
+        if started > ended:
+            raise ValueError('The window must not end before it starts')
+
+        if self._energy_between(run, started, ended) is None:
+            self.index_energy([run])
+        return self._energy_between(run, started, ended) or 0.0
+
+    def _energy_between(self, run, started, ended):
+        def total_before(comparison, timestamp):
+            row = self.conn.execute(r'''
+                SELECT energy FROM cumulative_energy
+                 WHERE run = ? AND timestamp {} ?
+              ORDER BY timestamp DESC
+                 LIMIT 1
+            '''.format(comparison), (run, timestamp)).fetchone()
+            return 0.0 if row is None else row[0]
+
+        indexed = self.conn.execute(r'''
+            SELECT 1 FROM cumulative_energy WHERE run = ?
+        ''', (run,)).fetchone()
+        if indexed is None or started > ended:
+            return None
+        return total_before('<=', ended) - total_before('<', started)
+
+    def _periods(self):
+        """
+        Returns the sampling period of every run, in milliseconds.
+        """
+        return dict(self.conn.execute(r'''
+            SELECT id, COALESCE(period, ?) FROM run
+        ''', (DEFAULT_PERIOD,)))
+
+    def _receive_notifications(self, receiver, log):
+        """
+        Records every pending notification sent by a running experiment.
+        """
+        while receiver.poll():
+            kind, *payload = receiver.recv()
+            if kind == 'phase':
+                log.add_phase(*payload)
+            elif kind == 'workload':
+                log.add_workload(**payload[0])
+            elif kind == 'output':
+                tool, output = payload
+                try:
+                    records = parse_output(tool, output)
+                except Exception:
+                    # Never lose the run because of unexpected output.
+                    logger.exception('Could not parse output of %s', tool)
+                else:
+                    log.add_throughput(records)
+            else:
+                raise ValueError('Unknown notification: {}'.format(kind))
+
     def _source(self, name):
         with open(str(name)) as sqlfile:
             self.conn.executescript(sqlfile.read())
         return self
 
+    def _upgrade_schema(self, name):
+        """
+        Adds columns that are missing from tables created by older versions
+        of the schema.
+
+        Only plain, nullable columns can be added this way; ALTER TABLE would
+        silently drop NOT NULL, PRIMARY KEY, and REFERENCES constraints, so
+        any such column raises a RuntimeError instead.
+        """
+        reference = sqlite3.connect(':memory:')
+        with open(str(name)) as sqlfile:
+            reference.executescript(sqlfile.read())
+
+        tables = reference.execute(r'''
+            SELECT name FROM sqlite_master WHERE type = 'table'
+        ''').fetchall()
+        for table, in tables:
+            existing = set(column for _, column, *_ in
+                           self.conn.execute('PRAGMA table_info({})'
+                                             .format(table)))
+            references = set(column for _, _, _, column, *_ in
+                             reference.execute('PRAGMA foreign_key_list({})'
+                                               .format(table)))
+            for _, column, kind, not_null, default, primary_key in \
+                    reference.execute('PRAGMA table_info({})'.format(table)):
+                if column in existing:
+                    continue
+                if not_null or primary_key or column in references:
+                    raise RuntimeError(
+                        'Cannot add constrained column {}.{} to an existing '
+                        'database; migrate it by hand'.format(table, column)
+                    )
+                logger.info('Adding column %s.%s', table, column)
+                self.conn.execute('ALTER TABLE {} ADD COLUMN {} {} {}'.format(
+                    table, column, kind,
+                    '' if default is None else 'DEFAULT ' + default
+                ))
+
+        reference.close()
+        self.conn.commit()
+
+    def _backfill_runs(self):
+        """
+        Fills in the time span, sample count, and sampling period of runs
+        recorded before they were maintained as the runs were recorded.
+        """
+        with self.conn:
+            self.conn.execute(r'''
+                UPDATE run
+                   SET sample_count = (SELECT COUNT(*) FROM measurement
+                                        WHERE measurement.run = run.id),
+                       first_timestamp = (SELECT MIN(timestamp)
+                                            FROM measurement
+                                           WHERE measurement.run = run.id),
+                       last_timestamp = (SELECT MAX(timestamp)
+                                           FROM measurement
+                                          WHERE measurement.run = run.id)
+                 WHERE sample_count IS NULL
+            ''')
+            self.conn.execute(r'''
+                UPDATE run
+                   SET started_at = COALESCE(started_at, first_timestamp),
+                       ended_at = COALESCE(ended_at, last_timestamp),
+                       duration = COALESCE(ended_at, last_timestamp) -
+                                  COALESCE(started_at, first_timestamp)
+                 WHERE duration IS NULL
+            ''')
+            runs = [run for run, in self.conn.execute(r'''
+                SELECT id FROM run WHERE period IS NULL AND sample_count > 1
+            ''')]
+            periods = [(sampling_period(timestamp for timestamp, in
+                                        self.conn.execute(PERIOD_QUERY,
+                                                          (run,))), run)
+                       for run in runs]
+            self.conn.executemany(r'''
+                UPDATE run SET period = ? WHERE id = ?
+            ''', periods)
+
     def _create_table(self, query, name, drop_existing):
         # Ensure we get a valid table name.
         if not re.match('^(?!sqlite_)[A-Za-z0-9_]+$', name):
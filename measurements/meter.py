@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+The interface of power meters that Measurements.run() can take measurements
+from. See measurements.wattsup.WattsUp and measurements.rapl.RAPL.
+"""
+
+from abc import ABC, abstractmethod
+
+__all__ = ['Meter', 'MeterStalled']
+
+
+class MeterStalled(RuntimeError):
+    """
+    Raised when a meter stops reporting measurements.
+    """
+
+
+class Meter(ABC):
+    """
+    A power meter. Subclasses must implement next_measurement().
+
+    Usage::
+
+        with meter:
+            watts, timestamp = meter.next_measurement()
+            # Take as many measurements as necessary.
+        meter.close()
+
+    `period` is the sampling period of the meter in seconds, if it is known
+    in advance; otherwise, it is detected from the timestamps of the
+    measurements.
+    """
+
+    period = None
+
+    def wait_until_ready(self):
+        """
+        Returns when the meter is ready to take measurements.
+        """
+        return self
+
+    @abstractmethod
+    def next_measurement(self):
+        """
+        Waits until the next measurement is available and returns it as a
+        tuple of (watts, timestamp), where the timestamp is a datetime in the
+        UTC timezone.
+        """
+
+    def close(self):
+        """
+        Releases any resources used by the meter.
+        """
+        return self
+
+    def __enter__(self):
+        self.wait_until_ready()
+        return self
+
+    def __exit__(self, *exception_info):
+        pass
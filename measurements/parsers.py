@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Parsers for the output of benchmark tools.
+
+Each parser takes the text output of a tool and returns a list of Throughput
+records; usually one per test the tool ran::
+
+    from measurements.parsers import parse_output
+
+    for record in parse_output('pgbench', output):
+        print(record.test, record.requests_per_second)
+
+Register a parser for another tool with the @parser decorator::
+
+    @parser('ab')
+    def parse_apache_bench(text):
+        ...
+"""
+
+import os
+import re
+
+from collections import namedtuple
+
+__all__ = ['Throughput', 'parser', 'parse_output']
+
+
+Throughput = namedtuple('Throughput', [
+    'tool',
+    'test',
+    'requests',             # Requests or transactions completed
+    'requests_per_second',
+    'latency_mean',         # All latencies in milliseconds
+    'latency_p50',
+    'latency_p95',
+    'latency_p99',
+])
+
+PARSERS = {}
+
+
+def parser(tool):
+    """
+    Decorator that registers a parser for the output of the given tool.
+    """
+    def register(fn):
+        PARSERS[tool] = fn
+        return fn
+    return register
+
+
+def parse_output(tool, text):
+    """
+    Parses the output of the given tool into a list of Throughput records.
+    """
+    try:
+        parse = PARSERS[tool]
+    except KeyError:
+        raise ValueError('No parser for {}. Choose one of: {}'.format(
+            tool, ', '.join(sorted(PARSERS))
+        ))
+    return parse(str(text))
+
+
+@parser('redis-benchmark')
+def parse_redis_benchmark(text):
+    """
+    Parses the output of redis-benchmark, in its default, --csv, or -q
+    (quiet) formats.
+    """
+    # Progress is reported with carriage returns; only keep the last line.
+    lines = [line.rsplit('\r', 1)[-1].strip() for line in text.splitlines()]
+
+    results = []
+    test = None
+    section = {}
+
+    def end_section():
+        if test is not None:
+            results.append(_redis_section(test, section))
+
+    for line in lines:
+        match = re.match(r'^====== (.+) ======$', line)
+        if match:
+            end_section()
+            test, section = match.group(1), {'percentiles': []}
+            continue
+
+        if test is None:
+            # Outside of a section, this may be the --csv or -q format.
+            record = _redis_csv(line) or _redis_quiet(line)
+            if record:
+                results.append(record)
+            continue
+
+        match = re.match(r'^(\d+) requests completed in ([\d.]+) seconds', line)
+        if match:
+            section['requests'] = int(match.group(1))
+            continue
+
+        match = re.match(r'^(?:throughput summary: )?([\d.]+) '
+                         r'requests per second', line)
+        if match:
+            section['requests_per_second'] = float(match.group(1))
+            continue
+
+        match = re.match(r'^([\d.]+)% <= ([\d.]+) milliseconds', line)
+        if match:
+            section['percentiles'].append((float(match.group(1)),
+                                           float(match.group(2))))
+            continue
+
+        if re.match(r'^avg\s+min\s+p50\s+p95\s+p99\s+max$', line):
+            section['expect_summary'] = True
+            continue
+
+        if section.pop('expect_summary', False):
+            avg, _, p50, p95, p99, _ = (float(x) for x in line.split())
+            section['summary'] = avg, p50, p95, p99
+
+    end_section()
+    return results
+
+
+def _redis_csv(line):
+    """
+    Parses a line of redis-benchmark --csv:
+
+        "SET","78186.08","0.555","0.160","0.527","0.863","1.087","2.855"
+
+    Older versions only print the test name and requests per second.
+    """
+    fields = line.strip('"').split('","')
+    if len(fields) < 2 or not re.match(r'^[\d.]+$', fields[1]):
+        return None
+
+    test, rps, *latencies = fields
+    if len(latencies) >= 5:
+        mean, _, p50, p95, p99 = (float(x) for x in latencies[:5])
+    else:
+        mean = p50 = p95 = p99 = None
+    return Throughput('redis-benchmark', test, None, float(rps),
+                      mean, p50, p95, p99)
+
+
+def _redis_quiet(line):
+    """
+    Parses a line of redis-benchmark -q:
+
+        SET: 78186.08 requests per second, p50=0.527 msec
+
+    Older versions do not print the median latency.
+    """
+    match = re.match(r'^([^:]+): ([\d.]+) requests per second'
+                     r'(?:, p50=([\d.]+) msec)?', line)
+    if not match:
+        return None
+
+    test, rps, p50 = match.groups()
+    return Throughput('redis-benchmark', test, None, float(rps),
+                      None, None if p50 is None else float(p50), None, None)
+
+
+def _redis_section(test, section):
+    """
+    Returns the Throughput for one test of the default redis-benchmark
+    output.
+    """
+    if 'summary' in section:
+        mean, p50, p95, p99 = section['summary']
+    else:
+        # Older versions only give the cumulative distribution.
+        percentiles = section['percentiles']
+        mean = None
+        p50, p95, p99 = (_percentile(percentiles, p) for p in (50, 95, 99))
+
+    return Throughput('redis-benchmark', test,
+                      section.get('requests'),
+                      section.get('requests_per_second'),
+                      mean, p50, p95, p99)
+
+
+def _percentile(distribution, percent):
+    """
+    Returns the first latency in a cumulative distribution of
+    (percent, latency) pairs that reaches the given percentile.
+    """
+    for cumulative, latency in distribution:
+        if cumulative >= percent:
+            return latency
+    return None
+
+
+@parser('pgbench')
+def parse_pgbench(text):
+    """
+    Parses the summary printed by pgbench.
+    """
+    def find(pattern, convert=float):
+        matches = re.findall(pattern, text, re.MULTILINE)
+        # Take the last match; "tps" is printed twice by older versions,
+        # last excluding the time spent establishing connections.
+        return convert(matches[-1]) if matches else None
+
+    test = find(r'^transaction type: (.+)$', str)
+    requests = find(r'^number of transactions actually processed: (\d+)', int)
+    tps = find(r'^tps = ([\d.]+)')
+    latency = find(r'^latency average\s*[:=]\s*([\d.]+) ms')
+
+    if tps is None:
+        return []
+    return [Throughput('pgbench', test, requests, tps,
+                       latency, None, None, None)]
+
+
+@parser('tsung')
+def parse_tsung(text):
+    """
+    Parses the statistics from tsung.log. If given tsung's standard output,
+    reads tsung.log from the log directory it announces.
+    """
+    if 'stats:' not in text:
+        match = re.search(r'^Log directory is: (.+)$', text, re.MULTILINE)
+        if not match:
+            return []
+        filename = os.path.join(match.group(1).strip(), 'tsung.log')
+        with open(filename) as logfile:
+            text = logfile.read()
+
+    dumps = [float(t) for t in re.findall(r'^# stats: dump at (\d+)', text,
+                                          re.MULTILINE)]
+    duration = dumps[-1] - dumps[0] if len(dumps) > 1 else None
+
+    # Sample counters are formatted as:
+    #   stats: name count mean stddev max min mean_total count_total
+    # The last dump has the totals for the entire test.
+    totals = {}
+    for name, *values in re.findall(r'^stats: (\w+)' + r' ([\d.]+)' * 7 + '$',
+                                    text, re.MULTILINE):
+        totals[name] = float(values[5]), int(float(values[6]))
+
+    results = []
+    for name in ('request', 'page', 'session'):
+        if name not in totals:
+            continue
+        mean, count = totals[name]
+        rate = count / duration if duration else None
+        results.append(Throughput('tsung', name, count, rate,
+                                  mean, None, None, None))
+    return results
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Aligns the power traces of many runs on elapsed time, to compare the average
+run of one configuration with another, second by second::
+
+    from measurements.profile import power_traces, mean_profile, difference
+
+    native = power_traces(conn, 'redis', 'native')
+    docker = power_traces(conn, 'redis', 'multidocker')
+    print(mean_profile(native).mean)
+    print(difference(docker, native).mean)
+
+Traces are resampled to a grid of sampling periods (by default, 1 Hz) with
+the same gap-filling rule as the energy aggregation, and all statistics are
+computed over the whole matrix of runs at once.
+
+Requires NumPy.
+"""
+
+from collections import namedtuple
+from statistics import NormalDist
+
+import numpy as np
+
+__all__ = ['Profile', 'power_traces', 'mean_profile', 'difference']
+
+
+# Arrays with one entry per period of elapsed time. The band is the
+# confidence interval of the mean; it is NaN where fewer than two runs last
+# that long. `runs` is the number of runs that last that long.
+Profile = namedtuple('Profile', 'mean lower upper runs')
+
+
+def power_traces(conn, experiment, configuration, period=1000.0):
+    """
+    Returns the power of every run of the experiment on the configuration as
+    a 2D array, with one row per run and one column per period (in
+    milliseconds) elapsed since the first measurement of the run. Rows of
+    runs shorter than the longest are padded with NaN.
+
+    As in EnergyAggregation, a gap is filled with copies of the sample before
+    it, one for every period missing. The runs should have been sampled with
+    the given period; see the `period` column of the run table.
+    """
+
+    rows = conn.execute(r'''
+        SELECT run, timestamp, power
+          FROM measurement JOIN run ON measurement.run = run.id
+         WHERE experiment = ? AND configuration = ?
+      ORDER BY run, timestamp
+    ''', (experiment, configuration)).fetchall()
+    if not rows:
+        return np.empty((0, 0))
+
+    runs, timestamps, power = zip(*rows)
+    runs = np.array(runs)
+    timestamps = np.array(timestamps, dtype=float)
+    power = np.array(power, dtype=float)
+    # Number the runs in order.
+    first = np.concatenate(([True], runs[1:] != runs[:-1]))
+    run_starts = np.flatnonzero(first)
+    run = np.cumsum(first) - 1
+
+    # Each sample is as many periods after the previous one as the rounded
+    # difference of their timestamps; the first sample of a run is at zero.
+    steps = np.round(np.diff(timestamps, prepend=timestamps[0]) / period)
+    steps[run_starts] = 0
+    position = np.cumsum(steps)
+    position -= position[run_starts][run]
+    position = position.astype(int)
+
+    length = np.zeros(len(run_starts), dtype=int)
+    np.maximum.at(length, run, position + 1)
+
+    traces = np.full((len(run_starts), length.max()), np.nan)
+    traces[run, position] = power
+
+    # Fill every gap by carrying the last sample forward.
+    columns = np.arange(traces.shape[1])
+    last = np.where(np.isnan(traces), 0, columns)
+    last = np.maximum.accumulate(last, axis=1)
+    traces = traces[np.arange(len(traces))[:, np.newaxis], last]
+    # ...but not past the end of each run.
+    traces[columns >= length[:, np.newaxis]] = np.nan
+
+    return traces
+
+
+def mean_profile(traces, confidence=0.95):
+    """
+    Returns the Profile of the mean power over elapsed time of the given
+    traces (see power_traces()), with a normal confidence band.
+    """
+
+    runs = np.sum(~np.isnan(traces), axis=0)
+    mean, error = _mean_and_error(traces, runs)
+    margin = _z(confidence) * error
+    return Profile(mean, mean - margin, mean + margin, runs)
+
+
+def difference(traces, baseline, confidence=0.95):
+    """
+    Returns the Profile of the difference of the mean power of the traces
+    from the mean power of the baseline traces, second by second, for as
+    long as both last. The band is the confidence interval of the difference
+    of two means with unequal variances.
+
+    `runs` is the smaller of the number of runs in either.
+    """
+
+    seconds = min(traces.shape[1], baseline.shape[1])
+    traces, baseline = traces[:, :seconds], baseline[:, :seconds]
+
+    runs = np.sum(~np.isnan(traces), axis=0)
+    baseline_runs = np.sum(~np.isnan(baseline), axis=0)
+    mean, error = _mean_and_error(traces, runs)
+    baseline_mean, baseline_error = _mean_and_error(baseline, baseline_runs)
+
+    mean = mean - baseline_mean
+    margin = _z(confidence) * np.hypot(error, baseline_error)
+    return Profile(mean, mean - margin, mean + margin,
+                   np.minimum(runs, baseline_runs))
+
+
+def _mean_and_error(traces, runs):
+    """
+    Returns the mean of every column, and its standard error (NaN for
+    columns with fewer than two values).
+    """
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        total = np.nansum(traces, axis=0)
+        mean = np.where(runs > 0, total / runs, np.nan)
+        squares = np.nansum((traces - mean) ** 2, axis=0)
+        variance = np.where(runs > 1, squares / (runs - 1), np.nan)
+        return mean, np.sqrt(variance / runs)
+
+
+def _z(confidence):
+    return NormalDist().inv_cdf((1 + confidence) / 2)
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Scans the measurements of every run for problems that would skew or break
+its energy estimate, and records them in the `run_quality` table::
+
+    $ python -m measurements quality energy.sqlite
+
+The samples of each run are checked in one pass of array operations for:
+
+ - gaps: missing samples, which are interpolated by the energy aggregation;
+ - duplicates: samples less than half a sampling period after the previous
+   one, which the energy aggregation cannot place on the grid of periods;
+ - out-of-order samples: samples recorded with an earlier timestamp than the
+   sample recorded before them (harmless, since samples are sorted);
+ - outliers: power that is not positive, or that is further than a number of
+   robust standard deviations from the median power of the run.
+
+Runs with duplicates or outliers are not `ok`; exclude them with
+`python -m measurements --exclude-bad` or Measurements.energy(exclude_bad=True).
+
+Requires NumPy.
+"""
+
+import logging
+from collections import namedtuple
+from itertools import groupby
+from operator import itemgetter
+
+import numpy as np
+
+__all__ = ['Quality', 'scan_run', 'scan_runs']
+
+logger = logging.getLogger(__name__)
+
+Quality = namedtuple('Quality', [
+    'samples',
+    'gaps',             # Gaps between consecutive samples...
+    'gap_seconds',      # ...and the samples (not seconds) missing from them
+    'duplicates',
+    'out_of_order',
+    'outliers',
+    'power_min',
+    'power_max',
+    'ok',
+])
+
+# The Watts Up? reports power to a tenth of a watt; spreads narrower than
+# this are quantization, not signal.
+RESOLUTION = 0.1  # watts
+
+
+def scan_run(timestamps, watts, threshold=6.0, period=1000.0):
+    """
+    Returns the Quality of a run, given the timestamps (in milliseconds) and
+    power of its samples in the order they were recorded, and its sampling
+    period (in milliseconds).
+
+    A sample is an outlier if it is not positive, or if it is further than
+    `threshold` robust standard deviations (scaled median absolute
+    deviations) from the median.
+    """
+
+    timestamps = np.asarray(timestamps, dtype=float)
+    watts = np.asarray(watts, dtype=float)
+    if len(timestamps) == 0:
+        return Quality(0, 0, 0, 0, 0, 0, None, None, True)
+
+    out_of_order = int(np.sum(np.diff(timestamps) < 0))
+
+    # As the energy aggregation does, round the time between chronologically
+    # consecutive samples to whole periods.
+    periods = np.round(np.diff(np.sort(timestamps)) / period)
+    duplicates = int(np.sum(periods < 1))
+    missing = periods[periods > 1] - 1
+    gaps, gap_seconds = len(missing), int(np.sum(missing))
+
+    median = np.median(watts)
+    spread = max(1.4826 * np.median(np.abs(watts - median)), RESOLUTION)
+    outliers = int(np.sum((watts <= 0) | ~np.isfinite(watts) |
+                          (np.abs(watts - median) > threshold * spread)))
+
+    return Quality(len(watts), gaps, gap_seconds, duplicates, out_of_order,
+                   outliers, float(np.min(watts)), float(np.max(watts)),
+                   duplicates == 0 and outliers == 0)
+
+
+def scan_runs(conn, threshold=6.0):
+    """
+    Scans every run, and replaces the contents of the run_quality table with
+    the results. Returns the number of runs that are not ok.
+    """
+
+    periods = dict(conn.execute(r'''
+        SELECT id, COALESCE(period, 1000) FROM run
+    '''))
+    # In rowid order, to see the order in which samples were recorded.
+    cursor = conn.execute(r'''
+        SELECT run, timestamp, power FROM measurement ORDER BY run, rowid
+    ''')
+    results = []
+    for run, rows in groupby(cursor, key=itemgetter(0)):
+        _, timestamps, watts = zip(*rows)
+        quality = scan_run(timestamps, watts, threshold, periods[run])
+        if not quality.ok:
+            logger.warning('Run %s has %d duplicate and %d outlying samples',
+                           run, quality.duplicates, quality.outliers)
+        results.append((run,) + tuple(quality))
+
+    with conn:
+        conn.execute('DELETE FROM run_quality')
+        conn.executemany(r'''
+            INSERT INTO run_quality (run, {})
+            VALUES (?, {})
+        '''.format(', '.join(Quality._fields),
+                   ', '.join('?' * len(Quality._fields))), results)
+
+    return sum(1 for result in results if not result[-1])
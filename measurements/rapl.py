@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Software power estimation using Intel's Running Average Power Limit (RAPL)
+energy counters, as exposed by the Linux powercap framework.
+
+Usage::
+
+    from measurements.rapl import RAPL
+
+    with RAPL() as meter:
+        watts, timestamp = meter.next_measurement()
+        print("Got measurement:", watts, timestamp)
+
+Unlike the Watts Up?, this does not need any extra hardware, but it only
+measures the CPU packages and, where the processor exposes it, DRAM; not the
+entire machine.
+"""
+
+import re
+import time
+import logging
+
+from path import Path
+
+from . import utc_date
+from .meter import Meter
+
+__all__ = ['RAPL']
+
+logger = logging.getLogger(__name__)
+
+
+class RAPL(Meter):
+    """
+    Reads the energy counters of every RAPL package zone (e.g.,
+    /sys/class/powercap/intel-rapl:0) and DRAM subzone, and reports the
+    average power over each period.
+
+    The counters are read every `interval` seconds (or every period, if
+    that is shorter), so that a counter never wraps around more than once
+    between reads. The period may be as short as the counters allow; e.g.,
+    0.01 seconds for 100 Hz.
+    """
+
+    def __init__(self, root='/sys/class/powercap', zones=None,
+                 period=1.0, interval=0.1,
+                 clock=time.monotonic, sleep=time.sleep):
+        if period <= 0:
+            raise ValueError('The period must be positive')
+
+        root = Path(root)
+        if zones is None:
+            zones = find_zones(root)
+        if not zones:
+            raise ValueError('No RAPL zones found in {}'.format(root))
+
+        self._zones = [Zone(root/name) for name in zones]
+        self.period = period
+        self.interval = interval
+        self._clock = clock
+        self._sleep = sleep
+        # When the current period is scheduled to start, and when the
+        # counters were last read.
+        self._started = None
+        self._last_read = None
+
+        logger.info('Using RAPL zones: %s',
+                    ', '.join(zone.name for zone in self._zones))
+
+    def wait_until_ready(self):
+        """
+        Starts counting energy, if not already counting.
+        """
+        if self._started is None:
+            self._reset()
+        return self
+
+    def next_measurement(self):
+        """
+        Waits until the end of the current period, and returns the average
+        power over it.
+        """
+        self.wait_until_ready()
+
+        # Periods are scheduled on a fixed grid, so that they do not drift
+        # when a sleep overshoots.
+        deadline = self._started + self.period
+        joules = 0.0
+        now = self._clock()
+        while now < deadline:
+            self._sleep(min(self.interval, deadline - now))
+            joules += self._read()
+            now = self._clock()
+        joules += self._read()
+
+        watts = joules / (now - self._last_read)
+        self._last_read = now
+        # If we fell behind by more than a period, start a new grid.
+        self._started = deadline if now - deadline < self.period else now
+        return watts, utc_date.now()
+
+    def __enter__(self):
+        # Do not count energy used since the last run.
+        self._reset()
+        return self
+
+    def _read(self):
+        return sum(zone.joules_since_last_read() for zone in self._zones)
+
+    def _reset(self):
+        self._read()
+        self._started = self._last_read = self._clock()
+
+
+def find_zones(root):
+    """
+    Returns the names of the zones to measure: every package (e.g.,
+    intel-rapl:0) and every DRAM subzone. Other subzones (e.g., core) are
+    already counted by their package, but DRAM is not.
+    """
+    zones = []
+    for zone in sorted(root.dirs()):
+        if re.match(r'^intel-rapl:\d+$', zone.name):
+            zones.append(zone.name)
+        elif (re.match(r'^intel-rapl:\d+:\d+$', zone.name) and
+              (zone/'name').read_text().strip() == 'dram'):
+            zones.append(zone.name)
+    return zones
+
+
+class Zone:
+    """
+    The energy counter of one powercap zone.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = (path/'name').read_text().strip()
+        self.max_range = int((path/'max_energy_range_uj').read_text())
+        self._last = None
+
+    def joules_since_last_read(self):
+        """
+        Returns the energy used since the last time this was called.
+        """
+        current = int((self.path/'energy_uj').read_text())
+        last, self._last = self._last, current
+        if last is None:
+            return 0.0
+
+        difference = current - last
+        if difference < 0:
+            # The counter wrapped around.
+            difference += self.max_range
+        return difference / 1e6
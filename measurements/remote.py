@@ -0,0 +1,327 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Collects measurements on the machine that owns the meter, and ships them to
+an ingest server that owns one central database, instead of keeping a
+database on every host.
+
+On the central machine::
+
+    $ python -m measurements serve --port 8086 energy.sqlite
+
+On every host with a meter::
+
+    from measurements.remote import Agent
+
+    with Agent(('central', 8086), meter=WattsUp()) as agent:
+        with agent.run_test('native', 'idle'):
+            sleep(600)  # or run the experiment
+
+The agent reads the meter in a background thread, batches the samples of the
+current run, and ships every batch as a frame: a 4-byte big-endian length
+followed by zlib-compressed JSON. Frames that cannot be sent, because the
+server is unreachable, are appended to a local spool file, and sent (in
+order) as soon as the server is reachable again. Since a connection may
+break after the server has received part of the spool, frames are numbered
+within their run, and the server drops frames it has already received.
+
+The server reads frames from any number of agents, and hands their runs to
+the single writer of an IngestQueue (see measurements.ingest), which records
+them with checkpoints. Runs whose agent never ends them are left incomplete;
+see `python -m measurements recover`.
+"""
+
+import json
+import logging
+import queue
+import socket
+import socketserver
+import struct
+import threading
+import uuid
+import zlib
+
+from path import Path
+
+from . import utc_date
+from .ingest import IngestQueue
+
+__all__ = ['Agent', 'IngestServer', 'encode_frame', 'read_frame']
+
+logger = logging.getLogger(__name__)
+
+FRAME_HEADER = struct.Struct('!I')
+
+
+def encode_frame(message):
+    """
+    Returns the frame of a message (anything JSON can encode).
+    """
+    payload = zlib.compress(json.dumps(message).encode('UTF-8'))
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def read_frame(stream):
+    """
+    Reads the next frame from a binary file-like object, and returns its
+    message, or None at the end of the stream.
+    """
+    header = stream.read(FRAME_HEADER.size)
+    if not header:
+        return None
+    if len(header) < FRAME_HEADER.size:
+        raise EOFError('Frame header cut short')
+    length, = FRAME_HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        raise EOFError('Frame cut short')
+    return json.loads(zlib.decompress(payload).decode('UTF-8'))
+
+
+class Agent:
+    """
+    Reads a meter, and ships the samples of every run to an ingest server at
+    the given (host, port) address, in batches of `batch_size` samples.
+
+    Frames that cannot be sent are spooled to the file at `spool`, and sent
+    again every `retry` seconds.
+    """
+
+    def __init__(self, address, meter=None, batch_size=60,
+                 spool='measurements-agent.spool', retry=5.0, timeout=10.0):
+        if meter is None:
+            from .wattsup import WattsUp
+            meter = WattsUp()
+
+        self.address = address
+        self.meter = meter
+        self.batch_size = batch_size
+        self.spool = Path(spool)
+        self.retry = retry
+        self.timeout = timeout
+
+        # Guards the current run and its batch.
+        self._lock = threading.Lock()
+        self._run = None
+        self._batch = []
+        # Frames of the current run, numbered from one.
+        self._sequence = 0
+        self._frames = queue.Queue()
+        self._stopping = threading.Event()
+        self._socket = None
+        self._reader = threading.Thread(target=self._read_meter,
+                                        name='Agent meter reader',
+                                        daemon=True)
+        self._sender = threading.Thread(target=self._send_frames,
+                                        name='Agent sender', daemon=True)
+
+    def start(self):
+        self._reader.start()
+        self._sender.start()
+        return self
+
+    def run_test(self, configuration, experiment):
+        """
+        Ships the samples read while in the returned context manager as a
+        run of the experiment on the configuration. The run is deleted if
+        the context exits with an exception.
+        """
+        return _RemoteRun(self, configuration, experiment)
+
+    def close(self, timeout=None):
+        """
+        Stops reading the meter, and waits until every frame has been sent
+        or spooled.
+        """
+        self._stopping.set()
+        self._reader.join(timeout)
+        self._frames.put(None)
+        self._sender.join(timeout)
+        self.meter.close()
+
+    def _begin(self, configuration, experiment):
+        period = getattr(self.meter, 'period', None)
+        with self._lock:
+            if self._run is not None:
+                raise RuntimeError('A run is already being recorded')
+            self._run = uuid.uuid1().hex
+            self._sequence = 0
+            self._put({
+                'type': 'begin',
+                'run': self._run,
+                'configuration': configuration,
+                'experiment': experiment,
+                'period': None if period is None else 1000.0 * period,
+            })
+
+    def _end(self, ok):
+        with self._lock:
+            self._flush()
+            self._put({'type': 'end', 'run': self._run, 'ok': ok})
+            self._run = None
+
+    def _flush(self):
+        # Must hold the lock.
+        if self._batch:
+            self._put({
+                'type': 'samples', 'run': self._run, 'samples': self._batch
+            })
+            self._batch = []
+
+    def _put(self, message):
+        # Must hold the lock.
+        self._sequence += 1
+        message['sequence'] = self._sequence
+        self._frames.put(encode_frame(message))
+
+    def _read_meter(self):
+        with self.meter:
+            while not self._stopping.is_set():
+                watts, time = self.meter.next_measurement()
+                with self._lock:
+                    if self._run is None:
+                        continue
+                    self._batch.append((watts, utc_date.to_timestamp(time)))
+                    if len(self._batch) >= self.batch_size:
+                        self._flush()
+
+    def _send_frames(self):
+        while True:
+            try:
+                frame = self._frames.get(timeout=self.retry)
+            except queue.Empty:
+                frame = b''
+            if frame is None:
+                self._deliver(b'')
+                break
+            self._deliver(frame)
+
+        if self._socket is not None:
+            self._socket.close()
+
+    def _deliver(self, frame):
+        """
+        Sends the spooled frames, then the given frame; or, if the server is
+        unreachable, spools the frame.
+        """
+        if not frame and not self.spool.exists():
+            return
+        try:
+            if self._socket is None:
+                self._socket = socket.create_connection(self.address,
+                                                        self.timeout)
+                logger.info('Connected to %s:%d', *self.address)
+            if self.spool.exists():
+                self._socket.sendall(self.spool.bytes())
+                self.spool.remove()
+            if frame:
+                self._socket.sendall(frame)
+        except OSError as error:
+            if self._socket is not None:
+                logger.warning('Lost connection to %s:%d: %s',
+                               *self.address, error)
+                self._socket.close()
+                self._socket = None
+            if frame:
+                with open(str(self.spool), 'ab') as spool:
+                    spool.write(frame)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+
+class _RemoteRun:
+    def __init__(self, agent, configuration, experiment):
+        self.agent = agent
+        self.configuration = configuration
+        self.experiment = experiment
+
+    def __enter__(self):
+        self.agent._begin(self.configuration, self.experiment)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.agent._end(exc_type is None)
+
+
+class IngestServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """
+    Receives frames from agents, and records their runs in the database at
+    the given path, through an IngestQueue. Usage::
+
+        server = IngestServer('energy.sqlite', ('', 8086))
+        server.serve_forever()
+
+    Operations on remote runs are committed in groups of up to `group_size`.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, database, address=('', 8086), group_size=1000):
+        super().__init__(address, _FrameHandler)
+        self.database = database
+        self.ingest = IngestQueue(database, group_size)
+        # Guards the remote runs being recorded, and the last frame received
+        # of every run, begun or ended.
+        self._lock = threading.Lock()
+        self._runs = {}
+        self._received = {}
+
+    def server_close(self):
+        super().server_close()
+        # Runs that have not ended are left incomplete.
+        self.ingest.close()
+
+    def receive(self, message):
+        """
+        Records a message of an agent.
+        """
+        kind = message.get('type')
+        key = message.get('run')
+        sequence = message.get('sequence', 0)
+
+        with self._lock:
+            if sequence <= self._received.get(key, 0):
+                logger.debug('Dropping repeated frame %d of %s', sequence, key)
+                return
+            self._received[key] = sequence
+
+            if kind == 'begin':
+                self.ingest.define_configuration(message['configuration'])
+                self.ingest.define_experiment(message['experiment'])
+                run = self.ingest.run_test(message['configuration'],
+                                           message['experiment'],
+                                           message['period'])
+                self._runs[key] = run.__enter__()
+                return
+            run = self._runs.pop(key) if kind == 'end' else self._runs.get(key)
+
+        if run is None:
+            logger.warning('Dropping %s of unknown run %s', kind, key)
+        elif kind == 'samples':
+            run.add_samples(message['samples'])
+        elif kind == 'end':
+            error = None if message['ok'] else \
+                RuntimeError('The run failed remotely')
+            try:
+                run.__exit__(type(error) if error else None, error, None)
+            except RuntimeError:
+                logger.exception('Could not record run %s', key)
+        else:
+            logger.warning('Unknown message: %s', kind)
+
+
+class _FrameHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        logger.info('Agent connected from %s:%d', *self.client_address[:2])
+        try:
+            for message in iter(lambda: read_frame(self.rfile), None):
+                self.server.receive(message)
+        except (EOFError, OSError, ValueError, zlib.error) as error:
+            logger.warning('Dropping connection from %s:%d: %s',
+                           *self.client_address[:2], error)
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Samples counters of host resources (CPU, memory, disk, and network) from
+/proc, so they can be recorded along with power measurements.
+
+>>> sampler = ResourceSampler()
+>>> sampler.sample()
+ResourceSample(cpu_user=..., cpu_system=..., ...)
+"""
+
+import re
+
+from collections import namedtuple
+
+from path import Path
+
+__all__ = ['ResourceSampler', 'ResourceSample']
+
+
+ResourceSample = namedtuple('ResourceSample', [
+    # Cumulative time spent, in clock ticks (USER_HZ). User includes nice;
+    # system includes time servicing interrupts.
+    'cpu_user',
+    'cpu_system',
+    'cpu_idle',
+    'cpu_iowait',
+    # Memory in use, in kilobytes.
+    'memory_used',
+    'memory_cached',
+    # Cumulative bytes read and written by all disks.
+    'disk_read',
+    'disk_written',
+    # Cumulative bytes received and sent by all interfaces but loopback.
+    'net_received',
+    'net_sent',
+])
+
+# /proc/diskstats always counts 512 byte sectors.
+SECTOR_SIZE = 512
+
+# Block devices that are backed by other devices (or by memory). Counting
+# them as well as their physical disks would count the same I/O twice.
+VIRTUAL_DEVICES = ('loop', 'ram', 'zram', 'dm-', 'md')
+
+
+class ResourceSampler:
+    """
+    Reads host resource counters from /proc.
+
+    Pass it to Measurements.run() to record a sample with every power
+    measurement::
+
+        measure.run(experiment, resources=ResourceSampler())
+    """
+
+    def __init__(self, root='/proc'):
+        self.root = Path(root)
+
+    def sample(self):
+        """
+        Returns a ResourceSample of the current counters.
+        """
+        return ResourceSample(*(self._cpu() + self._memory() +
+                                self._disk() + self._network()))
+
+    def _read(self, name):
+        with open(str(self.root/name)) as proc_file:
+            return proc_file.read().splitlines()
+
+    def _cpu(self):
+        for line in self._read('stat'):
+            if line.startswith('cpu '):
+                user, nice, system, idle, iowait, irq, softirq = (
+                    int(value) for value in line.split()[1:8]
+                )
+                return (user + nice, system + irq + softirq, idle, iowait)
+        raise ValueError('No aggregate CPU line in /proc/stat')
+
+    def _memory(self):
+        info = {}
+        for line in self._read('meminfo'):
+            key, value = line.split(':', 1)
+            info[key] = int(value.split()[0])
+
+        available = info.get('MemAvailable',
+                             info['MemFree'] + info.get('Cached', 0))
+        cached = info.get('Cached', 0) + info.get('Buffers', 0)
+        return (info['MemTotal'] - available, cached)
+
+    def _disk(self):
+        stats = {}
+        for line in self._read('diskstats'):
+            fields = line.split()
+            name = fields[2]
+            if name.startswith(VIRTUAL_DEVICES):
+                continue
+            stats[name] = int(fields[5]), int(fields[9])
+
+        # Partitions are counted in their disk too; skip them.
+        disks = [name for name in stats if not is_partition(name, stats)]
+        return (SECTOR_SIZE * sum(stats[name][0] for name in disks),
+                SECTOR_SIZE * sum(stats[name][1] for name in disks))
+
+    def _network(self):
+        received = sent = 0
+        # The first two lines are headers.
+        for line in self._read('net/dev')[2:]:
+            interface, counters = line.split(':', 1)
+            if interface.strip() == 'lo':
+                continue
+            fields = counters.split()
+            received += int(fields[0])
+            sent += int(fields[8])
+        return (received, sent)
+
+
+def is_partition(name, devices):
+    """
+    Returns True if the device name is a partition of another device (e.g.,
+    sda1 of sda, or nvme0n1p1 of nvme0n1).
+
+    When a disk's name ends in a digit, its partitions are separated by a
+    'p'; hence, nvme0n10 is not a partition of nvme0n1.
+    """
+    for disk in devices:
+        if name == disk or not name.startswith(disk):
+            continue
+        separator = 'p' if disk[-1].isdigit() else ''
+        if re.match(r'^' + separator + r'\d+$', name[len(disk):]):
+            return True
+    return False
@@ -0,0 +1,211 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+A ring of the latest power samples in shared memory, published once by the
+Watts Up? monitor process, and read by any number of subscribers at once (the
+client taking measurements, a live display, a dashboard...), in any local
+process::
+
+    meter = WattsUp()
+    meter.wait_until_ready()
+    with meter.subscribe(policy='latest') as samples:
+        for timestamp, watts in samples:
+            print(watts)
+
+A ring is a memory-mapped file: a 32-byte header (b'WUPR', a version, the
+size of a record, the number of samples published so far, and the capacity
+of the ring in records), followed by records of a sequence number, a Unix
+timestamp in milliseconds, and power in watts. Sample n (counting from one)
+is in record (n - 1) % capacity, and its sequence number is n; while the
+publisher rewrites a record, its sequence number is zero, so subscribers
+can tell a record that is being overwritten.
+
+Every subscription reads the ring at its own cursor, starting with the next
+sample published. A subscription that falls behind by more than the capacity
+of the ring loses the samples that were overwritten. Its policy decides what
+it reads next: the oldest sample left in the ring ('oldest'), or, whenever it
+is behind at all, only the latest sample ('latest'; e.g., for displays).
+Either way, the samples skipped are counted in its `dropped`.
+"""
+
+import logging
+import mmap
+import struct
+import tempfile
+import time
+import uuid
+
+from path import Path
+
+__all__ = ['Publisher', 'Subscription']
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'WUPR'
+VERSION = 1
+# Magic, version, record size, samples published, capacity.
+HEADER = struct.Struct('<4sHHQI12x')
+PUBLISHED = struct.Struct('<Q')
+PUBLISHED_OFFSET = 8
+RECORD = struct.Struct('<Qdd')  # sequence number, timestamp, watts
+SEQUENCE = struct.Struct('<Q')
+VALUES = struct.Struct('<dd')
+
+POLICIES = ('oldest', 'latest')
+
+
+class Publisher:
+    """
+    Publishes (timestamp, watts) samples to a new ring file of `capacity`
+    records.
+    """
+
+    def __init__(self, path, capacity=4096):
+        if capacity < 1:
+            raise ValueError('A ring needs at least one record')
+
+        self.path = Path(path)
+        self.capacity = capacity
+        self.published = 0
+
+        self._file = open(str(self.path), 'x+b')
+        self._file.truncate(HEADER.size + capacity * RECORD.size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        HEADER.pack_into(self._map, 0, MAGIC, VERSION, RECORD.size, 0,
+                         capacity)
+
+    @classmethod
+    def session(cls, directory=None, prefix='wattsup'):
+        """
+        Returns the path of a new ring, in shared memory if possible, made
+        unique by a UUID.
+        """
+        if directory is None:
+            shm = Path('/dev/shm')
+            directory = shm if shm.is_dir() else tempfile.gettempdir()
+        return Path(directory)/'{}-{}.ring'.format(prefix, uuid.uuid1().hex)
+
+    def publish(self, timestamp, watts):
+        """
+        Publishes a sample; timestamp is a Unix timestamp in milliseconds.
+        """
+        sequence = self.published + 1
+        offset = HEADER.size + self.published % self.capacity * RECORD.size
+        SEQUENCE.pack_into(self._map, offset, 0)
+        VALUES.pack_into(self._map, offset + SEQUENCE.size, timestamp, watts)
+        SEQUENCE.pack_into(self._map, offset, sequence)
+        PUBLISHED.pack_into(self._map, PUBLISHED_OFFSET, sequence)
+        self.published = sequence
+        return self
+
+    def close(self, remove=False):
+        """
+        Unmaps the ring and, if `remove`, deletes its file. Subscribers that
+        have it mapped may still read what was published.
+        """
+        if not self._map.closed:
+            self._map.close()
+            self._file.close()
+        if remove:
+            self.path.remove_p()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
+
+
+class Subscription:
+    """
+    Reads the samples published to a ring from now on, as (timestamp, watts)
+    tuples. Waiting subscriptions check for new samples every `interval`
+    seconds.
+    """
+
+    def __init__(self, path, policy='oldest', interval=0.01):
+        if policy not in POLICIES:
+            raise ValueError('Unknown policy: {}'.format(policy))
+
+        self.path = Path(path)
+        self.policy = policy
+        self.interval = interval
+        self.dropped = 0
+
+        with open(str(self.path), 'rb') as ring:
+            self._map = mmap.mmap(ring.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size, published, capacity = \
+            HEADER.unpack_from(self._map)
+        if magic != MAGIC or size != RECORD.size:
+            self._map.close()
+            raise ValueError('{} is not a ring'.format(path))
+        if version != VERSION:
+            self._map.close()
+            raise ValueError('Unsupported ring version {}'.format(version))
+
+        self.capacity = capacity
+        # The sequence number of the last sample read.
+        self.cursor = published
+
+    @property
+    def pending(self):
+        """
+        The number of samples published but not read yet, including those
+        that were overwritten.
+        """
+        return self._published() - self.cursor
+
+    def read(self, timeout=None):
+        """
+        Waits for the next sample, and returns it; or returns None if there
+        is none within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            published = self._published()
+            if published > self.cursor:
+                sample = self._read(published)
+                if sample is not None:
+                    return sample
+                # Overwritten while reading it; catch up.
+                continue
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.interval)
+
+    def _published(self):
+        return PUBLISHED.unpack_from(self._map, PUBLISHED_OFFSET)[0]
+
+    def _read(self, published):
+        if self.policy == 'latest':
+            oldest = published
+        else:
+            oldest = max(published - self.capacity + 1, 1)
+        if self.cursor + 1 < oldest:
+            skipped = oldest - self.cursor - 1
+            self.dropped += skipped
+            self.cursor += skipped
+            logger.debug('Dropped %d samples from %s', skipped, self.path)
+
+        sequence = self.cursor + 1
+        offset = HEADER.size + self.cursor % self.capacity * RECORD.size
+        before, timestamp, watts = RECORD.unpack_from(self._map, offset)
+        after, = SEQUENCE.unpack_from(self._map, offset)
+        if before != sequence or after != sequence:
+            return None
+        self.cursor = sequence
+        return timestamp, watts
+
+    def close(self):
+        self._map.close()
+
+    def __iter__(self):
+        while True:
+            yield self.read()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception_info):
+        self.close()
@@ -4,10 +4,124 @@ import logging
 import uuid
 
 from . import utc_date
+from .energy_aggregation import sampling_period
 
 
 logger = logging.getLogger(__name__)
 
+# Estimates the energy of each run, and summarizes its power samples. Format
+# with a WHERE clause to restrict the runs. Energy is normalized per operation
+# only if the run reported its workload. Note that
+# (operations/second) / watts = operations / joules.
+#
+# The index on measurement(run, timestamp) yields each run's samples in order,
+# so everything is computed in a single, constant-memory pass by
+# energy_summary(); should the samples arrive out of order anyway, its energy
+# is null and the run's samples are buffered by energy() instead. Each sample
+# stands for the energy used over the sampling period of its run; runs whose
+# period is unknown are taken to be sampled once a second.
+ENERGY_QUERY = r'''
+    SELECT id, configuration, experiment, energy,
+           started, ended, elapsed_time,
+           energy / operations as joules_per_operation,
+           operations / energy as operations_per_watt,
+           samples, gaps, interpolated,
+           power_mean, power_variance, power_min, power_max,
+           power_p50, power_p95, power_p99
+      FROM (SELECT id, configuration, experiment,
+                   COALESCE(json_extract(summary, '$.energy'),
+                            (SELECT energy(power, timestamp, period)
+                               FROM measurement
+                              WHERE measurement.run = id))
+                     as energy,
+                   json_extract(summary, '$.started') as started,
+                   json_extract(summary, '$.ended') as ended,
+                   (json_extract(summary, '$.ended') -
+                    json_extract(summary, '$.started'))
+                     as elapsed_time, -- in milliseconds
+                   json_extract(summary, '$.samples') as samples,
+                   json_extract(summary, '$.gaps') as gaps,
+                   json_extract(summary, '$.interpolated') as interpolated,
+                   json_extract(summary, '$.power_mean') as power_mean,
+                   json_extract(summary, '$.power_variance')
+                     as power_variance,
+                   json_extract(summary, '$.power_min') as power_min,
+                   json_extract(summary, '$.power_max') as power_max,
+                   json_extract(summary, '$.power_p50') as power_p50,
+                   json_extract(summary, '$.power_p95') as power_p95,
+                   json_extract(summary, '$.power_p99') as power_p99
+              FROM (SELECT run.id as id,
+                           configuration, experiment,
+                           COALESCE(run.period, 1000) as period,
+                           energy_summary(power, timestamp,
+                                          COALESCE(run.period, 1000))
+                             as summary
+                      FROM measurement JOIN run ON measurement.run = run.id
+                      {where}
+                  GROUP BY run.id))
+      LEFT JOIN workload ON workload.run = id
+'''
+
+
+# Widths, in seconds, of the buckets of power_rollup. Every width is a
+# multiple of the first.
+ROLLUP_WIDTHS = (1, 10, 60)
+
+# Rolls up the power of one run into buckets of the given width.
+ROLLUP_QUERY = r'''
+    INSERT INTO power_rollup (run, width, bucket, samples,
+                              power_mean, power_min, power_max)
+    SELECT run, :width,
+           CAST((timestamp - first_timestamp) / (1000 * :width) AS INTEGER)
+             as bucket,
+           COUNT(*), AVG(power), MIN(power), MAX(power)
+      FROM measurement JOIN run ON measurement.run = run.id
+     WHERE run = :id
+  GROUP BY bucket
+'''
+
+# Rolls up the narrowest buckets of one run into buckets of the given width;
+# this is exact, and much cheaper than rolling up every sample again.
+COARSER_ROLLUP_QUERY = r'''
+    INSERT INTO power_rollup (run, width, bucket, samples,
+                              power_mean, power_min, power_max)
+    SELECT run, :width, bucket * :narrowest / :width as coarser,
+           SUM(samples), SUM(samples * power_mean) / SUM(samples),
+           MIN(power_min), MAX(power_max)
+      FROM power_rollup
+     WHERE run = :id AND width = :narrowest
+  GROUP BY coarser
+'''
+
+# Moves the staged samples of a run recorded with checkpoints to measurement.
+PROMOTE_QUERY = r'''
+    INSERT INTO measurement (run, timestamp, power)
+    SELECT run, timestamp, power FROM staged_measurement
+     WHERE run = :id
+  ORDER BY rowid
+'''
+
+# Enough of the first samples of a run to detect its sampling period.
+PERIOD_QUERY = r'''
+    SELECT timestamp FROM measurement
+     WHERE run = ?
+  ORDER BY timestamp
+     LIMIT 1001
+'''
+
+
+def rollup_run(cursor, run):
+    """
+    Rolls up the power of a run into power_rollup, in buckets of every width
+    of ROLLUP_WIDTHS.
+    """
+    narrowest, *coarser = ROLLUP_WIDTHS
+    cursor.execute(ROLLUP_QUERY, {'id': run, 'width': narrowest})
+    cursor.executemany(COARSER_ROLLUP_QUERY, [
+        {'id': run, 'width': width, 'narrowest': narrowest}
+        for width in coarser
+    ])
+
 
 class Run:
     """
@@ -18,33 +132,94 @@ class Run:
             test += 90.4
             test += 90.5
             test += 90.5
+
+    The sampling period of the run, in milliseconds, may be declared by the
+    meter; otherwise, it is detected from the timestamps of the samples when
+    the run ends.
+
+    By default, the run is recorded in a single transaction, committed when
+    the run ends. If `checkpoint` is given, the run is recorded with
+    checkpoints instead: its samples are staged (see staged_measurement in
+    schema.sql), and committed every `checkpoint` samples, so that long runs
+    do not grow an ever larger transaction, and survive a crash of the
+    harness. When the run ends, its samples are moved to measurement; if it
+    fails, it is deleted.
     """
 
-    def __init__(self, connection, configuration, experiment):
+    def __init__(self, connection, configuration, experiment, period=None,
+                 checkpoint=None):
+        if checkpoint is not None and checkpoint < 1:
+            raise ValueError('Must checkpoint at least every sample')
+
         self.connection = connection
         self.experiment = experiment
         self.configuration = configuration
+        self.period = period
+        self.checkpoint = checkpoint
+        # Samples staged since the last checkpoint.
+        self._staged = 0
         self.cursor = connection.cursor()
         self.id = None
         self._written = False
+        # Kept up to date in the run row, when the run ends.
+        self.sample_count = 0
+        self.first_timestamp = None
+        self.last_timestamp = None
 
     def __enter__(self):
         next_id = uuid.uuid1().hex
         logger.info('Next run id: %s', next_id)
 
-        self.cursor.execute('BEGIN TRANSACTION')
+        if self.checkpoint is None:
+            self.cursor.execute('BEGIN TRANSACTION')
         self.cursor.execute(r'''
-            INSERT INTO run(id, configuration, experiment)
-            VALUES (?, ?, ?);
-        ''', (next_id, self.configuration, self.experiment))
+            INSERT INTO run(id, configuration, experiment,
+                            started_at, sample_count, period)
+            VALUES (?, ?, ?, ?, 0, ?);
+        ''', (next_id, self.configuration, self.experiment,
+              utc_date.to_timestamp(utc_date.now()), self.period))
 
         self.id = next_id
 
+        if self.checkpoint is not None:
+            self.cursor.execute(r'''
+                INSERT INTO staged_run (id) VALUES (?)
+            ''', (self.id,))
+            self._commit_checkpoint()
+
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         if exc_type is None:
             # Exited successfully
+            if self.checkpoint is not None:
+                self.cursor.execute(PROMOTE_QUERY, {'id': self.id})
+                self.cursor.execute(r'''
+                    DELETE FROM staged_run WHERE id = ?
+                ''', (self.id,))
+            if self.period is None:
+                self.period = sampling_period(
+                    timestamp for timestamp, in
+                    self.cursor.execute(PERIOD_QUERY, (self.id,))
+                )
+            self.cursor.execute(r'''
+                UPDATE run
+                   SET ended_at = :ended_at,
+                       duration = :ended_at - started_at,
+                       sample_count = :sample_count,
+                       first_timestamp = :first_timestamp,
+                       last_timestamp = :last_timestamp,
+                       period = :period
+                 WHERE id = :id
+            ''', {
+                'id': self.id,
+                'period': self.period,
+                'ended_at': utc_date.to_timestamp(utc_date.now()),
+                'sample_count': self.sample_count,
+                'first_timestamp': self.first_timestamp,
+                'last_timestamp': self.last_timestamp
+            })
+            rollup_run(self.cursor, self.id)
             logger.info("Committing %s", self.id)
             self.connection.commit()
             self._written = True
@@ -54,6 +229,12 @@ class Run:
             logger.error("Rolling back run %s (%s/%s)", self.id,
                          self.configuration, self.experiment,
                          exc_info=(exc_type, exc_value, traceback))
+            if self.checkpoint is not None:
+                # Clean up what was committed at checkpoints.
+                self.cursor.execute(r'''
+                    DELETE FROM run WHERE id = ?
+                ''', (self.id,))
+                self.connection.commit()
 
     def add_measurement(self, measurement, time=None):
         """
@@ -68,17 +249,131 @@ class Run:
             time = utc_date.now()
         assert utc_date.is_in_utc(time)
 
+        return self.add_measurements([(measurement, time)])
+
+    def add_measurements(self, samples):
+        """
+        Adds a batch of (watts, time) power measurements to the current run,
+        as returned by Meter.next_measurement(), in a single statement. Every
+        time **MUST** be a datetime object in the UTC timezone.
+
+        Prefer this to add_measurement() for meters that sample many times a
+        second.
+        """
+
+        return self.add_samples((watts, utc_date.to_timestamp(time))
+                                for watts, time in samples)
+
+    def add_samples(self, samples):
+        """
+        Adds a batch of (watts, timestamp) power measurements to the current
+        run, where timestamps are Unix timestamps in milliseconds, as stored;
+        e.g., when importing samples captured earlier.
+        """
+
+        rows = [(self.id, watts, timestamp) for watts, timestamp in samples]
+        if not rows:
+            return self
+
+        self.cursor.executemany(r'''
+            INSERT INTO {} (run, power, timestamp)
+            VALUES (?, ?, ?)
+        '''.format('measurement' if self.checkpoint is None
+                   else 'staged_measurement'), rows)
+
+        timestamps = [timestamp for _, _, timestamp in rows]
+        first, last = min(timestamps), max(timestamps)
+        self.sample_count += len(rows)
+        if self.first_timestamp is None or first < self.first_timestamp:
+            self.first_timestamp = first
+        if self.last_timestamp is None or last > self.last_timestamp:
+            self.last_timestamp = last
+
+        if self.checkpoint is not None:
+            self._staged += len(rows)
+            if self._staged >= self.checkpoint:
+                self._commit_checkpoint()
+
+        return self
+
+    def add_resources(self, sample, time=None):
+        """
+        Add a ResourceSample (see measurements.resources) to the current run.
+
+        If time is provided, it **MUST** be a datetime object in the UTC
+        timezone.
+        """
+
+        if time is None:
+            time = utc_date.now()
+        assert utc_date.is_in_utc(time)
+
         self.cursor.execute(r'''
-            INSERT INTO measurement (run, power, timestamp)
-            VALUES (:id, :power, :timestamp)
+            INSERT INTO resource (
+                run, timestamp, cpu_user, cpu_system, cpu_idle, cpu_iowait,
+                memory_used, memory_cached, disk_read, disk_written,
+                net_received, net_sent
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (self.id, utc_date.to_timestamp(time)) + tuple(sample))
+
+        return self
+
+    def add_phase(self, name, timestamp=None):
+        """
+        Marks the beginning of a named phase of the current run.
+
+        If provided, timestamp is a Unix timestamp in milliseconds.
+        """
+
+        if timestamp is None:
+            timestamp = utc_date.to_timestamp(utc_date.now())
+
+        self.cursor.execute(r'''
+            INSERT INTO phase (run, name, timestamp)
+            VALUES (?, ?, ?)
+        ''', (self.id, name, timestamp))
+
+        return self
+
+    def add_workload(self, operations=None, bytes=None, transactions=None):
+        """
+        Adds to the workload counters of the current run.
+        """
+
+        self.cursor.execute(r'''
+            INSERT INTO workload (run, operations, bytes, transactions)
+            VALUES (:id, :operations, :bytes, :transactions)
+            ON CONFLICT (run) DO UPDATE SET
+                operations = COALESCE(operations + excluded.operations,
+                                      operations, excluded.operations),
+                bytes = COALESCE(bytes + excluded.bytes,
+                                 bytes, excluded.bytes),
+                transactions = COALESCE(transactions + excluded.transactions,
+                                        transactions, excluded.transactions)
         ''', {
             'id': self.id,
-            'power': measurement,
-            'timestamp': utc_date.to_timestamp(time)
+            'operations': operations,
+            'bytes': bytes,
+            'transactions': transactions
         })
 
         return self
 
+    def add_throughput(self, records):
+        """
+        Adds Throughput records parsed from the output of a benchmark tool
+        (see measurements.parsers) to the current run.
+        """
+
+        self.cursor.executemany(r'''
+            INSERT INTO throughput (
+                run, tool, test, requests, requests_per_second,
+                latency_mean, latency_p50, latency_p95, latency_p99
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [(self.id,) + tuple(record) for record in records])
+
+        return self
+
     def __iadd__(self, measurement):
         """
         Same as Run.add_measurement(power_in_watts).
@@ -86,6 +381,17 @@ class Run:
         self.add_measurement(measurement)
         return self
 
+    def _commit_checkpoint(self):
+        """
+        Commits everything recorded so far (including phases, resources, and
+        so on) to the staging area.
+        """
+        self.cursor.execute(r'''
+            UPDATE staged_run SET checkpointed_at = ? WHERE id = ?
+        ''', (utc_date.to_timestamp(utc_date.now()), self.id))
+        self.connection.commit()
+        self._staged = 0
+
     def write_back_energy(self):
         """
         Write the estimated energy of the entire test back to the database.
@@ -99,16 +405,11 @@ class Run:
         with self.connection:
             self.connection.execute("""
                 INSERT OR FAIL INTO energy(
-                    id, configuration, experiment, energy, started, ended, elapsed_time
-                ) SELECT run.id as id,
-                       configuration,
-                       experiment,
-                       energy(power, timestamp) as energy,
-                       MIN(timestamp) as started,
-                       MAX(timestamp) as ended,
-                       (MAX(timestamp) - MIN(timestamp))
-                         as elapsed_time -- in milliseconds
-                   FROM measurement JOIN run ON measurement.run = run.id
-                  WHERE id = :id
-               GROUP BY run.id;
-            """, {'id': self.id})
+                    id, configuration, experiment, energy, started, ended,
+                    elapsed_time, joules_per_operation, operations_per_watt,
+                    samples, gaps, interpolated,
+                    power_mean, power_variance, power_min, power_max,
+                    power_p50, power_p95, power_p99
+                ) {query};
+            """.format(query=ENERGY_QUERY.format(where='WHERE run.id = :id')),
+            {'id': self.id})
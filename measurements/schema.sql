@@ -31,19 +31,36 @@ CREATE TABLE IF NOT EXISTS experiment(
 -- This indicates the experiment itself and the hardware configuration of the
 -- run.
 --
--- The individual power measurements exist in `measurement`.
+-- The individual power measurements exist in `measurement`; the rest of the
+-- columns are maintained as they are recorded, so that the time span of a run
+-- is a lookup rather than an aggregation over its measurements. Runs recorded
+-- by older versions are backfilled from their measurements, using the first
+-- and last samples as the wall-clock start and end.
+--
+-- The sampling period is declared by the meter, or detected from the
+-- timestamps of the samples when the run ends (and for older runs); runs
+-- without a period are taken to be sampled once a second.
 CREATE TABLE IF NOT EXISTS run(
     id              PRIMARY KEY,
     configuration   TEXT REFERENCES configuration(name)
         ON DELETE CASCADE ON UPDATE CASCADE,
     experiment      TEXT REFERENCES experiment(name)
-        ON DELETE CASCADE ON UPDATE CASCADE
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    started_at      REAL,    -- Wall-clock Unix timestamps in milliseconds
+    ended_at        REAL,
+    duration        REAL,    -- ended_at - started_at, in milliseconds
+    sample_count    INTEGER, -- Power measurements recorded
+    first_timestamp REAL,    -- Timestamps of the first and last measurement
+    last_timestamp  REAL,
+    period          REAL     -- Sampling period, in milliseconds
 );
 
 -- The individual power samples for a particular run of an experiment.
 --
--- The power samples are the root mean square (RMS) watts recorded for a one
--- second sampling period (1Hz).
+-- The power samples are the average watts over one sampling period of the
+-- run: the root mean square (RMS) watts over one second (1Hz) for the Watts
+-- Up?, or as often as the meter is configured to sample (e.g., 100Hz for
+-- RAPL). Each sample stands for power * period (in seconds) joules.
 CREATE TABLE IF NOT EXISTS measurement(
     run             REFERENCES run(id)
         ON DELETE CASCADE ON UPDATE CASCADE,
@@ -51,6 +68,133 @@ CREATE TABLE IF NOT EXISTS measurement(
     power           REAL NOT NULL
 );
 
+-- Yields the samples of each run in chronological order, so that energy can
+-- be aggregated in a single streaming pass.
+CREATE INDEX IF NOT EXISTS measurement_run_timestamp
+    ON measurement(run, timestamp);
+
+-- Runs being recorded with checkpoints, whose samples are staged in
+-- `staged_measurement` and committed in batches as they are recorded. When
+-- the run ends, its samples are moved to `measurement` and it is removed from
+-- here. Runs left here by a crash can be recovered (or discarded) with
+-- `python -m measurements recover`.
+CREATE TABLE IF NOT EXISTS staged_run(
+    id              PRIMARY KEY REFERENCES run(id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    checkpointed_at REAL     -- Wall-clock Unix timestamp in milliseconds
+);
+
+CREATE TABLE IF NOT EXISTS staged_measurement(
+    run             REFERENCES staged_run(id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    timestamp       REAL NOT NULL, -- Unix timestamp in milliseconds
+    power           REAL NOT NULL
+);
+
+-- Counters of host resources, sampled along with each power measurement of a
+-- run. Apart from memory, counters are cumulative; take the difference of
+-- consecutive samples to get the utilization over a sampling period.
+CREATE TABLE IF NOT EXISTS resource(
+    run             REFERENCES run(id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    timestamp       REAL NOT NULL, -- Unix timestamp in milliseconds
+    cpu_user        INTEGER, -- Time spent, in clock ticks (USER_HZ)
+    cpu_system      INTEGER,
+    cpu_idle        INTEGER,
+    cpu_iowait      INTEGER,
+    memory_used     INTEGER, -- in kilobytes
+    memory_cached   INTEGER,
+    disk_read       INTEGER, -- in bytes
+    disk_written    INTEGER,
+    net_received    INTEGER, -- in bytes
+    net_sent        INTEGER
+);
+
+-- Markers emitted by an experiment to delimit the phases of a run (e.g.,
+-- warmup, steady state, teardown). A phase lasts until the next marker of the
+-- same run, or until the run ends. Samples before the first marker belong to
+-- no phase. Measurements.phase_energy() reports each phase as starting at its
+-- marker and ending at the timestamp of its last sample.
+CREATE TABLE IF NOT EXISTS phase(
+    run             REFERENCES run(id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    name            TEXT NOT NULL,
+    timestamp       REAL NOT NULL  -- Unix timestamp in milliseconds
+);
+
+-- Workload counters reported by an experiment, used to normalize the energy
+-- of a run per unit of work.
+CREATE TABLE IF NOT EXISTS workload(
+    run             PRIMARY KEY REFERENCES run(id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    operations      INTEGER, -- Units of work (e.g., queries, requests)
+    bytes           INTEGER, -- Bytes processed
+    transactions    INTEGER  -- Database transactions completed
+);
+
+-- Throughput and latency parsed from the output of benchmark tools (e.g.,
+-- redis-benchmark, pgbench, tsung) run during a run. Usually, there is one
+-- row per test the tool ran.
+CREATE TABLE IF NOT EXISTS throughput(
+    run             REFERENCES run(id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    tool            TEXT NOT NULL,
+    test            TEXT,    -- e.g., SET or GET for redis-benchmark
+    requests        INTEGER, -- Requests or transactions completed
+    requests_per_second REAL,
+    latency_mean    REAL,    -- All latencies in milliseconds
+    latency_p50     REAL,
+    latency_p95     REAL,
+    latency_p99     REAL
+);
+
+-- The running total of energy of each run, over its interpolated samples:
+-- `energy` is the sum of every sample up to and including `timestamp`. Built
+-- by Measurements.index_energy(), it answers energy_between(run, t0, t1) with
+-- two index lookups, rather than a scan of the run's measurements.
+CREATE TABLE IF NOT EXISTS cumulative_energy(
+    run             REFERENCES run(id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    timestamp       REAL NOT NULL, -- Unix timestamp in milliseconds
+    energy          REAL NOT NULL, -- Joules since the start of the run
+    PRIMARY KEY (run, timestamp)
+);
+
+-- Power of each run, rolled up into buckets of 1, 10, and 60 seconds of
+-- elapsed time (since the first measurement of the run), for plotting traces
+-- without reading every measurement. Bucket n of width w covers the elapsed
+-- times [n*w, (n+1)*w) seconds. Only recorded samples are counted, not
+-- interpolated ones. Maintained as runs are recorded.
+CREATE TABLE IF NOT EXISTS power_rollup(
+    run             REFERENCES run(id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    width           INTEGER NOT NULL, -- Width of the bucket, in seconds
+    bucket          INTEGER NOT NULL,
+    samples         INTEGER NOT NULL,
+    power_mean      REAL NOT NULL,    -- All in watts
+    power_min       REAL NOT NULL,
+    power_max       REAL NOT NULL,
+    PRIMARY KEY (run, width, bucket)
+);
+
+-- Histograms of power over elapsed time (since the first measurement of each
+-- run) of every experiment and configuration, for density plots. All
+-- configurations of an experiment share the same bins. Only bins with samples
+-- are stored. Regenerated by `python -m measurements histogram`.
+CREATE TABLE IF NOT EXISTS power_histogram(
+    experiment      TEXT REFERENCES experiment(name)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    configuration   TEXT REFERENCES configuration(name)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    time_bin        INTEGER NOT NULL,
+    power_bin       INTEGER NOT NULL,
+    time_low        REAL NOT NULL, -- Edges of the bin, in seconds...
+    time_high       REAL NOT NULL,
+    power_low       REAL NOT NULL, -- ...and in watts
+    power_high      REAL NOT NULL,
+    count           INTEGER NOT NULL
+);
+
 -- Estimates the energy given the power measurements. This denormalizes the
 -- database a little bit, but makes it easier to share the computed data with
 -- external programs.
@@ -63,5 +207,106 @@ CREATE TABLE IF NOT EXISTS energy(
     energy          REAL NOT NULL,
     started         REAL NOT NULL,
     ended           REAL NOT NULL,
-    elapsed_time    REAL NOT NULL
+    elapsed_time    REAL NOT NULL,
+    -- Only available if the run reported its workload:
+    joules_per_operation    REAL,
+    operations_per_watt     REAL, -- (operations/second) / watts
+    -- Summary of the power samples (see EnergySummary):
+    samples         INTEGER, -- Samples recorded
+    gaps            INTEGER, -- Gaps between samples
+    interpolated    INTEGER, -- Samples interpolated to fill the gaps
+    power_mean      REAL,    -- All in watts, over recorded samples
+    power_variance  REAL,
+    power_min       REAL,
+    power_max       REAL,
+    power_p50       REAL,    -- Approximate, to within 0.05 W
+    power_p95       REAL,
+    power_p99       REAL
+);
+
+-- Statistical comparisons of the energy of pairs of configurations of every
+-- experiment, computed from the energy table by `python -m measurements
+-- stats` (see measurements/stats.py). Statistics that are undefined for too
+-- few runs are NULL.
+CREATE TABLE IF NOT EXISTS energy_comparison(
+    experiment      TEXT REFERENCES experiment(name)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    configuration   TEXT REFERENCES configuration(name)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    baseline        TEXT REFERENCES configuration(name)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    runs            INTEGER NOT NULL,
+    baseline_runs   INTEGER NOT NULL,
+    mean            REAL NOT NULL, -- Mean energy, in joules
+    baseline_mean   REAL NOT NULL,
+    welch_t         REAL,    -- Welch's unequal variances t-test
+    welch_df        REAL,
+    welch_p         REAL,
+    mann_whitney_u  REAL,    -- Mann-Whitney U test, two-sided
+    mann_whitney_p  REAL,
+    cohens_d        REAL,    -- Positive if configuration uses more energy
+    shapiro_p       REAL,    -- Shapiro-Wilk test of normality
+    baseline_shapiro_p REAL
+);
+
+-- Bootstrap confidence intervals of the difference of the energy of a
+-- configuration from a baseline configuration, for every experiment, as
+-- computed by `python -m measurements bootstrap` (see
+-- measurements/bootstrap.py). `version` is a digest of the runs the result
+-- was computed from; a result is recomputed when its runs change.
+CREATE TABLE IF NOT EXISTS bootstrap(
+    experiment      TEXT REFERENCES experiment(name)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    configuration   TEXT REFERENCES configuration(name)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    baseline        TEXT REFERENCES configuration(name)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    statistic       TEXT NOT NULL,   -- mean or median
+    resamples       INTEGER NOT NULL,
+    confidence      REAL NOT NULL,   -- e.g., 0.95
+    seed            INTEGER NOT NULL,
+    version         TEXT NOT NULL,
+    difference      REAL NOT NULL,   -- configuration - baseline, in joules
+    lower           REAL NOT NULL,
+    upper           REAL NOT NULL,
+    percent         REAL NOT NULL,   -- ...in percent of the baseline
+    percent_lower   REAL NOT NULL,
+    percent_upper   REAL NOT NULL,
+    PRIMARY KEY (experiment, configuration, baseline, statistic,
+                 resamples, confidence, seed)
+);
+
+-- Segments of steady mean power of each run, found by change-point detection
+-- (see measurements/changepoint.py) on its interpolated samples. The longest
+-- segment of a run is labelled steady; earlier segments are warmup, and later
+-- ones are tail. Segmented by `python -m measurements segment`.
+CREATE TABLE IF NOT EXISTS segment(
+    run             REFERENCES run(id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    number          INTEGER NOT NULL, -- In chronological order, from 0
+    label           TEXT NOT NULL,    -- warmup, steady, or tail
+    started         REAL NOT NULL,    -- Timestamps of the first and last
+    ended           REAL NOT NULL,    -- samples, in milliseconds
+    samples         INTEGER NOT NULL, -- Including interpolated samples
+    energy          REAL NOT NULL,    -- in joules
+    power_mean      REAL NOT NULL,    -- in watts
+    PRIMARY KEY (run, number)
+);
+
+-- Problems found in the measurements of each run by `python -m measurements
+-- quality` (see measurements/quality.py). Runs that are not ok have samples
+-- that the energy aggregation cannot place (duplicates) or implausible power
+-- (outliers); Measurements.energy(exclude_bad=True) leaves them out.
+CREATE TABLE IF NOT EXISTS run_quality(
+    run             PRIMARY KEY REFERENCES run(id)
+        ON DELETE CASCADE ON UPDATE CASCADE,
+    samples         INTEGER NOT NULL,
+    gaps            INTEGER NOT NULL, -- Gaps between consecutive samples...
+    gap_seconds     INTEGER NOT NULL, -- ...and the samples missing from them
+    duplicates      INTEGER NOT NULL, -- Samples < 0.5 s after the previous
+    out_of_order    INTEGER NOT NULL, -- Recorded before an earlier sample
+    outliers        INTEGER NOT NULL, -- Implausible power
+    power_min       REAL,
+    power_max       REAL,
+    ok              INTEGER NOT NULL  -- 1 if no duplicates nor outliers
 );
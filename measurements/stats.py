@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Compares the energy of the configurations of every experiment, as
+analysis/ttesting.R does, but for all experiments at once and without R::
+
+    $ python -m measurements stats energy.sqlite
+
+This reads the `energy` table (see python -m measurements) and replaces the
+contents of the `energy_comparison` table with one row for every pair of
+configurations of every experiment:
+
+ - Welch's t-test, which does not assume equal variances;
+ - the Mann-Whitney U test, which does not assume normality;
+ - Cohen's d, using the pooled standard deviation;
+ - the Shapiro-Wilk test of normality of either configuration.
+
+The means, variances, t-tests, and effect sizes of all pairs are computed as
+one batch of array operations.
+
+Requires NumPy and SciPy.
+"""
+
+import logging
+import re
+from collections import namedtuple
+from itertools import combinations
+
+import numpy as np
+from scipy import stats
+
+__all__ = ['Comparison', 'compare_configurations', 'write_comparisons']
+
+logger = logging.getLogger(__name__)
+
+
+Comparison = namedtuple('Comparison', [
+    'experiment',
+    'configuration',
+    'baseline',
+    'runs',
+    'baseline_runs',
+    'mean',                 # Mean energy, in joules
+    'baseline_mean',
+    'welch_t',
+    'welch_df',
+    'welch_p',
+    'mann_whitney_u',
+    'mann_whitney_p',
+    'cohens_d',             # Positive if configuration uses more energy
+    'shapiro_p',            # p >= 0.05 suggests a normal distribution
+    'baseline_shapiro_p',
+])
+
+
+def compare_configurations(conn, baseline=None, table='energy'):
+    """
+    Returns a list of Comparisons of the energy of configurations of every
+    experiment in the given table.
+
+    If a baseline configuration is given, every other configuration is
+    compared to it; otherwise, every pair is compared, taking the first
+    configuration in alphabetical order as the baseline. Statistics that are
+    undefined for too few runs are None.
+    """
+
+    if not re.match('^(?!sqlite_)[A-Za-z0-9_]+$', table):
+        raise ValueError('Invalid table name: ' + table)
+
+    rows = conn.execute(r'''
+        SELECT experiment, configuration, energy FROM {}
+      ORDER BY experiment, configuration
+    '''.format(table)).fetchall()
+    if not rows:
+        return []
+
+    # Number every (experiment, configuration) group.
+    keys = [(experiment, configuration)
+            for experiment, configuration, _ in rows]
+    groups = sorted(set(keys))
+    number = {key: index for index, key in enumerate(groups)}
+    group = np.array([number[key] for key in keys])
+    energy = np.array([row[2] for row in rows], dtype=float)
+
+    samples = [energy[group == index] for index in range(len(groups))]
+    runs = np.bincount(group, minlength=len(groups))
+    mean = np.bincount(group, weights=energy) / runs
+    squares = np.bincount(group, weights=(energy - mean[group]) ** 2)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = np.where(runs > 1, squares / (runs - 1), np.nan)
+
+    # Pair the groups of each experiment.
+    pairs = []
+    for index, (experiment, configuration) in enumerate(groups):
+        if baseline is not None and configuration != baseline:
+            continue
+        for other, (other_experiment, other_configuration) in \
+                enumerate(groups):
+            if other_experiment != experiment or other == index:
+                continue
+            if baseline is None and other_configuration < configuration:
+                continue
+            pairs.append((other, index))
+    if not pairs:
+        return []
+    a, b = (np.array(column) for column in zip(*pairs))
+
+    # Welch's t-test, and Cohen's d, for all pairs at once.
+    with np.errstate(invalid='ignore', divide='ignore'):
+        error_a, error_b = variance[a] / runs[a], variance[b] / runs[b]
+        t = (mean[a] - mean[b]) / np.sqrt(error_a + error_b)
+        df = ((error_a + error_b) ** 2 /
+              (error_a ** 2 / (runs[a] - 1) + error_b ** 2 / (runs[b] - 1)))
+        p = 2 * stats.t.sf(np.abs(t), df)
+        pooled = np.sqrt(((runs[a] - 1) * variance[a] +
+                          (runs[b] - 1) * variance[b]) /
+                         (runs[a] + runs[b] - 2))
+        d = (mean[a] - mean[b]) / pooled
+
+    shapiro = [_shapiro(sample) for sample in samples]
+
+    comparisons = []
+    for k, (i, j) in enumerate(pairs):
+        u, u_p = _mann_whitney(samples[i], samples[j])
+        comparisons.append(Comparison(
+            groups[i][0], groups[i][1], groups[j][1],
+            int(runs[i]), int(runs[j]),
+            float(mean[i]), float(mean[j]),
+            _finite(t[k]), _finite(df[k]), _finite(p[k]),
+            u, u_p, _finite(d[k]),
+            shapiro[i], shapiro[j]
+        ))
+
+    return comparisons
+
+
+def write_comparisons(conn, baseline=None, table='energy'):
+    """
+    Replaces the contents of the energy_comparison table with fresh
+    comparisons.
+    """
+
+    comparisons = compare_configurations(conn, baseline, table)
+    with conn:
+        conn.execute('DELETE FROM energy_comparison')
+        conn.executemany(r'''
+            INSERT INTO energy_comparison ({})
+            VALUES ({})
+        '''.format(', '.join(Comparison._fields),
+                   ', '.join('?' * len(Comparison._fields))), comparisons)
+    logger.info('Compared %d pairs of configurations', len(comparisons))
+    return comparisons
+
+
+def _mann_whitney(sample, baseline):
+    if len(sample) == 0 or len(baseline) == 0:
+        return None, None
+    result = stats.mannwhitneyu(sample, baseline, alternative='two-sided')
+    return float(result.statistic), float(result.pvalue)
+
+
+def _shapiro(sample):
+    # The test needs at least three values that are not all the same.
+    if len(sample) < 3 or np.ptp(sample) == 0:
+        return None
+    return float(stats.shapiro(sample).pvalue)
+
+
+def _finite(value):
+    return float(value) if np.isfinite(value) else None
@@ -11,11 +11,34 @@ Usage::
         measurement, timestamp = client.next_measurement()
         print("Got measurement:", measurement, timestamp)
         # Take as many measurements as necessary.
+
+The monitor process publishes every sample it reads to a ring in shared
+memory (see measurements.ring), whose path is `client.ring`, whether or not
+the client is taking measurements. The client reads its measurements from
+the ring, and so may any number of other subscribers, at the same time::
+
+    with client.subscribe(policy='latest') as samples:
+        timestamp, watts = samples.read()
+
+Given a directory as `journal`, every sample read is also appended to a
+journal file in it (see measurements.journal).
+
+The monitor watches the meter: if wattsup prints nothing for `timeout`
+seconds (e.g., it wedged, or the USB serial device reset), or exits, the
+monitor restarts it, up to `restarts` times, until it prints its first line
+again. Meanwhile, the client either waits, and the run continues with a gap
+in its samples (`on_stall='gap'`, the default; the energy aggregation
+interpolates gaps, and `python -m measurements quality` counts them), or
+raises MeterStalled (`on_stall='abort'`), so that the run is rolled back.
+Either way, MeterStalled is raised if the meter cannot be restarted.
 """
 
+import os
+import select
 import subprocess
 import datetime
 import logging
+import time
 
 from multiprocessing import Process, Pipe
 from contextlib import suppress
@@ -23,6 +46,11 @@ from contextlib import suppress
 from path import Path
 from sh import which
 
+from . import utc_date
+from .journal import Journal
+from .meter import Meter, MeterStalled
+from .ring import Publisher, Subscription
+
 __all__ = ['WattsUp']
 
 here = Path(__file__).parent
@@ -35,35 +63,91 @@ class ExitSuccessfully(BaseException):
 
 
 class WattsUpMonitor:
-    def __init__(self, conn, executable=None, args=None):
+    def __init__(self, conn, executable=None, args=None, journal=None,
+                 ring=None, capacity=4096, timeout=None, restarts=3):
         self.conn = conn
-        self.should_send = False
-
-        # Start a blocking text stream
-        arg_list = [executable] + list(args or ())
-        with subprocess.Popen(arg_list, stdout=subprocess.PIPE) as proc:
-            self.proc = proc
+        self.arg_list = [executable] + list(args or ())
+        self.timeout = timeout
+        self.restarts = restarts
+        self.journal = None
+        self.proc = None
+        # Output of wattsup read, but not yet split into lines.
+        self._buffer = b''
+
+        self.ring = Publisher(ring, capacity)
+        if journal is not None:
+            self.journal = Journal(journal)
+        try:
+            self.start()
             self.wait_for_ready()
+            self.reply('ready')
             with suppress(ExitSuccessfully):
                 self.loop()
+        finally:
+            self.stop()
+            if self.journal is not None:
+                self.journal.close()
+            self.ring.close(remove=True)
+
+    def start(self):
+        # Start a blocking text stream
+        self.proc = subprocess.Popen(self.arg_list, stdout=subprocess.PIPE)
+        self._buffer = b''
 
-    def wait_for_ready(self):
+    def stop(self):
+        if self.proc is None:
+            return
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+            self.proc.wait()
+        self.proc.stdout.close()
+        self.proc = None
+
+    def wait_for_ready(self, timeout=None):
+        """
+        Returns whether wattsup printed its first line within `timeout`
+        seconds.
+        """
         # Read one line
-        buff = self.proc.stdout.readline()
-        self.reply('ready')
+        return bool(self.readline(timeout))
 
     def loop(self):
-        proc = self.proc
-
         while True:
             self.handle_control_message()
             self.blocking_read_measurement()
 
+    def readline(self, timeout=None):
+        """
+        Returns the next line printed by wattsup; or b'' if it exited, or
+        None if it printed nothing within `timeout` seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stdout = self.proc.stdout.fileno()
+        while b'\n' not in self._buffer:
+            remaining = (None if deadline is None
+                         else max(deadline - time.monotonic(), 0.0))
+            ready, _, _ = select.select([stdout], [], [], remaining)
+            if not ready:
+                return None
+            output = os.read(stdout, 4096)
+            if not output:
+                return b''
+            self._buffer += output
+        line, self._buffer = self._buffer.split(b'\n', 1)
+        return line + b'\n'
+
     def blocking_read_measurement(self):
         """
-        Block until a measurement comes in.
+        Block until a measurement comes in, or until the meter is restarted.
         """
-        line_buffer = self.proc.stdout.readline()
+        line_buffer = self.readline(self.timeout)
+        if not line_buffer:
+            self.restart('stalled' if line_buffer is None else 'exited')
+            return
+
         timestamp = utcnow()
         measurement_text = line_buffer.decode("ascii").strip()
 
@@ -73,7 +157,34 @@ class WattsUpMonitor:
             logger.exception("Could not read measurement %r:",
                              measurement_text)
         else:
-            self.send_measurement(measurement, timestamp)
+            timestamp = utc_date.to_timestamp(timestamp)
+            if self.journal is not None:
+                self.journal.append(timestamp, measurement)
+            self.ring.publish(timestamp, measurement)
+
+    def restart(self, reason):
+        """
+        Restarts wattsup, which stalled or exited, and waits for it to be
+        ready again. Tells the client it is dead if it cannot be restarted,
+        and waits to be terminated.
+        """
+        logger.warning('The meter %s; restarting it', reason)
+        self.reply('stalled', reason)
+
+        for attempt in range(1, self.restarts + 1):
+            self.handle_control_message()
+            self.stop()
+            self.start()
+            if self.wait_for_ready(self.timeout):
+                logger.info('The meter is ready after %d restarts', attempt)
+                self.reply('ready')
+                return
+
+        self.stop()
+        self.reply('dead', reason)
+        while True:
+            self.conn.poll(None)
+            self.handle_control_message()
 
     def handle_control_message(self):
         """
@@ -84,30 +195,22 @@ class WattsUpMonitor:
             return
 
         message = self.conn.recv()
-        if message == 'send':
-            self.should_send = True
-        elif message == 'stop_send':
-            self.should_send = False
-        elif message == 'terminate':
+        if message == 'terminate':
             self.terminate()
         else:
             raise ValueError('Unknown control message: {}'.format(message))
 
-    def send_measurement(self, measurement, timestamp):
-        if self.should_send:
-            self.reply('data', (measurement, timestamp))
-
     def reply(self, message, payload=None):
         self.conn.send((message, payload))
 
     def terminate(self):
-        self.proc.terminate()
+        self.stop()
         self.reply('exit')
         self.conn.close()
         raise ExitSuccessfully()
 
 
-class WattsUp:
+class WattsUp(Meter):
     """
     High-level interface to the WattsUp?
 
@@ -118,10 +221,33 @@ class WattsUp:
             print("Got measurement:", measurement, timestamp)
             # Take as many measurements as necessary.
 
+    Measurements are read from the ring the monitor publishes to, at `ring`,
+    which holds the latest `capacity` samples. If `journal` is a directory,
+    every sample is also appended to a new journal in it, whose path is
+    `journal` afterwards.
+
+    The meter is restarted when it reports nothing for `timeout` seconds;
+    `on_stall` is either 'gap' or 'abort' (see the module).
     """
 
-    def __init__(self, executable=None, args=None):
+    # The Watts Up? reports once a second.
+    period = 1.0
+
+    def __init__(self, executable=None, args=None, journal=None,
+                 capacity=4096, timeout=10.0, on_stall='gap', restarts=3):
+        if on_stall not in ('gap', 'abort'):
+            raise ValueError('Unknown stall policy: {}'.format(on_stall))
+
         self._conn, child_conn = Pipe(duplex=True)
+        self.on_stall = on_stall
+        # Stalls of the meter while taking measurements.
+        self.stalls = 0
+
+        if journal is not None:
+            journal = Journal.session(journal)
+        self.journal = journal
+        self.ring = Publisher.session()
+        self._samples = None
 
         # Use the test program.
         if executable is None:
@@ -137,13 +263,17 @@ class WattsUp:
         proc = Process(name='WattsUp? Monitor',
                        target=WattsUpMonitor,
                        args=(child_conn,),
-                       kwargs={'executable': executable, 'args': args})
+                       kwargs={'executable': executable, 'args': args,
+                               'journal': journal, 'ring': self.ring,
+                               'capacity': capacity, 'timeout': timeout,
+                               'restarts': restarts})
         proc.start()
         assert proc.is_alive()
 
         self._proc = proc
         self._ready = False
         self._closed = False
+        self._dead = False
 
     def close(self):
         """
@@ -154,6 +284,8 @@ class WattsUp:
 
         self._conn.close()
         self._proc.join()
+        # Should the monitor not have removed it.
+        self.ring.remove_p()
         return self
 
     def _flush_until_exit(self, timeout=3):
@@ -168,12 +300,27 @@ class WattsUp:
         """
 
         self.wait_until_ready()
+        if self._samples is None:
+            raise RuntimeError('Take measurements within a with statement')
+
+        while True:
+            self._watch()
+            sample = self._samples.read(timeout=1.0)
+            if sample is not None:
+                break
+            if not self._proc.is_alive():
+                raise RuntimeError('The Watts Up? monitor has stopped')
 
-        status, payload = self._recv()
-        assert status == 'data'
+        timestamp, measurement = sample
+        return measurement, utc_date.from_timestamp(timestamp)
 
-        measurement, timestamp = payload
-        return measurement, timestamp
+    def subscribe(self, policy='oldest'):
+        """
+        Returns a new Subscription (see measurements.ring) to the samples
+        read from now on.
+        """
+        self.wait_until_ready()
+        return Subscription(self.ring, policy)
 
     def wait_until_ready(self):
         """
@@ -189,6 +336,26 @@ class WattsUp:
 
         return self
 
+    def _watch(self, taking_measurements=True):
+        """
+        Handles the monitor's reports of stalls and restarts.
+        """
+        while self._conn.poll():
+            status, reason = self._recv()
+            if status == 'stalled' and taking_measurements:
+                self.stalls += 1
+                if self.on_stall == 'abort':
+                    raise MeterStalled('The Watts Up? {}'.format(reason))
+                logger.warning('The Watts Up? %s; waiting for it to restart',
+                               reason)
+            elif status == 'ready' and taking_measurements:
+                logger.info('The Watts Up? restarted')
+            elif status == 'dead':
+                self._dead = True
+
+        if self._dead:
+            raise MeterStalled('The Watts Up? could not be restarted')
+
     @property
     def _conn(self):
         """
@@ -207,20 +374,18 @@ class WattsUp:
 
     def __enter__(self):
         self.wait_until_ready()
-
-        # Do as many dummy reads as needed to discard any data waiting from
-        # the last test.
-        # Concurrency bugs are the worst...
-        while self._conn.poll():
-            self._recv()
-
-        # Allow sending messages.
-        self._send('send')
+        # Stalls before now do not matter.
+        self._watch(taking_measurements=False)
+        # Measure from the next sample on.
+        self._samples = self.subscribe()
         return self
 
     def __exit__(self, *exception_info):
-        # Stop sending messages
-        self._send('stop_send')
+        if self._samples.dropped:
+            logger.warning('Dropped %d samples that were not read in time',
+                           self._samples.dropped)
+        self._samples.close()
+        self._samples = None
 
     def _send(self, message):
         return self._conn.send(message)
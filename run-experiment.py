@@ -15,7 +15,8 @@ from tqdm import trange
 from blessings import Terminal
 
 import experiments
-from measurements import Measurements, Experiment, WattsUp
+from measurements import Measurements, Experiment, WattsUp, RAPL
+from measurements.resources import ResourceSampler
 
 
 assert __name__ == '__main__'
@@ -45,6 +46,10 @@ parser.add_argument('configuration_name', metavar='CONFIGURATION',
 
 parser.add_argument('--fake-wattsup', action='store_true',
                     help='Use the fake wattsup instead.')
+parser.add_argument('--rapl', action='store_true',
+                    help='Estimate power from Intel RAPL counters instead.')
+parser.add_argument('--sample-resources', action='store_true',
+                    help='Also record CPU, memory, disk and network counters.')
 parser.add_argument('-r', '--repetitions', type=int, default=40,
                     help='Number of runs to perform (default: %(default)s)')
 parser.add_argument('-z', '--sleep-time', type=int, default=120,
@@ -68,13 +73,15 @@ config = measure.define_configuration(configuration_name,
 experiment = getattr(experiments, experiment_name)
 
 # Start the Watts Up?
-if fake_wattsup:
-    wattsup = WattsUp('./test/fake-wattsup.py', args=('--no-delay',))
+if rapl:
+    meter = RAPL()
+elif fake_wattsup:
+    meter = WattsUp('./test/fake-wattsup.py', args=('--no-delay',))
 else:
     # TODO: unhardcode path
     # Use our special forked version of wattsup:
     # https://github.com/eddieantonio/wattsup
-    wattsup = WattsUp(executable='/usr/local/src/wattsup/wattsup.py')
+    meter = WattsUp(executable='/usr/local/src/wattsup/wattsup.py')
 
 print(t.yellow("Waiting for the Watts Up? to start..."))
 #wattsup.wait_until_ready()
@@ -87,11 +94,12 @@ print("Running '{t.green}{experiment_name}{t.normal}' "
       .format(**vars()))
 
 # Run the experiment!
-with closing(wattsup):
+with closing(meter):
     measure.run(experiment,
                 configuration=config,
                 repetitions=repetitions,
                 sleep_time=sleep_time,
                 range=trange,
-                wattsup=wattsup,
-                write_back_energy=True)
+                meter=meter,
+                write_back_energy=True,
+                resources=ResourceSampler() if sample_resources else None)
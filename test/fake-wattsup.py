@@ -25,6 +25,9 @@ parser.add_argument('-p', '--period', type=float, default=1.0)
 
 parser.add_argument('-D', '--no-delay', dest='delay', action='store_false')
 
+# Hang, as a wedged meter does, after printing so many lines.
+parser.add_argument('-S', '--stall-after', type=int, default=None)
+
 parser.add_argument('-m', '--min-delay', type=int, default=2)
 parser.add_argument('-M', '--max-delay', type=int, default=10)
 
@@ -42,7 +45,11 @@ try:
     if delay:
         sleep(random.randint(min_delay, max_delay))
 
+    printed = 0
     while True:
+        if stall_after is not None and printed >= stall_after:
+            sleep(3600)
+        printed += 1
         if not missing_rate or random.uniform(0.0, 1.0) > missing_rate:
             print("{:.1f}".format(random.gauss(mean, std_dev)))
             sys.stdout.flush()
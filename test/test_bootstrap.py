@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests bootstrapping differences in energy.
+"""
+
+import random
+import sqlite3
+
+import pytest
+
+from measurements import Measurements
+from measurements import bootstrap as module
+from measurements.bootstrap import bootstrap_difference, bootstrap_comparisons
+
+
+def test_bootstrap_difference():
+    rng = random.Random(2)
+    sample = [rng.gauss(110, 5) for _ in range(30)]
+    baseline = [rng.gauss(100, 5) for _ in range(30)]
+
+    result = bootstrap_difference(sample, baseline, resamples=5000, seed=42)
+    assert result.lower < result.difference < result.upper
+    assert 5 < result.lower and result.upper < 15
+    assert result.percent_lower < result.percent < result.percent_upper
+
+    # Reproducible, and independent of the number of processes.
+    assert bootstrap_difference(sample, baseline, resamples=5000,
+                                seed=42) == result
+    assert (bootstrap_difference(sample, baseline, 'median', resamples=25000,
+                                 seed=1, processes=2) ==
+            bootstrap_difference(sample, baseline, 'median', resamples=25000,
+                                 seed=1, processes=1))
+
+    with pytest.raises(ValueError):
+        bootstrap_difference(sample, baseline, 'mode')
+
+
+def test_bootstrap_cache(monkeypatch):
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    measure.define_experiment('idle')
+    measure.define_configuration('native')
+    measure.define_configuration('docker')
+    conn.execute(r'''
+        CREATE TABLE test_energy(id, configuration, experiment, energy)
+    ''')
+    runs = [(n, configuration, 'idle', 100.0 + n)
+            for n, configuration in enumerate(['native', 'docker'] * 5)]
+    conn.executemany('INSERT INTO test_energy VALUES (?, ?, ?, ?)', runs)
+
+    computed = []
+    original = module.bootstrap_difference
+
+    def counting(*args):
+        computed.append(args)
+        return original(*args)
+    monkeypatch.setattr(module, 'bootstrap_difference', counting)
+
+    def compare():
+        return bootstrap_comparisons(conn, 'native', resamples=100,
+                                     table='test_energy')
+
+    (experiment, configuration, result), = compare()
+    assert (experiment, configuration) == ('idle', 'docker')
+    assert compare() == [('idle', 'docker', result)]
+    assert len(computed) == 1
+
+    # A new run invalidates the cache.
+    conn.execute("INSERT INTO test_energy VALUES (99, 'docker', 'idle', 90)")
+    compare()
+    assert len(computed) == 2
+    assert conn.execute('SELECT COUNT(*) FROM bootstrap').fetchone() == (1,)
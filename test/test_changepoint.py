@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests splitting power traces at change points.
+"""
+
+import random
+import sqlite3
+from datetime import timedelta
+from math import isclose
+
+from measurements import Measurements, utc_date
+from measurements.changepoint import change_points, segment_runs
+
+
+def trace(levels, seed=0):
+    """
+    Returns a noisy trace of (watts, length) levels.
+    """
+    rng = random.Random(seed)
+    return [round(rng.gauss(watts, 1.0), 1)
+            for watts, length in levels for _ in range(length)]
+
+
+def test_change_points():
+    points = change_points(trace([(60, 30), (90, 200), (65, 40)]))
+    assert len(points) == 2
+    assert abs(points[0] - 30) <= 2 and abs(points[1] - 230) <= 2
+
+    # Noise alone is not a change.
+    assert change_points(trace([(60, 300)])) == []
+    assert change_points([50.0] * 100) == []
+
+
+def test_segment_runs():
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    config = measure.define_configuration('native')
+    experiment = measure.define_experiment('redis')
+
+    start = utc_date.now()
+    for seed in range(3, 6):
+        with measure.run_test(config, experiment) as log:
+            for second, watts in enumerate(trace([(60, 20), (95, 100),
+                                                  (70, 30)], seed)):
+                # Drop a sample; it should be interpolated.
+                if second != 50:
+                    log.add_measurement(watts, start + timedelta(seconds=second))
+
+    assert segment_runs(conn, processes=2) == 3
+    # Already segmented.
+    assert segment_runs(conn) == 0
+
+    labels = conn.execute(r'''
+        SELECT label, SUM(samples), AVG(power_mean)
+          FROM segment
+      GROUP BY label
+      ORDER BY MIN(number)
+    ''').fetchall()
+    assert [label for label, *_ in labels] == ['warmup', 'steady', 'tail']
+    assert [samples for _, samples, _ in labels] == [60, 300, 90]
+    assert abs(labels[1][2] - 95) < 1
+
+
+def test_segment_energy():
+    """
+    Tests that the energy of the segments adds up to the energy of the run.
+    """
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    config = measure.define_configuration('native')
+    experiment = measure.define_experiment('redis')
+
+    start = utc_date.now()
+    with measure.run_test(config, experiment) as log:
+        for second, watts in enumerate(trace([(60, 20), (95, 100)])):
+            if second % 17:
+                log.add_measurement(watts, start + timedelta(seconds=second))
+
+    segment_runs(conn)
+    (_, _, _, energy, *_), = measure.energy()
+    total, = conn.execute('SELECT SUM(energy) FROM segment').fetchone()
+    assert isclose(total, energy)
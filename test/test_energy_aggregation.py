@@ -5,7 +5,15 @@
 Tests that the energy aggregation works properly.
 """
 
-from measurements.energy_aggregation import EnergyAggregation
+import json
+import sqlite3
+import statistics
+from math import ceil, fsum, isclose
+
+from measurements.energy_aggregation import (
+    EnergyAggregation, StreamingEnergyAggregation, EnergySummary,
+    Measurement, energy_by_phase, sampling_period
+)
 
 from helpers import N, fabricate_data
 
@@ -75,3 +83,142 @@ def test_energy_missing_samples():
     assert value in N(μ=estimated_avg_energy, σ=estimated_sd), (
         "Estimated energy value unlikely to be from the true distribution"
     )
+
+
+def test_energy_by_phase():
+    """
+    Tests that energy is apportioned to each phase of a run.
+    """
+
+    start = 1467665307981.0
+    samples = [Measurement(watts, start + 1000 * second)
+               for second, watts in enumerate([10.0] * 5 + [20.0] * 5)]
+    # Drop a sample in the "steady" phase; it should be interpolated.
+    del samples[7]
+
+    phases = [('steady', start + 5000), ('warmup', start + 1000)]
+    result = energy_by_phase(samples, phases)
+
+    assert [phase.phase for phase in result] == [None, 'warmup', 'steady']
+    assert [phase.energy for phase in result] == [10.0, 40.0, 100.0]
+    assert result[1].started == start + 1000
+    assert result[1].ended == start + 4000
+    assert result[2].started == start + 5000
+    assert result[2].ended == start + 9000
+
+
+def test_streaming_energy():
+    """
+    Tests that streaming ordered samples gives the same energy as buffering
+    them.
+    """
+
+    samples = fabricate_data(N(μ=48.1, σ=.2), duration=600,
+                             percent_missing=4.0)
+
+    buffered = EnergyAggregation()
+    streaming = StreamingEnergyAggregation()
+    for sample in samples:
+        buffered.step(*sample)
+        streaming.step(*sample)
+
+    assert isclose(streaming.finalize(), buffered.finalize())
+
+
+def test_streaming_energy_out_of_order():
+    """
+    Tests that out-of-order samples are refused, and that the energy query
+    falls back to buffering them.
+    """
+
+    samples = fabricate_data(N(μ=48.1, σ=.2), duration=60)
+    streaming = StreamingEnergyAggregation()
+    for sample in reversed(samples):
+        streaming.step(*sample)
+    assert streaming.finalize() is None
+
+    conn = sqlite3.connect(':memory:')
+    EnergyAggregation.install(conn)
+    StreamingEnergyAggregation.install(conn)
+    conn.execute('CREATE TABLE measurement(power, timestamp)')
+    conn.executemany('INSERT INTO measurement VALUES (?, ?)', samples)
+    value, = conn.execute(r'''
+        SELECT COALESCE(energy_stream(power, timestamp),
+                        (SELECT energy(power, timestamp) FROM measurement))
+          FROM (SELECT * FROM measurement ORDER BY timestamp DESC)
+    ''').fetchone()
+    assert isclose(value, fsum(watts for watts, _ in samples))
+
+
+def test_energy_summary():
+    """
+    Tests that every statistic of the summary agrees with computing it over
+    the buffered samples.
+    """
+
+    samples = fabricate_data(N(μ=48.1, σ=2.0), duration=600,
+                             percent_missing=4.0)
+
+    buffered = EnergyAggregation()
+    summary = EnergySummary()
+    for sample in samples:
+        buffered.step(*sample)
+        summary.step(*sample)
+    result = json.loads(summary.finalize())
+
+    watts = sorted(sample[0] for sample in samples)
+    assert isclose(result['energy'], buffered.finalize())
+    assert result['samples'] == len(samples)
+    assert result['interpolated'] == len(buffered.measurements) - len(samples)
+    assert 0 < result['gaps'] <= result['interpolated']
+    assert result['started'] == min(sample[1] for sample in samples)
+    assert result['ended'] == max(sample[1] for sample in samples)
+    assert isclose(result['power_mean'], statistics.mean(watts))
+    assert isclose(result['power_variance'], statistics.variance(watts))
+    assert (result['power_min'], result['power_max']) == (watts[0], watts[-1])
+    for percent in (50, 95, 99):
+        exact = watts[ceil(percent / 100 * len(watts)) - 1]
+        assert abs(result['power_p{}'.format(percent)] - exact) <= 0.05 + 1e-9
+
+
+def test_energy_period():
+    """
+    Tests that samples taken at 100 Hz each stand for a hundredth of a
+    second, and that gaps are filled with samples 10 ms apart.
+    """
+
+    # Ten seconds at 100 Hz, with 20 samples (0.2 s) missing.
+    samples = [(100.0, 10.0 * i) for i in range(1000) if not 500 <= i < 520]
+
+    buffered = EnergyAggregation()
+    streaming = StreamingEnergyAggregation()
+    summary = EnergySummary()
+    for sample in samples:
+        buffered.step(*sample, 10.0)
+        streaming.step(*sample, 10.0)
+        summary.step(*sample, 10.0)
+    result = json.loads(summary.finalize())
+
+    assert isclose(buffered.finalize(), 1000.0)
+    assert isclose(streaming.finalize(), 1000.0)
+    assert isclose(result['energy'], 1000.0)
+    assert (result['gaps'], result['interpolated']) == (1, 20)
+
+    conn = sqlite3.connect(':memory:')
+    EnergyAggregation.install(conn)
+    value, = conn.execute(r'''
+        SELECT energy(power, timestamp, 10.0)
+          FROM (SELECT 100.0 as power, 0.0 as timestamp
+                UNION ALL SELECT 100.0, 10.0)
+    ''').fetchone()
+    assert isclose(value, 2.0)
+
+
+def test_sampling_period():
+    assert sampling_period([]) is None
+    assert sampling_period([5.0, 5.0]) is None
+    # Jitter snaps to a whole number of samples per second...
+    assert sampling_period([0, 998, 2003, 2999, 4001]) == 1000.0
+    assert sampling_period([0, 10.2, 19.9, 30.1, 40.0]) == 10.0
+    # ...or of seconds per sample, with the occasional gap ignored.
+    assert sampling_period([0, 2000, 4010, 8000, 10000]) == 2000.0
@@ -13,7 +13,9 @@ import logging
 import pytest
 from path import Path
 
-from measurements import Experiment, Measurements, WattsUp
+from measurements import (
+    Experiment, Measurements, WattsUp, phase, report_output
+)
 
 here = Path(__file__).dirname()
 
@@ -73,6 +75,18 @@ def test_before_each():
     assert mutable[1] is sentinel_main
 
 
+def test_phase_outside_of_measurements():
+    """
+    Marking a phase when not run by Measurements does nothing.
+    """
+    @Experiment
+    def test_experiment():
+        phase('warmup')
+        return 'done'
+
+    assert test_experiment.run() == 'done'
+
+
 def test_run_measurements():
     """
     Tests that measurements knows how to run an experiment in a different
@@ -161,3 +175,98 @@ def test_run_measurements():
     assert result['count'] == repetitions, (
         'Did not persist expected number of runs'
     )
+
+
+def test_run_with_phases():
+    """
+    Tests that phase markers emitted within the experiment's process are
+    recorded with the run.
+    """
+
+    @Experiment
+    def test_experiment():
+        "Has phases"
+        phase('warmup')
+        phase('steady')
+        phase('teardown')
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    config_name = measure.define_configuration('native')
+
+    fake_wattsup = WattsUp(here/'fake-wattsup.py',
+                           args=('--no-delay',
+                                 '--period', '0'))
+    measure.run(test_experiment,
+                configuration=config_name,
+                repetitions=2,
+                wattsup=fake_wattsup)
+    fake_wattsup.close()
+
+    result = conn.execute(r'''
+        SELECT run, name FROM phase ORDER BY run, timestamp, rowid
+    ''').fetchall()
+    assert len(result) == 6
+    assert len(set(run for run, _ in result)) == 2
+    assert [name for _, name in result] == ['warmup', 'steady', 'teardown'] * 2
+
+
+def test_run_with_workload():
+    """
+    Tests that workload counters returned by the experiment are recorded
+    with the run.
+    """
+
+    @Experiment
+    def test_experiment():
+        "Has a workload"
+        return {'operations': 1500, 'transactions': 10}
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    config_name = measure.define_configuration('native')
+
+    fake_wattsup = WattsUp(here/'fake-wattsup.py',
+                           args=('--no-delay',
+                                 '--period', '0'))
+    measure.run(test_experiment,
+                configuration=config_name,
+                wattsup=fake_wattsup)
+    fake_wattsup.close()
+
+    result = conn.execute(r'''
+        SELECT operations, bytes, transactions FROM workload
+    ''').fetchall()
+    assert result == [(1500, None, 10)]
+
+
+def test_run_with_benchmark_output():
+    """
+    Tests that benchmark output reported by the experiment is parsed and
+    recorded with the run.
+    """
+
+    with open(str(here/'outputs'/'pgbench.txt')) as output:
+        pgbench_output = output.read()
+
+    @Experiment
+    def test_experiment():
+        "Runs a benchmark"
+        report_output('pgbench', pgbench_output)
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    config_name = measure.define_configuration('native')
+
+    fake_wattsup = WattsUp(here/'fake-wattsup.py',
+                           args=('--no-delay',
+                                 '--period', '0'))
+    measure.run(test_experiment,
+                configuration=config_name,
+                wattsup=fake_wattsup)
+    fake_wattsup.close()
+
+    result = conn.execute(r'''
+        SELECT tool, requests, requests_per_second FROM throughput
+    ''').fetchall()
+    assert result == [('pgbench', 50000, 1247.654321)]
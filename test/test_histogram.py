@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests precomputing histograms of power over time.
+"""
+
+import sqlite3
+from datetime import timedelta
+
+import numpy as np
+
+from measurements import Measurements, utc_date
+from measurements.histogram import write_power_histograms
+from measurements.__main__ import parse_args, histogram
+
+from helpers import N
+
+
+def record(measure, experiment, configuration, distribution, duration):
+    # Redefining a configuration would replace it, and delete its runs.
+    if not measure._experiment_exists(experiment):
+        measure.define_experiment(experiment)
+    if not measure._configuration_exists(configuration):
+        measure.define_configuration(configuration)
+    start = utc_date.now()
+    with measure.run_test(configuration, experiment) as log:
+        for second in range(duration):
+            log.add_measurement(distribution.sample(),
+                                start + timedelta(seconds=second))
+
+
+def test_power_histograms():
+    """
+    Tests that the histograms of every pair match numpy.histogram2d() over
+    the bins of their experiment.
+    """
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    record(measure, 'idle', 'native', N(μ=40, σ=1), 60)
+    record(measure, 'idle', 'docker', N(μ=42, σ=1), 50)
+    record(measure, 'redis', 'native', N(μ=80, σ=5), 30)
+
+    histograms = write_power_histograms(conn, bins=10)
+    assert conn.execute(r'''
+        SELECT COUNT(*), SUM(count) FROM power_histogram
+    ''').fetchone() == (len(histograms), 140)
+
+    rows = conn.execute(r'''
+        SELECT experiment, configuration, power,
+               (timestamp - first_timestamp) / 1000.0
+          FROM measurement JOIN run ON measurement.run = run.id
+    ''').fetchall()
+    for experiment in ('idle', 'redis'):
+        samples = [row for row in rows if row[0] == experiment]
+        power = [row[2] for row in samples]
+        elapsed = [row[3] for row in samples]
+        edges = (np.linspace(min(elapsed), max(elapsed), 11),
+                 np.linspace(min(power), max(power), 11))
+
+        for configuration in set(row[1] for row in samples):
+            expected, _, _ = np.histogram2d(
+                [row[3] for row in samples if row[1] == configuration],
+                [row[2] for row in samples if row[1] == configuration],
+                bins=edges
+            )
+            actual = np.zeros((10, 10))
+            for (e, c, time_bin, power_bin, *_, count) in histograms:
+                if (e, c) == (experiment, configuration):
+                    actual[time_bin, power_bin] = count
+            assert (actual == expected).all()
+
+
+def test_histogram_command(tmpdir):
+    database = str(tmpdir/'energy.sqlite')
+    record(Measurements(database), 'idle', 'native', N(μ=40, σ=1), 10)
+
+    args = dict(parse_args(['histogram', '--bins', '5', database])
+                ._get_kwargs())
+    assert args.pop('command') is histogram
+    assert histogram(**args) == 0
+
+    conn = sqlite3.connect(database)
+    count, = conn.execute('SELECT SUM(count) FROM power_histogram').fetchone()
+    assert count == 10
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests importing raw wattsup logs.
+"""
+
+import sqlite3
+
+import pytest
+
+from measurements import Measurements
+from measurements.importer import (
+    assign_runs, import_logs, parse_log, parse_time
+)
+
+
+def test_parse_time():
+    assert parse_time('1488369600.5') == 1488369600500.0
+    assert parse_time('2017-03-01T12:00:00.5Z') == 1488369600500.0
+    assert parse_time('2017-03-01T12:00:00.5') == 1488369600500.0
+    assert parse_time('2017-03-01T05:00:00.5-07:00') == 1488369600500.0
+    with pytest.raises(ValueError):
+        parse_time('noon')
+
+
+def test_parse_log(tmpdir):
+    log = tmpdir/'timed.log'
+    log.write('\n'.join([
+        '# run native idle',
+        '1488369600.0 50.1',
+        '2017-03-01T12:00:01Z 50.2',
+        'garbage',
+        '# end',
+        '1488369602.0 60.0',
+        '# run docker idle',
+        '1488369603.0 51.0',
+        '',
+    ]))
+    parsed = parse_log(str(log))
+    assert parsed.samples == [(50.1, 1488369600000.0),
+                              (50.2, 1488369601000.0),
+                              (60.0, 1488369602000.0),
+                              (51.0, 1488369603000.0)]
+    assert parsed.markers == [(0, 'native', 'idle'), (2, None, None),
+                              (3, 'docker', 'idle')]
+    assert parsed.rejected == 1
+
+    # The sample between the end marker and the next run is dropped.
+    assert assign_runs(parsed) == [
+        ('native', 'idle', parsed.samples[:2]),
+        ('docker', 'idle', parsed.samples[3:]),
+    ]
+    assert assign_runs(parsed, [('native', 'redis',
+                                 1488369601000.0, 1488369602000.0)]) == [
+        ('native', 'redis', parsed.samples[1:3]),
+    ]
+
+    untimed = tmpdir/'untimed.log'
+    untimed.write('40.0\n41.0\n42.0\n')
+    parsed = parse_log(str(untimed), started=1000.0, period=500.0)
+    assert parsed.samples == [(40.0, 1000.0), (41.0, 1500.0), (42.0, 2000.0)]
+    with pytest.raises(ValueError):
+        assign_runs(parsed)
+    # Untimed lines need a start time.
+    assert parse_log(str(untimed)).rejected == 3
+
+
+def test_import_logs(tmpdir):
+    paths = []
+    for number, watts in enumerate((50.0, 60.0)):
+        log = tmpdir/'{}.log'.format(number)
+        log.write('{:.1f}\n'.format(watts) * 100)
+        paths.append(str(log))
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    ids = import_logs(conn, paths, 'native', 'idle', started=1e12,
+                      processes=2)
+
+    assert len(ids) == 2
+    assert conn.execute(r'''
+        SELECT sample_count, duration, period FROM run ORDER BY id
+    ''').fetchall() == [(100, 99000.0, 1000.0)] * 2
+    energy = sorted(row[3] for row in measure.energy())
+    assert energy == [5000.0, 6000.0]
+    assert conn.execute(r'''
+        SELECT COUNT(DISTINCT run) FROM power_rollup
+    ''').fetchone() == (2,)
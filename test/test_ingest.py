@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests recording runs of many producers through a single writer.
+"""
+
+import sqlite3
+import threading
+
+import pytest
+
+from measurements import Measurements
+from measurements.ingest import IngestQueue
+
+
+def test_producers(tmpdir):
+    database = str(tmpdir/'energy.sqlite')
+    Measurements(database).conn.close()
+    ids = {}
+
+    def produce(producer):
+        with ingest.run_test('native', 'idle', period=1000.0) as log:
+            log.add_phase('warmup', 1e12)
+            for batch in range(10):
+                log.add_samples([(producer + 40.0, 1e12 + 1000.0 * second)
+                                 for second in range(batch * 10,
+                                                     batch * 10 + 10)])
+            log.add_workload(operations=100 * producer)
+        ids[producer] = log.id
+
+    with IngestQueue(database, group_size=8) as ingest:
+        ingest.define_configuration('native')
+        ingest.define_experiment('idle')
+        producers = [threading.Thread(target=produce, args=(producer,))
+                     for producer in range(1, 9)]
+        for producer in producers:
+            producer.start()
+        for producer in producers:
+            producer.join()
+
+        # Runs are committed when their producer leaves their context.
+        conn = sqlite3.connect(database)
+        assert conn.execute(r'''
+            SELECT COUNT(*) FROM run WHERE sample_count = 100
+        ''').fetchone() == (8,)
+
+    assert not conn.execute('SELECT * FROM staged_run').fetchall()
+    for producer, run in ids.items():
+        assert conn.execute(r'''
+            SELECT COUNT(*), AVG(power), MIN(timestamp)
+              FROM measurement WHERE run = ?
+        ''', (run,)).fetchone() == (100, producer + 40.0, 1e12)
+        assert conn.execute(r'''
+            SELECT operations FROM workload WHERE run = ?
+        ''', (run,)).fetchone() == (100 * producer,)
+
+
+def test_failed_runs(tmpdir):
+    database = str(tmpdir/'energy.sqlite')
+    Measurements(database).conn.close()
+
+    with IngestQueue(database) as ingest:
+        ingest.define_configuration('native')
+        ingest.define_experiment('idle')
+
+        with pytest.raises(ValueError):
+            with ingest.run_test('native', 'idle') as log:
+                log.add_samples([(40.0, 1e12)])
+                raise ValueError('The experiment failed')
+
+        # The writer cannot record runs of unknown configurations.
+        with pytest.raises(RuntimeError):
+            with ingest.run_test('unknown', 'idle') as log:
+                log += 40.0
+
+        with ingest.run_test('native', 'idle') as log:
+            log += 40.0
+
+    with pytest.raises(RuntimeError):
+        ingest.run_test('native', 'idle').__enter__()
+
+    conn = sqlite3.connect(database)
+    assert conn.execute(r'''
+        SELECT id, sample_count FROM run
+    ''').fetchall() == [(log.id, 1)]
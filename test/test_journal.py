@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests the capture journal of the Watts Up? monitor.
+"""
+
+import sqlite3
+
+import pytest
+from path import Path
+
+from measurements import Measurements, WattsUp
+from measurements.journal import Journal, read_journal
+
+here = Path(__file__).dirname()
+
+
+def test_journal(tmpdir):
+    path = Journal.session(str(tmpdir))
+    samples = [(1000.0 * second, 40.0 + second % 3) for second in range(10)]
+
+    # Grows twice.
+    with Journal(path, capacity=4) as journal:
+        for timestamp, watts in samples[:5]:
+            journal.append(timestamp + 1, watts)
+        # Readable while it is being appended to.
+        assert [t for t, _ in read_journal(path)] == [1, 1001, 2001, 3001,
+                                                      4001]
+        for timestamp, watts in samples[5:]:
+            journal.append(timestamp + 1, watts)
+    assert list(read_journal(path)) == [(t + 1, w) for t, w in samples]
+
+    with pytest.raises(FileExistsError):
+        Journal(path)
+
+    not_a_journal = tmpdir/'not.journal'
+    not_a_journal.write('0.0\n')
+    with pytest.raises(ValueError):
+        list(read_journal(str(not_a_journal)))
+
+
+def test_import_journal(tmpdir):
+    path = Journal.session(str(tmpdir))
+    with Journal(path) as journal:
+        for second in range(20):
+            journal.append(1e12 + 1000 * second, 50.0)
+
+    measure = Measurements(sqlite3.connect(':memory:'))
+    config = measure.define_configuration('native')
+    experiment = measure.define_experiment('idle')
+    run = measure.import_journal(path, config, experiment,
+                                 started=1e12 + 5000, ended=1e12 + 14000)
+
+    assert measure.conn.execute(r'''
+        SELECT sample_count, first_timestamp, last_timestamp, period
+          FROM run WHERE id = ?
+    ''', (run,)).fetchone() == (10, 1e12 + 5000, 1e12 + 14000, 1000.0)
+    (_, _, _, energy, *_), = measure.energy()
+    assert energy == 500.0
+
+
+def test_wattsup_journal(tmpdir):
+    """
+    Tests that the monitor journals samples even when the client is not
+    taking measurements.
+    """
+    meter = WattsUp(here/'fake-wattsup.py',
+                    args=('--no-delay', '--period', '0', '--missing-rate', '0'),
+                    journal=str(tmpdir))
+    with meter:
+        for _ in range(3):
+            meter.next_measurement()
+    meter.close()
+
+    assert meter.journal.startswith(str(tmpdir))
+    assert len(list(read_journal(meter.journal))) >= 3
@@ -12,6 +12,7 @@ from datetime import timedelta
 import pytest
 
 from measurements import Measurements, utc_date
+from measurements.energy_aggregation import EnergyAggregation
 
 
 def test_run_test():
@@ -98,6 +99,328 @@ def test_run_test():
     assert result['count'] == 1, "Must have exactly one test run"
 
 
+def test_phase_energy():
+    """
+    Tests that phase markers are stored with the run, and that energy is
+    computed for each phase.
+    """
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+
+    config = measure.define_configuration('test_config')
+    experiment = measure.define_experiment('test_experiment')
+
+    start = utc_date.now()
+    with measure.run_test(config, experiment) as log:
+        log.add_phase('warmup', utc_date.to_timestamp(start))
+        log.add_measurement(60.0, start + Δ(0))
+        log.add_measurement(60.0, start + Δ(1))
+        log.add_phase('steady', utc_date.to_timestamp(start + Δ(2)))
+        log.add_measurement(90.0, start + Δ(2))
+        log.add_measurement(90.0, start + Δ(3))
+        log.add_measurement(90.0, start + Δ(4))
+
+    result = measure.phase_energy()
+    assert [(run, phase, energy) for run, phase, energy, _, _ in result] == [
+        (log.id, 'warmup', 120.0),
+        (log.id, 'steady', 270.0),
+    ]
+
+
+def test_workload():
+    """
+    Tests that energy is normalized by the workload reported by the run.
+    """
+
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    measure = Measurements(conn)
+
+    config = measure.define_configuration('test_config')
+    experiment = measure.define_experiment('test_experiment')
+
+    start = utc_date.now()
+    with measure.run_test(config, experiment) as log:
+        for second in range(4):
+            log.add_measurement(100.0, start + Δ(second))
+        # Counters are cumulative.
+        log.add_workload(operations=100, bytes=2048)
+        log.add_workload(operations=300)
+
+    log.write_back_energy()
+
+    result = conn.execute(r'''
+        SELECT joules_per_operation, operations_per_watt FROM energy
+    ''').fetchone()
+    assert isclose(result['joules_per_operation'], 1.0)
+    assert isclose(result['operations_per_watt'], 1.0)
+
+    result = conn.execute(r'''
+        SELECT samples, gaps, power_mean, power_p99 FROM energy
+    ''').fetchone()
+    assert tuple(result) == (4, 0, 100.0, 100.0)
+
+    result = conn.execute(r'''
+        SELECT operations, bytes, transactions FROM workload
+    ''').fetchone()
+    assert tuple(result) == (400, 2048, None)
+
+
+def test_upgrade_schema(tmpdir):
+    """
+    Tests that nullable columns are added to tables created by older
+    versions, and that constrained columns are refused.
+    """
+
+    conn = sqlite3.connect(':memory:')
+    conn.execute(r'''
+        CREATE TABLE energy(id INT, configuration TEXT, experiment TEXT,
+                            energy, started, ended, elapsed_time)
+    ''')
+    measure = Measurements(conn)
+
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(energy)')]
+    assert 'joules_per_operation' in columns
+
+    schema = tmpdir/'schema.sql'
+    schema.write('CREATE TABLE IF NOT EXISTS energy(id, label TEXT NOT NULL);')
+    with pytest.raises(RuntimeError):
+        measure._upgrade_schema(str(schema))
+
+
+def test_run_metadata():
+    """
+    Tests that the time span and sample count of a run are kept on its row,
+    and backfilled for runs recorded by older versions.
+    """
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+
+    config = measure.define_configuration('test_config')
+    experiment = measure.define_experiment('test_experiment')
+
+    start = utc_date.now()
+    with measure.run_test(config, experiment) as log:
+        for second in (2, 0, 1):
+            log.add_measurement(100.0, start + Δ(second))
+
+    query = r'''
+        SELECT sample_count, first_timestamp, last_timestamp,
+               duration = ended_at - started_at
+          FROM run
+    '''
+    expected = (3, utc_date.to_timestamp(start),
+                utc_date.to_timestamp(start + Δ(2)), 1)
+    assert conn.execute(query).fetchone() == expected
+
+    conn.execute(r'''
+        UPDATE run SET started_at = NULL, ended_at = NULL, duration = NULL,
+                       sample_count = NULL, first_timestamp = NULL,
+                       last_timestamp = NULL
+    ''')
+    Measurements(conn)
+    assert conn.execute(query).fetchone() == expected
+    duration, = conn.execute('SELECT duration FROM run').fetchone()
+    assert duration == 2000
+
+
+def test_sampling_period():
+    """
+    Tests that the sampling period of a run is declared or detected, and that
+    energy is integrated over it.
+    """
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+
+    config = measure.define_configuration('test_config')
+    experiment = measure.define_experiment('test_experiment')
+
+    # Ten seconds at 100 Hz, added in batches of one second.
+    start = utc_date.now()
+    with measure.run_test(config, experiment) as detected:
+        for second in range(10):
+            detected.add_measurements(
+                (100.0, start + timedelta(milliseconds=1000 * second + 10 * i))
+                for i in range(100)
+            )
+    with measure.run_test(config, experiment, period=500.0) as declared:
+        for second in range(10):
+            declared.add_measurement(50.0, start + Δ(second))
+
+    periods = dict(conn.execute('SELECT id, period FROM run'))
+    assert periods == {detected.id: 10.0, declared.id: 500.0}
+
+    energy = {row[0]: row[3] for row in measure.energy()}
+    assert isclose(energy[detected.id], 1000.0)
+    # Every other sample is missing, and interpolated: 19 half seconds.
+    assert isclose(energy[declared.id], 475.0)
+
+    # Periods are detected for runs recorded by older versions.
+    conn.execute('UPDATE run SET period = NULL')
+    Measurements(conn)
+    assert dict(conn.execute('SELECT id, period FROM run')) == {
+        detected.id: 10.0, declared.id: 1000.0
+    }
+
+
+def test_checkpoint(tmpdir):
+    """
+    Tests that runs recorded with checkpoints are committed as they are
+    recorded, completed when they end, and deleted when they fail.
+    """
+
+    database = str(tmpdir/'test.sqlite')
+    measure = Measurements(sqlite3.connect(database))
+    config = measure.define_configuration('test_config')
+    experiment = measure.define_experiment('test_experiment')
+    observer = sqlite3.connect(database)
+
+    start = utc_date.now()
+    with measure.run_test(config, experiment, checkpoint=2) as log:
+        for second in range(5):
+            log.add_measurement(100.0, start + Δ(second))
+        # Only the samples up to the last checkpoint are visible.
+        assert observer.execute(r'''
+            SELECT COUNT(*) FROM staged_measurement
+        ''').fetchone() == (4,)
+        log.add_phase('done', utc_date.to_timestamp(start + Δ(4)))
+
+    assert observer.execute(r'''
+        SELECT (SELECT COUNT(*) FROM measurement),
+               (SELECT COUNT(*) FROM staged_measurement),
+               (SELECT COUNT(*) FROM staged_run),
+               (SELECT COUNT(*) FROM phase),
+               sample_count
+          FROM run
+    ''').fetchone() == (5, 0, 0, 1, 5)
+    (_, _, _, energy, *_), = measure.energy()
+    assert energy == 500.0
+
+    with pytest.raises(RuntimeError):
+        with measure.run_test(config, experiment, checkpoint=2) as failed:
+            for second in range(3):
+                failed.add_measurement(100.0, start + Δ(second))
+            raise RuntimeError('The experiment failed')
+    assert observer.execute(r'''
+        SELECT COUNT(*) FROM run WHERE id = ?
+    ''', (failed.id,)).fetchone() == (0,)
+    assert measure.incomplete_runs() == []
+
+
+def test_recover_run(tmpdir):
+    """
+    Tests that runs left incomplete by a crash are recovered from their last
+    checkpoint, or discarded.
+    """
+
+    database = str(tmpdir/'test.sqlite')
+    measure = Measurements(sqlite3.connect(database))
+    config = measure.define_configuration('test_config')
+    experiment = measure.define_experiment('test_experiment')
+
+    start = utc_date.now()
+    crashed = []
+    for _ in range(2):
+        # Never exits, as if the harness crashed.
+        log = measure.run_test(config, experiment, checkpoint=2).__enter__()
+        for second in range(3):
+            log.add_measurement(100.0, start + Δ(second))
+        measure.conn.rollback()
+        crashed.append(log.id)
+
+    measure = Measurements(sqlite3.connect(database))
+    assert [(run, samples) for run, *_, samples
+            in measure.incomplete_runs()] == [(run, 2) for run in crashed]
+
+    measure.recover_run(crashed[0])
+    measure.recover_run(crashed[1], discard=True)
+    with pytest.raises(ValueError):
+        measure.recover_run(crashed[0])
+
+    assert measure.incomplete_runs() == []
+    assert measure.conn.execute(r'''
+        SELECT id, sample_count, duration IS NOT NULL, period FROM run
+    ''').fetchall() == [(crashed[0], 2, 1, 1000.0)]
+    (run, _, _, energy, *_), = measure.energy()
+    assert (run, energy) == (crashed[0], 200.0)
+
+
+def test_power_rollup():
+    """
+    Tests that the power of a run is rolled up into buckets as it is
+    recorded, and that older runs are rolled up on demand.
+    """
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+
+    config = measure.define_configuration('test_config')
+    experiment = measure.define_experiment('test_experiment')
+
+    start = utc_date.now()
+    with measure.run_test(config, experiment) as log:
+        for second in range(25):
+            log.add_measurement(float(second), start + Δ(second))
+
+    query = r'''
+        SELECT bucket, samples, power_mean, power_min, power_max
+          FROM power_rollup
+         WHERE width = ?
+      ORDER BY bucket
+    '''
+    assert conn.execute(query, (10,)).fetchall() == [
+        (0, 10, 4.5, 0.0, 9.0),
+        (1, 10, 14.5, 10.0, 19.0),
+        (2, 5, 22.0, 20.0, 24.0),
+    ]
+    assert len(conn.execute(query, (1,)).fetchall()) == 25
+    assert conn.execute(query, (60,)).fetchall() == [(0, 25, 12.0, 0.0, 24.0)]
+
+    conn.execute('DELETE FROM power_rollup')
+    measure.rollup()
+    assert len(conn.execute(query, (10,)).fetchall()) == 3
+
+
+def test_energy_between():
+    """
+    Tests that the energy over a window of a run matches the energy
+    aggregation of the samples in the window.
+    """
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+
+    config = measure.define_configuration('test_config')
+    experiment = measure.define_experiment('test_experiment')
+
+    start = utc_date.now()
+    samples = [(50.0 + second % 7, start + Δ(second)) for second in range(100)
+               # Leave some gaps to interpolate.
+               if second not in (31, 32, 57)]
+    with measure.run_test(config, experiment) as log:
+        for watts, time in samples:
+            log.add_measurement(watts, time)
+
+    t0, t1 = (utc_date.to_timestamp(start + Δ(s)) for s in (20, 70))
+    agg = EnergyAggregation()
+    for watts, time in samples:
+        if t0 <= utc_date.to_timestamp(time) <= t1:
+            agg.step(watts, utc_date.to_timestamp(time))
+    expected = agg.finalize()
+
+    assert isclose(measure.energy_between(log.id, t0, t1), expected)
+    value, = conn.execute('SELECT energy_between(?, ?, ?)',
+                          (log.id, t0, t1)).fetchone()
+    assert isclose(value, expected)
+
+    # The whole run is the energy of the run.
+    (_, _, _, energy, *_), = measure.energy()
+    assert isclose(measure.energy_between(log.id, 0, t1 * 2), energy)
+
+
 def Δ(seconds):
     """Return a timedelta in seconds."""
     return timedelta(seconds=seconds)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests parsing the output of benchmark tools, as recorded in test/outputs/.
+"""
+
+import pytest
+from path import Path
+
+from measurements.parsers import parse_output
+
+outputs = Path(__file__).dirname()/'outputs'
+
+
+def recorded(name):
+    with open(str(outputs/name)) as output:
+        return output.read()
+
+
+def test_redis_benchmark():
+    ping, set_ = parse_output('redis-benchmark', recorded('redis-benchmark.txt'))
+
+    assert ping.test == 'PING_INLINE'
+    assert ping.requests == 1500000
+    assert ping.requests_per_second == 73135.05
+    assert ping.latency_mean is None
+    assert (ping.latency_p50, ping.latency_p95, ping.latency_p99) == (13, 20, 28)
+    assert set_.test == 'SET'
+    assert set_.latency_p50 == 15
+
+
+def test_redis_benchmark_summary():
+    set_, = parse_output('redis-benchmark', recorded('redis-benchmark-7.txt'))
+
+    assert set_.test == 'SET'
+    assert set_.requests == 100000
+    assert set_.requests_per_second == 78186.08
+    assert set_.latency_mean == 0.555
+    assert (set_.latency_p50, set_.latency_p95, set_.latency_p99) == (
+        0.527, 0.863, 1.087)
+
+
+def test_redis_benchmark_quiet():
+    output = ('PING_INLINE: 78186.08 requests per second, p50=0.527 msec\n'
+              '"SET","68201.41","0.555","0.160","0.527","0.863","1.087","2.9"\n')
+    ping, set_ = parse_output('redis-benchmark', output)
+
+    assert (ping.test, ping.requests_per_second) == ('PING_INLINE', 78186.08)
+    assert ping.latency_p50 == 0.527
+    assert (set_.test, set_.requests_per_second) == ('SET', 68201.41)
+    assert set_.latency_p99 == 1.087
+
+
+def test_pgbench():
+    result, = parse_output('pgbench', recorded('pgbench.txt'))
+
+    assert result.test == 'TPC-B (sort of)'
+    assert result.requests == 50000
+    assert result.requests_per_second == 1247.654321
+    assert result.latency_mean == 40.123
+
+
+def test_pgbench_modern():
+    result, = parse_output('pgbench', recorded('pgbench-16.txt'))
+
+    assert result.test == '<builtin: TPC-B (sort of)>'
+    assert result.requests == 50000
+    assert result.requests_per_second == 1284.789012
+    assert result.latency_mean == 38.917
+
+
+def test_tsung(tmpdir):
+    request, page, session = parse_output('tsung', recorded('tsung.log'))
+
+    assert request.test == 'request'
+    assert request.requests == 6000
+    assert request.requests_per_second == 300.0
+    assert request.latency_mean == 24.0
+    assert page.requests == 2000
+    assert session.requests == 1000
+
+    # tsung's standard output points to the log directory.
+    (tmpdir/'tsung.log').write(recorded('tsung.log'))
+    output = 'Starting Tsung\nLog directory is: {}\n'.format(tmpdir)
+    assert parse_output('tsung', output)[0] == request
+
+
+def test_unknown_tool():
+    with pytest.raises(ValueError):
+        parse_output('apachebench', '')
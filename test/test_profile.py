@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests aligning power traces and their mean profiles.
+"""
+
+import sqlite3
+from datetime import timedelta
+
+import numpy as np
+
+from measurements import Measurements, utc_date
+from measurements.energy_aggregation import EnergyAggregation
+from measurements.profile import power_traces, mean_profile, difference
+
+from helpers import N, fabricate_data
+
+
+def record(measure, configuration, samples):
+    start = utc_date.now()
+    with measure.run_test(configuration, 'test_experiment') as log:
+        for watts, second in samples:
+            log.add_measurement(watts, start + timedelta(seconds=second))
+
+
+def test_power_traces():
+    """
+    Tests that traces are aligned on elapsed time and filled in like the
+    energy aggregation fills gaps.
+    """
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    measure.define_configuration('native')
+    measure.define_experiment('test_experiment')
+
+    record(measure, 'native', [(10.0, 0), (11.0, 1), (12.0, 4), (13.0, 5)])
+    record(measure, 'native', [(20.0, 0), (21.0, 1.1), (22.0, 1.9)])
+
+    traces = power_traces(conn, 'test_experiment', 'native')
+    rows = sorted(traces.tolist(), key=lambda row: row[0])
+    assert rows[0] == [10.0, 11.0, 11.0, 11.0, 12.0, 13.0]
+    assert rows[1][:3] == [20.0, 21.0, 22.0]
+    assert np.isnan(rows[1][3:]).all()
+
+    # The sum of a trace is the energy of its run.
+    samples = fabricate_data(N(μ=50, σ=2), duration=120, percent_missing=5)
+    record(measure, 'native', [(watts, (timestamp - samples[0][1]) / 1000)
+                               for watts, timestamp in samples])
+    agg = EnergyAggregation()
+    for sample in samples:
+        agg.step(*sample)
+    traces = power_traces(conn, 'test_experiment', 'native')
+    assert any(np.isclose(np.nansum(trace), agg.finalize())
+               for trace in traces)
+
+
+def test_mean_profile():
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    measure.define_configuration('native')
+    measure.define_configuration('docker')
+    measure.define_experiment('test_experiment')
+
+    for watts in (40.0, 42.0, 44.0):
+        record(measure, 'native', [(watts, second) for second in range(10)])
+    for watts in (50.0, 53.0):
+        record(measure, 'docker', [(watts, second) for second in range(8)])
+
+    native = power_traces(conn, 'test_experiment', 'native')
+    docker = power_traces(conn, 'test_experiment', 'docker')
+
+    profile = mean_profile(native)
+    assert np.allclose(profile.mean, 42.0)
+    assert (profile.runs == 3).all()
+    # Standard error: sd 2 over sqrt(3) runs.
+    assert np.allclose(profile.upper - profile.mean,
+                       1.959964 * 2 / np.sqrt(3))
+
+    change = difference(docker, native)
+    assert len(change.mean) == 8
+    assert np.allclose(change.mean, 51.5 - 42.0)
+    assert (change.lower < change.mean).all()
+    assert (change.runs == 2).all()
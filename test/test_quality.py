@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests scanning runs for data quality problems.
+"""
+
+import sqlite3
+from datetime import timedelta
+
+import pytest
+
+from measurements import Measurements, utc_date
+from measurements.quality import scan_run, scan_runs
+
+
+def test_scan_run():
+    timestamps = [0, 1000, 4000, 3000, 5000, 5200, 6000]
+    watts = [50.0, 50.1, 49.9, 50.0, 50.2, 50.0, 500.0]
+    quality = scan_run(timestamps, watts)
+
+    assert quality.samples == 7
+    # Between 1000 and 3000, one sample is missing.
+    assert (quality.gaps, quality.gap_seconds) == (1, 1)
+    # 5200 is too close to 5000; and 6000 rounds to 1 s after 5200.
+    assert quality.duplicates == 1
+    assert quality.out_of_order == 1
+    assert quality.outliers == 1
+    assert (quality.power_min, quality.power_max) == (49.9, 500.0)
+    assert not quality.ok
+
+    assert scan_run([0, 1000, 2000], [40.0, 40.0, 40.0]).ok
+    assert scan_run([], []).ok
+
+    # At 100 Hz, samples 10 ms apart are neither duplicates nor gaps.
+    quality = scan_run([0, 10, 20, 50], [40.0] * 4, period=10.0)
+    assert (quality.duplicates, quality.gaps, quality.gap_seconds) == (0, 1, 2)
+
+
+def test_exclude_bad_runs():
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    config = measure.define_configuration('test_config')
+    experiment = measure.define_experiment('test_experiment')
+
+    start = utc_date.now()
+    with measure.run_test(config, experiment) as good:
+        for second in range(5):
+            good.add_measurement(50.0, start + timedelta(seconds=second))
+    with measure.run_test(config, experiment) as bad:
+        for second in (0, 1, 1, 2):
+            bad.add_measurement(50.0, start + timedelta(seconds=second))
+
+    # The duplicate sample cannot be placed.
+    with pytest.raises(sqlite3.OperationalError):
+        measure.energy()
+
+    assert scan_runs(conn) == 1
+    assert conn.execute(r'''
+        SELECT run, duplicates FROM run_quality WHERE NOT ok
+    ''').fetchall() == [(bad.id, 1)]
+
+    (run, _, _, energy, *_), = measure.energy(exclude_bad=True)
+    assert (run, energy) == (good.id, 250.0)
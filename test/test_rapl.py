@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests the RAPL meter using a fake powercap sysfs tree.
+"""
+
+import sqlite3
+from math import isclose
+
+import pytest
+
+from measurements import Experiment, Measurements, RAPL
+
+
+class FakePowercap:
+    """
+    A fake /sys/class/powercap, whose counters advance with a fake clock.
+    """
+
+    def __init__(self, root, watts, max_range=2 ** 32):
+        self.root = root
+        self.watts = watts
+        self.max_range = max_range
+        self.now = 0.0
+        self.energy = {}
+
+        for zone in watts:
+            directory = root.mkdir(zone)
+            if zone.count(':') == 1:
+                name = 'package-' + zone.split(':')[1]
+            else:
+                name = 'dram'
+            (directory/'name').write(name)
+            (directory/'max_energy_range_uj').write(str(max_range))
+            self.set_energy(zone, max_range - 1000000)
+        # Other subzones are counted by their package, and should be ignored.
+        subzone = root.mkdir('intel-rapl:0:0')
+        (subzone/'name').write('core')
+
+    def set_energy(self, zone, microjoules):
+        self.energy[zone] = int(round(microjoules)) % self.max_range
+        (self.root/zone/'energy_uj').write(str(self.energy[zone]))
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        for zone, watts in self.watts.items():
+            self.set_energy(zone, self.energy[zone] + watts * seconds * 1e6)
+
+
+def test_rapl(tmpdir):
+    sysfs = FakePowercap(tmpdir, {'intel-rapl:0': 20.0, 'intel-rapl:1': 5.0,
+                                  'intel-rapl:0:1': 2.0})
+    meter = RAPL(root=str(tmpdir), clock=sysfs.clock, sleep=sysfs.sleep)
+
+    with meter:
+        # The counters wrap around within the first period.
+        for _ in range(3):
+            watts, timestamp = meter.next_measurement()
+            # Counters only count whole microjoules.
+            assert isclose(watts, 27.0, abs_tol=1e-4)
+        assert isclose(sysfs.now, 3.0)
+    meter.close()
+
+
+def test_rapl_schedule(tmpdir):
+    """
+    Tests that periods do not drift when the caller is late.
+    """
+    sysfs = FakePowercap(tmpdir, {'intel-rapl:0': 20.0})
+    meter = RAPL(root=str(tmpdir), clock=sysfs.clock, sleep=sysfs.sleep)
+
+    with meter:
+        meter.next_measurement()
+        sysfs.sleep(0.25)
+        watts, _ = meter.next_measurement()
+        assert isclose(sysfs.now, 2.0)
+        assert isclose(watts, 20.0, abs_tol=1e-4)
+
+        # More than a period late: starts over.
+        sysfs.sleep(2.5)
+        meter.next_measurement()
+        assert isclose(sysfs.now, 4.5)
+        meter.next_measurement()
+        assert isclose(sysfs.now, 5.5)
+
+
+def test_rapl_period(tmpdir):
+    """
+    Tests sampling at 100 Hz.
+    """
+    sysfs = FakePowercap(tmpdir, {'intel-rapl:0': 20.0})
+    meter = RAPL(root=str(tmpdir), period=0.01,
+                 clock=sysfs.clock, sleep=sysfs.sleep)
+
+    with meter:
+        for _ in range(100):
+            watts, _ = meter.next_measurement()
+            # Counters only count whole microjoules.
+            assert isclose(watts, 20.0, abs_tol=1e-2)
+        assert isclose(sysfs.now, 1.0)
+
+    with pytest.raises(ValueError):
+        RAPL(root=str(tmpdir), period=0)
+
+
+def test_rapl_without_zones(tmpdir):
+    with pytest.raises(ValueError):
+        RAPL(root=str(tmpdir))
+
+
+def test_run_with_rapl(tmpdir):
+    """
+    Tests that Measurements.run() takes measurements from any meter.
+    """
+    sysfs = FakePowercap(tmpdir, {'intel-rapl:0': 20.0})
+    # The fake clock does not actually wait, so the experiment is measured
+    # many times over.
+    meter = RAPL(root=str(tmpdir), clock=sysfs.clock, sleep=sysfs.sleep)
+
+    @Experiment
+    def test_experiment():
+        "Sleeps"
+        from time import sleep
+        sleep(0.1)
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    config = measure.define_configuration('native')
+    measure.run(test_experiment, configuration=config, meter=meter)
+
+    count, average = conn.execute(r'''
+        SELECT COUNT(*), AVG(power) FROM measurement
+    ''').fetchone()
+    assert count >= 1
+    assert isclose(average, 20.0, abs_tol=1e-4)
+    # The period is declared by the meter.
+    period, = conn.execute('SELECT period FROM run').fetchone()
+    assert period == 1000.0
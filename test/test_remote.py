@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests shipping measurements from an agent to an ingest server on localhost.
+"""
+
+import io
+import socket
+import sqlite3
+import threading
+import time
+
+import pytest
+from path import Path
+
+from measurements import Measurements, WattsUp, utc_date
+from measurements.meter import Meter
+from measurements.remote import Agent, IngestServer, encode_frame, read_frame
+
+here = Path(__file__).dirname()
+
+
+class FakeMeter(Meter):
+    """
+    Reads 50 W every 10 ms.
+    """
+
+    period = 0.01
+
+    def next_measurement(self):
+        time.sleep(0.01)
+        return 50.0, utc_date.now()
+
+
+def test_frames():
+    messages = [{'type': 'samples', 'samples': [[50.0, 1e12]] * 100}, {}]
+    stream = io.BytesIO(b''.join(encode_frame(message)
+                                 for message in messages))
+    assert [read_frame(stream) for _ in range(3)] == messages + [None]
+
+    with pytest.raises(EOFError):
+        read_frame(io.BytesIO(encode_frame(messages[0])[:-1]))
+
+
+def test_agent(tmpdir):
+    database = str(tmpdir/'central.sqlite')
+    Measurements(database).conn.close()
+
+    with serving(database) as server:
+        meter = WattsUp(here/'fake-wattsup.py',
+                        args=('--no-delay', '--period', '0.01',
+                              '--missing-rate', '0'))
+        with Agent(server.server_address, meter, batch_size=5,
+                   spool=str(tmpdir/'agent.spool'), retry=0.05) as agent:
+            with agent.run_test('native', 'idle'):
+                time.sleep(0.5)
+            with pytest.raises(RuntimeError):
+                with agent.run_test('native', 'idle'):
+                    time.sleep(0.1)
+                    raise RuntimeError('The experiment failed')
+
+        conn = sqlite3.connect(database)
+        wait_for(lambda: conn.execute(r'''
+            SELECT COUNT(*) FROM run WHERE id NOT IN (SELECT id FROM staged_run)
+        ''').fetchone() == (1,) and not conn.execute(r'''
+            SELECT * FROM staged_run
+        ''').fetchall())
+
+    (configuration, experiment, samples, period), = conn.execute(r'''
+        SELECT configuration, experiment, sample_count, period FROM run
+    ''').fetchall()
+    assert (configuration, experiment, period) == ('native', 'idle', 1000.0)
+    assert samples == conn.execute(r'''
+        SELECT COUNT(*) FROM measurement
+    ''').fetchone()[0] > 0
+
+
+def test_agent_spools(tmpdir):
+    """
+    Tests that an agent spools frames while the server is unreachable, and
+    that frames are not recorded twice when sent again.
+    """
+    database = str(tmpdir/'central.sqlite')
+    Measurements(database).conn.close()
+    spool = tmpdir/'agent.spool'
+
+    # Find a port that nothing listens on, yet.
+    with socket.socket() as unused:
+        unused.bind(('localhost', 0))
+        address = unused.getsockname()
+
+    with Agent(address, FakeMeter(), batch_size=5, spool=str(spool),
+               retry=0.05) as agent:
+        with agent.run_test('native', 'idle'):
+            time.sleep(0.2)
+        # Every frame of the run is spooled.
+        wait_for(lambda: spool.exists() and agent._frames.empty())
+        time.sleep(0.1)
+
+        # Some frames arrived before the connection broke.
+        frames = io.BytesIO(spool.read_binary())
+        partial = b''.join(encode_frame(read_frame(frames)) for _ in range(2))
+
+        with serving(database, address) as server:
+            with socket.create_connection(address) as connection:
+                connection.sendall(partial)
+            wait_for(lambda: not spool.exists())
+
+            conn = sqlite3.connect(database)
+            wait_for(lambda: conn.execute(r'''
+                SELECT COUNT(*) FROM run
+            ''').fetchone() == (1,) and not conn.execute(r'''
+                SELECT * FROM staged_run
+            ''').fetchall())
+
+    samples, period, duplicates = conn.execute(r'''
+        SELECT sample_count, period,
+               sample_count - (SELECT COUNT(DISTINCT timestamp)
+                                 FROM measurement)
+          FROM run
+    ''').fetchone()
+    assert samples > 0
+    assert period == 10.0
+    assert duplicates == 0
+
+
+class serving:
+    """
+    Runs an ingest server in a thread.
+    """
+
+    def __init__(self, database, address=('localhost', 0)):
+        self.server = IngestServer(database, address, group_size=10)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+
+    def __enter__(self):
+        self.thread.start()
+        return self.server
+
+    def __exit__(self, *exception_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Timed out')
+        time.sleep(0.02)
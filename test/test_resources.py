@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests sampling host resources from a fake /proc tree.
+"""
+
+import sqlite3
+
+from measurements import Measurements, utc_date
+from measurements.resources import ResourceSampler, is_partition
+
+STAT = """\
+cpu  1000 10 300 50000 200 5 15 0 0 0
+cpu0 500 5 150 25000 100 3 7 0 0 0
+intr 1234567
+"""
+
+MEMINFO = """\
+MemTotal:        8000000 kB
+MemFree:         1000000 kB
+MemAvailable:    5000000 kB
+Buffers:          100000 kB
+Cached:          2000000 kB
+"""
+
+DISKSTATS = """\
+   7       0 loop0 10 0 80 0 0 0 0 0 0 0 0
+   8       0 sda 100 0 2000 0 50 0 1000 0 0 0 0
+   8       1 sda1 90 0 1800 0 40 0 900 0 0 0 0
+ 259       0 nvme0n1 10 0 200 0 5 0 100 0 0 0 0
+ 259       1 nvme0n1p1 10 0 200 0 5 0 100 0 0 0 0
+ 253       0 dm-0 50 0 900 0 20 0 500 0 0 0 0
+   9       0 md0 50 0 900 0 20 0 500 0 0 0 0
+"""
+
+NET_DEV = """\
+Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes    packets errs drop fifo colls carrier compressed
+    lo: 999999     100    0    0    0     0          0         0   999999     100    0    0    0     0       0          0
+  eth0: 4000       40    0    0    0     0          0         0   3000       30    0    0    0     0       0          0
+ wlan0: 1000       10    0    0    0     0          0         0   500        5    0    0    0     0       0          0
+"""
+
+
+def fake_proc(tmpdir):
+    (tmpdir/'stat').write(STAT)
+    (tmpdir/'meminfo').write(MEMINFO)
+    (tmpdir/'diskstats').write(DISKSTATS)
+    tmpdir.mkdir('net')
+    (tmpdir/'net'/'dev').write(NET_DEV)
+    return ResourceSampler(root=str(tmpdir))
+
+
+def test_sample(tmpdir):
+    sample = fake_proc(tmpdir).sample()
+
+    assert (sample.cpu_user, sample.cpu_system) == (1010, 320)
+    assert (sample.cpu_idle, sample.cpu_iowait) == (50000, 200)
+    assert sample.memory_used == 3000000
+    assert sample.memory_cached == 2100000
+    assert sample.disk_read == 512 * (2000 + 200)
+    assert sample.disk_written == 512 * (1000 + 100)
+    assert (sample.net_received, sample.net_sent) == (5000, 3500)
+
+
+def test_is_partition():
+    devices = ['sda', 'sda1', 'sdab', 'nvme0n1', 'nvme0n1p2', 'nvme0n10',
+               'md1', 'md10', 'nbd1', 'nbd10', 'mmcblk0', 'mmcblk0p1']
+    assert [name for name in devices if is_partition(name, devices)] == [
+        'sda1', 'nvme0n1p2', 'mmcblk0p1'
+    ]
+
+
+def test_add_resources(tmpdir):
+    sampler = fake_proc(tmpdir)
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    config = measure.define_configuration('test_config')
+    experiment = measure.define_experiment('test_experiment')
+
+    time = utc_date.now()
+    with measure.run_test(config, experiment) as log:
+        log.add_measurement(100.0, time)
+        log.add_resources(sampler.sample(), time)
+
+    result = conn.execute(r'''
+        SELECT run, timestamp, cpu_user, net_sent FROM resource
+    ''').fetchall()
+    assert result == [(log.id, utc_date.to_timestamp(time), 1010, 3500)]
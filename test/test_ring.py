@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests publishing live samples to many subscribers through a shared ring.
+"""
+
+import pytest
+from path import Path
+
+from measurements import WattsUp, utc_date
+from measurements.ring import Publisher, Subscription
+
+here = Path(__file__).dirname()
+
+
+def test_ring(tmpdir):
+    path = str(tmpdir/'samples.ring')
+    with Publisher(path, capacity=4) as ring:
+        ring.publish(1000.0, 40.0)
+        # Subscriptions start with the next sample.
+        oldest = Subscription(path)
+        latest = Subscription(path, policy='latest')
+        assert oldest.read(timeout=0) is None
+
+        for second in range(2, 5):
+            ring.publish(1000.0 * second, 40.0 + second)
+        assert oldest.read() == (2000.0, 42.0)
+        assert latest.read() == (4000.0, 44.0)
+        assert latest.dropped == 2
+
+        # Overrun the ring: samples 3 and 4 are overwritten.
+        for second in range(5, 9):
+            ring.publish(1000.0 * second, 40.0 + second)
+        assert oldest.pending == 6
+        assert [oldest.read() for _ in range(4)] == [
+            (1000.0 * second, 40.0 + second) for second in range(5, 9)
+        ]
+        assert oldest.dropped == 2
+        assert oldest.read(timeout=0.05) is None
+
+        oldest.close()
+        latest.close()
+
+    with pytest.raises(FileExistsError):
+        Publisher(path)
+
+    not_a_ring = tmpdir/'not.ring'
+    not_a_ring.write('0' * 64)
+    with pytest.raises(ValueError):
+        Subscription(str(not_a_ring))
+
+
+def test_wattsup_subscribers():
+    """
+    Tests that another subscriber reads the same samples as the client.
+    """
+    meter = WattsUp(here/'fake-wattsup.py',
+                    args=('--no-delay', '--period', '0.01',
+                          '--missing-rate', '0'))
+    with meter.subscribe() as display:
+        with meter:
+            measurements = [meter.next_measurement() for _ in range(5)]
+        last = round(utc_date.to_timestamp(measurements[-1][1]))
+        # The display subscribed first, so it reads earlier samples too.
+        samples = []
+        while not samples or round(samples[-1][0]) < last:
+            samples.append(display.read(timeout=1.0))
+    meter.close()
+
+    assert [(watts, round(utc_date.to_timestamp(time)))
+            for watts, time in measurements] == \
+        [(watts, round(timestamp)) for timestamp, watts in samples[-5:]]
+    assert display.dropped == 0
+    assert not Path(meter.ring).exists()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests comparing the energy of configurations.
+"""
+
+import random
+import sqlite3
+from math import isclose
+
+from scipy import stats
+
+from measurements import Measurements
+from measurements.stats import compare_configurations, write_comparisons
+
+
+def energy_table(groups):
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    for experiment, configuration in groups:
+        measure.define_experiment(experiment)
+    for configuration in set(configuration for _, configuration in groups):
+        measure.define_configuration(configuration)
+    conn.execute(r'''
+        CREATE TABLE test_energy(id, configuration, experiment, energy)
+    ''')
+    for (experiment, configuration), values in groups.items():
+        conn.executemany('INSERT INTO test_energy VALUES (NULL, ?, ?, ?)',
+                         [(configuration, experiment, v) for v in values])
+    return conn
+
+
+def test_compare_configurations():
+    """
+    Tests that the batch of comparisons agrees with SciPy's tests run one
+    pair at a time.
+    """
+
+    rng = random.Random(1)
+    groups = {
+        ('idle', 'native'): [rng.gauss(2650, 30) for _ in range(30)],
+        ('idle', 'docker'): [rng.gauss(2700, 40) for _ in range(25)],
+        ('redis', 'native'): [rng.gauss(9000, 100) for _ in range(10)],
+        ('redis', 'docker'): [rng.gauss(9400, 150) for _ in range(12)],
+        ('redis', 'ssl'): [rng.gauss(9100, 100) for _ in range(2)],
+    }
+    conn = energy_table(groups)
+
+    comparisons = compare_configurations(conn, baseline='native',
+                                         table='test_energy')
+    assert sorted((c.experiment, c.configuration) for c in comparisons) == [
+        ('idle', 'docker'), ('redis', 'docker'), ('redis', 'ssl')
+    ]
+
+    for comparison in comparisons:
+        sample = groups[comparison.experiment, comparison.configuration]
+        baseline = groups[comparison.experiment, 'native']
+
+        welch = stats.ttest_ind(sample, baseline, equal_var=False)
+        assert isclose(comparison.welch_t, welch.statistic)
+        assert isclose(comparison.welch_p, welch.pvalue)
+        u = stats.mannwhitneyu(sample, baseline, alternative='two-sided')
+        assert isclose(comparison.mann_whitney_p, u.pvalue)
+        assert isclose(comparison.baseline_shapiro_p,
+                       stats.shapiro(baseline).pvalue)
+        assert (comparison.cohens_d > 0) == (comparison.mean >
+                                             comparison.baseline_mean)
+
+    # Two runs are too few to test normality.
+    ssl, = [c for c in comparisons if c.configuration == 'ssl']
+    assert ssl.shapiro_p is None
+
+    # Without a baseline, every pair of configurations is compared.
+    assert len(compare_configurations(conn, table='test_energy')) == 1 + 3
+
+
+def test_write_comparisons():
+    conn = energy_table({('idle', 'native'): [1.0, 2.0, 3.0],
+                         ('idle', 'docker'): [2.0, 3.0, 4.5]})
+    write_comparisons(conn, 'native', 'test_energy')
+    write_comparisons(conn, 'native', 'test_energy')
+    assert conn.execute(r'''
+        SELECT configuration, baseline, runs, baseline_runs
+          FROM energy_comparison
+    ''').fetchall() == [('docker', 'native', 3, 3)]
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Tests restarting a Watts Up? that stalls.
+"""
+
+import sqlite3
+import time
+
+import pytest
+from path import Path
+
+from measurements import Experiment, Measurements, WattsUp, utc_date
+from measurements.meter import MeterStalled
+
+here = Path(__file__).dirname()
+
+# Prints 10 samples, 10 ms apart, then hangs.
+STALLING = ('--no-delay', '--period', '0.01', '--missing-rate', '0',
+            '--stall-after', '10')
+
+
+def test_gap():
+    meter = WattsUp(here/'fake-wattsup.py', args=STALLING, timeout=0.2)
+    with meter:
+        timestamps = [utc_date.to_timestamp(meter.next_measurement()[1])
+                      for _ in range(25)]
+    meter.close()
+
+    assert meter.stalls >= 2
+    gaps = [second - first for first, second in zip(timestamps,
+                                                    timestamps[1:])]
+    assert sum(gap >= 200.0 for gap in gaps) == meter.stalls
+
+
+def test_abort():
+    meter = WattsUp(here/'fake-wattsup.py', args=STALLING, timeout=0.2,
+                    on_stall='abort')
+    with pytest.raises(MeterStalled):
+        with meter:
+            for _ in range(25):
+                meter.next_measurement()
+    assert meter.stalls == 1
+
+    # Restarted.
+    with meter:
+        meter.next_measurement()
+    meter.close()
+
+
+def test_dead():
+    meter = WattsUp(here/'fake-wattsup.py', args=STALLING, timeout=0.2,
+                    restarts=0)
+    with pytest.raises(MeterStalled):
+        with meter:
+            for _ in range(25):
+                meter.next_measurement()
+    meter.close()
+
+
+def test_run_aborted():
+    """
+    Tests that a run is rolled back, and its experiment stopped, when the
+    meter stalls.
+    """
+
+    @Experiment
+    def sleepy():
+        time.sleep(60)
+
+    conn = sqlite3.connect(':memory:')
+    measure = Measurements(conn)
+    configuration = measure.define_configuration('native')
+
+    meter = WattsUp(here/'fake-wattsup.py', args=STALLING, timeout=0.2,
+                    on_stall='abort')
+    started = time.monotonic()
+    with pytest.raises(MeterStalled):
+        measure.run(sleepy, configuration=configuration, meter=meter,
+                    sleep_time=0)
+    meter.close()
+
+    assert time.monotonic() - started < 10
+    assert conn.execute('SELECT COUNT(*) FROM run').fetchone() == (0,)